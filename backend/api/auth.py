@@ -5,24 +5,34 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-import bcrypt
 import hashlib
+import uuid
 from pydantic import EmailStr
 
 from config import settings
 from db import get_db, User, Role, UserSession
 from schemas.auth import Token, LoginRequest, RegisterRequest, UserResponse
+from services.password_hasher import password_hasher, PasswordHasherBusy
+from services.session_cache import session_cache
+from services.session_store import session_store
 
 router = APIRouter()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """bcrypt check in the hashing pool; 503 when it is saturated"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 
-def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+async def get_password_hash(password: str) -> str:
+    """bcrypt hash in the hashing pool; 503 when it is saturated"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 
 def hash_token(token: str) -> str:
@@ -36,7 +46,8 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # A unique id keeps two tokens issued in the same second from sharing a session row
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
@@ -71,15 +82,17 @@ async def auth_dependency(request: Request, db: Session = Depends(get_db)):
     if "sub" in payload:
         payload["sub"] = int(payload["sub"])
     
-    # Check if token is revoked
+    # Check if token is revoked; live sessions are cached, so most requests skip the database
     token_hash = hash_token(token)
-    session = db.query(UserSession).filter(
-        UserSession.token_hash == token_hash,
-        UserSession.revoked == False,
-        UserSession.expires_at > datetime.utcnow()
-    ).first()
     
-    if not session:
+    def lookup() -> bool:
+        return db.query(UserSession.id).filter(
+            UserSession.token_hash == token_hash,
+            UserSession.revoked == False,
+            UserSession.expires_at > datetime.utcnow()
+        ).first() is not None
+    
+    if not await session_cache.validate(token_hash, payload["exp"], lookup):
         raise HTTPException(status_code=401, detail="Token revoked or expired")
     
     return payload
@@ -93,6 +106,10 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     if db.query(User).filter(User.username == request.username).first():
         raise HTTPException(status_code=400, detail="Username already taken")
     
+    # End the read transaction so its connection goes back to the pool while bcrypt runs
+    db.rollback()
+    password_hash = await get_password_hash(request.password)
+    
     # Get default role (public)
     role = db.query(Role).filter(Role.name == "public").first()
     if not role:
@@ -105,7 +122,7 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     user = User(
         email=request.email,
         username=request.username,
-        password_hash=get_password_hash(request.password),
+        password_hash=password_hash,
         first_name=request.first_name,
         last_name=request.last_name,
         organization=request.organization,
@@ -133,8 +150,11 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
 @router.post("/login", response_model=Token)
 async def login(request: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == request.email).first()
+    password_hash = user.password_hash if user else None
+    # End the read transaction so its connection goes back to the pool while bcrypt runs
+    db.rollback()
     
-    if not user or not verify_password(request.password, user.password_hash):
+    if not user or not await verify_password(request.password, password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user.is_active:
@@ -152,31 +172,27 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
         expires_delta=access_token_expires
     )
     
-    # Store session (for logout/revocation)
-    token_hash = hash_token(access_token)
-    session = UserSession(
-        user_id=user.id,
-        token_hash=token_hash,
-        expires_at=datetime.utcnow() + access_token_expires
-    )
-    db.add(session)
-    db.commit()
+    # Store session (for logout/revocation); the oldest ones beyond MAX_SESSIONS_PER_USER end
+    await session_store.open(db, user.id, hash_token(access_token), datetime.utcnow() + access_token_expires)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/logout")
-async def logout(token: str = Depends(auth_dependency), db: Session = Depends(get_db)):
+async def logout(request: Request, token: dict = Depends(auth_dependency), db: Session = Depends(get_db)):
     """Logout and revoke token"""
     # Mark session as revoked
+    token_hash = hash_token(await get_token_from_header(request))
     session = db.query(UserSession).filter(
-        UserSession.token_hash == hash_token(token),
+        UserSession.token_hash == token_hash,
         UserSession.revoked == False
     ).first()
     
     if session:
         session.revoked = True
         db.commit()
+    # Other API processes drop the token from their caches too
+    await session_cache.revoke(token_hash, token["exp"])
     
     return {"message": "Logged out successfully"}
 
@@ -235,15 +251,19 @@ async def confirm_password_reset(
         if payload.get("type") != "password_reset":
             raise HTTPException(status_code=400, detail="Invalid token type")
         
+        # Hashed before any query, so no connection is held while bcrypt runs
+        password_hash = await get_password_hash(new_password)
+        
         user_id = int(payload.get("sub"))
         user = db.query(User).filter(User.id == user_id).first()
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Update password
-        user.password_hash = get_password_hash(new_password)
+        # Update password; sessions opened with the old one end
+        user.password_hash = password_hash
         db.commit()
+        await session_store.revoke_user(db, user.id)
         
         return {"message": "Password reset successfully"}
         
@@ -1,28 +1,58 @@
 """
 Datasets API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from config import settings
 from db import get_db, Dataset
 from api.auth import auth_dependency
+from services.dataset_catalog import COUNT_MODES, dataset_catalog, decode_cursor, encode_cursor
+from services.dataset_export import EXPORT_FORMATS, iter_batches
+from services.dataset_search import dataset_search
 
 router = APIRouter()
 
+# Dataset access levels each role may see
+ACCESS_LEVELS = {
+    "public": ["public"],
+    "registered": ["public", "registered"],
+    "researcher": ["public", "registered", "researcher"],
+    "collaborator": ["public", "registered", "researcher", "collaborator"],
+    "admin": ["public", "registered", "researcher", "collaborator"],
+}
+
+
+def allowed_levels(token: dict) -> List[str]:
+    return ACCESS_LEVELS.get(token.get("role", "public"), ["public"])
+
 
 @router.get("")
 async def list_datasets(
-    skip: int = 0,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
     species: str = None,
     data_type: str = None,
+    count: Optional[str] = None,
     token: dict = Depends(auth_dependency),
     db: Session = Depends(get_db)
 ):
-    """List datasets based on user permissions"""
-    user_role = token.get("role", "public")
-    
+    """
+    List datasets based on user permissions, newest first
+
+    Pages are read by keyset: pass a page's next_cursor to get the one
+    after it, so every page costs the same. ``count`` picks how total is
+    computed: exact, estimated, cached or none (DATASET_COUNT_MODE by
+    default). ``skip`` is still honoured without a cursor but costs more
+    the deeper it goes.
+    """
+    count_mode = count or settings.DATASET_COUNT_MODE
+    if count_mode not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of {', '.join(COUNT_MODES)}")
+
     query = db.query(Dataset)
     
     # Filter by species
@@ -34,24 +64,74 @@ async def list_datasets(
         query = query.filter(Dataset.data_type == data_type)
     
     # Filter by access level
-    access_levels = {
-        "public": ["public"],
-        "registered": ["public", "registered"],
-        "researcher": ["public", "registered", "researcher"],
-        "collaborator": ["public", "registered", "researcher", "collaborator"],
-        "admin": ["public", "registered", "researcher", "collaborator"],
-    }
-    allowed = access_levels.get(user_role, ["public"])
-    query = query.filter(Dataset.access_level.in_(allowed))
+    query = query.filter(Dataset.access_level.in_(allowed_levels(token)))
     
-    total = query.count()
-    datasets = query.offset(skip).limit(limit).all()
+    total, count_mode = dataset_catalog.count(db, query, count_mode)
+
+    page = query.order_by(Dataset.created_at.desc(), Dataset.id.desc())
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page = page.filter(tuple_(Dataset.created_at, Dataset.id) < after)
+    elif skip:
+        page = page.offset(skip)
+    # One extra row tells whether another page follows
+    datasets = page.limit(limit + 1).all()
+    next_cursor = encode_cursor(datasets[limit - 1]) if len(datasets) > limit else None
     
     return {
         "total": total,
-        "page": skip // limit + 1,
+        "count_mode": count_mode,
         "page_size": limit,
-        "datasets": datasets,
+        "next_cursor": next_cursor,
+        "datasets": datasets[:limit],
+    }
+
+
+@router.get("/search")
+async def search_datasets(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    species: str = None,
+    data_type: str = None,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search over accessible datasets, best matches first
+
+    Searches names, descriptions and meta_data keys. Each result carries
+    its rank and the name and a description snippet with matched terms
+    wrapped in <mark></mark>.
+    """
+    try:
+        hits = dataset_search.search(
+            db, q, allowed_levels(token), species, data_type, limit=limit + 1, skip=skip
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    datasets = {
+        dataset.id: dataset
+        for dataset in db.query(Dataset).filter(Dataset.id.in_([hit["id"] for hit in hits[:limit]]))
+    }
+    return {
+        "query": q,
+        "page_size": limit,
+        "has_more": len(hits) > limit,
+        "results": [
+            {
+                "dataset": datasets[hit["id"]],
+                "rank": hit["rank"],
+                "highlight": {"name": hit["name_highlight"], "description": hit["description_highlight"]},
+            }
+            for hit in hits[:limit] if hit["id"] in datasets
+        ],
     }
 
 
@@ -68,88 +148,31 @@ async def get_dataset(
     return dataset
 
 
-@router.get("/export/csv")
-async def export_datasets_csv(
+@router.get("/export/{export_format}")
+async def export_datasets(
+    export_format: str,
     token: dict = Depends(auth_dependency),
-    db: Session = Depends(get_db)
 ):
-    """Export all accessible datasets as CSV"""
-    import csv
-    from io import StringIO
-    from fastapi.responses import Response
-    
-    user_role = token.get("role", "public")
-    
-    access_levels = {
-        "public": ["public"],
-        "registered": ["public", "registered"],
-        "researcher": ["public", "registered", "researcher"],
-        "collaborator": ["public", "registered", "researcher", "collaborator"],
-        "admin": ["public", "registered", "researcher", "collaborator"],
-    }
-    allowed = access_levels.get(user_role, ["public"])
-    datasets = db.query(Dataset).filter(Dataset.access_level.in_(allowed)).all()
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'name', 'description', 'species', 'data_type', 'access_level', 'file_size', 'created_at'])
-    
-    for ds in datasets:
-        writer.writerow([
-            ds.id,
-            ds.name,
-            ds.description or '',
-            ds.species or '',
-            ds.data_type,
-            ds.access_level,
-            ds.file_size or 0,
-            ds.created_at.isoformat() if ds.created_at else '',
-        ])
-    
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=datasets.csv"}
-    )
+    """
+    Export all accessible datasets as CSV, JSON, NDJSON or Parquet
 
+    The export is streamed batch by batch from a server-side cursor, so
+    the first bytes go out immediately and memory stays flat however many
+    datasets there are. Parquet needs pyarrow installed.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export format; use one of {', '.join(EXPORT_FORMATS)}"
+        )
+    chunks, media_type, extension = EXPORT_FORMATS[export_format]
+    try:
+        content = chunks(iter_batches(allowed_levels(token)))
+    except ImportError:
+        raise HTTPException(status_code=501, detail=f"{export_format} export is not available on this server")
 
-@router.get("/export/json")
-async def export_datasets_json(
-    token: dict = Depends(auth_dependency),
-    db: Session = Depends(get_db)
-):
-    """Export all accessible datasets as JSON"""
-    from fastapi.responses import JSONResponse
-    
-    user_role = token.get("role", "public")
-    
-    access_levels = {
-        "public": ["public"],
-        "registered": ["public", "registered"],
-        "researcher": ["public", "registered", "researcher"],
-        "collaborator": ["public", "registered", "researcher", "collaborator"],
-        "admin": ["public", "registered", "researcher", "collaborator"],
-    }
-    allowed = access_levels.get(user_role, ["public"])
-    datasets = db.query(Dataset).filter(Dataset.access_level.in_(allowed)).all()
-    
-    data = {
-        "exported_at": datetime.utcnow().isoformat(),
-        "total_count": len(datasets),
-        "datasets": [
-            {
-                "id": ds.id,
-                "name": ds.name,
-                "description": ds.description,
-                "species": ds.species,
-                "data_type": ds.data_type,
-                "access_level": ds.access_level,
-                "file_size": ds.file_size,
-                "created_at": ds.created_at.isoformat() if ds.created_at else None,
-            }
-            for ds in datasets
-        ]
-    }
-    
-    return JSONResponse(content=data)
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=datasets.{extension}"}
+    )
@@ -1,33 +1,62 @@
 """
 Files API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 import os
-import shutil
-from datetime import datetime
+from typing import Optional
 from config import settings
 from api.auth import auth_dependency
+from core.file_response import file_version, send_file
 from db import get_db, Dataset
+from schemas.upload import UploadCreate
+from services.blob_store import blob_store
+from services.dataset_catalog import dataset_catalog
+from services.fasta_service import FASTA_EXTENSIONS, BGZF_SUFFIX
+from services.upload_store import upload_store, safe_filename, save_stream, UploadConflict
 
 router = APIRouter()
 
+DATASET_ROLES = ["admin", "researcher", "collaborator"]
 
-@router.get("/genome/{species}/{file_type}/{filename}")
+
+@router.api_route("/genome/{species}/{file_type}/{filename}", methods=["GET", "HEAD"])
 async def get_genome_file(
+    request: Request,
     species: str,
     file_type: str,
     filename: str,
+    v: Optional[str] = None,
 ):
-    """Serve genome data files (public access)"""
-    base_path = os.path.join(settings.GENOME_DATA_DIR, species, file_type)
-    file_path = os.path.join(base_path, filename)
+    """
+    Serve genome data files (public access, supports byte ranges)
+
+    A reference FASTA requested with ``v`` set to its current version (the
+    fasta_url of /refs) is cached for good: a new build changes the
+    version and thus the URL.
+    """
+    genome_root = os.path.realpath(settings.GENOME_DATA_DIR)
+    file_path = os.path.realpath(os.path.join(genome_root, species, file_type, filename))
     
-    if not os.path.exists(file_path):
+    if not file_path.startswith(genome_root + os.sep) or not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_path)
+    # Indexes (.fai/.gzi/.2bit/summary files) are rebuilt in place, and a
+    # stale version may name older content, so everything else is revalidated
+    if file_type == "reference" and _is_fasta(filename) and v and v == file_version(os.stat(file_path)):
+        cache_control = f"public, max-age={settings.GENOME_FILE_MAX_AGE}, immutable"
+    else:
+        cache_control = "public, no-cache"
+    
+    return send_file(request, file_path, cache_control=cache_control)
+
+
+def _is_fasta(filename: str) -> bool:
+    if filename.endswith(BGZF_SUFFIX):
+        filename = filename[:-len(BGZF_SUFFIX)]
+    return os.path.splitext(filename)[1] in FASTA_EXTENSIONS
 
 
 @router.post("/upload")
@@ -35,16 +64,15 @@ async def upload_file(
     file: UploadFile = File(...),
     token: dict = Depends(auth_dependency)
 ):
-    """Upload a file"""
+    """Upload a file (small files; use /uploads for large ones)"""
     upload_path = settings.UPLOAD_DIR
     os.makedirs(upload_path, exist_ok=True)
     
-    file_location = os.path.join(upload_path, file.filename)
+    filename = _filename(file.filename)
+    file_location = os.path.join(upload_path, filename)
+    size, sha256 = await _save(file, file_location)
     
-    with open(file_location, "wb+") as file_object:
-        file_object.write(await file.read())
-    
-    return {"filename": file.filename, "path": file_location}
+    return {"filename": filename, "path": file_location, "file_size": size, "sha256": sha256}
 
 
 @router.post("/datasets")
@@ -58,39 +86,64 @@ async def upload_dataset(
     token: dict = Depends(auth_dependency),
     db: Session = Depends(get_db)
 ):
-    """Upload and register a dataset"""
+    """Upload and register a dataset (small files; use /uploads for large ones)"""
     # Check if user has permission
-    if token.get("role") not in ["admin", "researcher", "collaborator"]:
+    if token.get("role") not in DATASET_ROLES:
         raise HTTPException(status_code=403, detail="Permission denied")
     
-    # Create upload directory
-    date_str = datetime.now().strftime("%Y%m%d")
-    upload_dir = os.path.join(settings.UPLOAD_DIR, "datasets", date_str)
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Save file
-    file_path = os.path.join(upload_dir, file.filename)
-    file_size = 0
-    with open(file_path, "wb+") as f:
-        content = await file.read()
-        f.write(content)
-        file_size = len(content)
+    # Save file, then file it under its hash
+    filename = _filename(file.filename)
+    staged = blob_store.temp_path()
+    file_size, sha256 = await _save(file, staged)
+    file_path, _ = await run_in_threadpool(blob_store.put, staged, sha256)
     
     # Create dataset record
+    metadata = {
+        "name": name,
+        "description": description,
+        "species": species,
+        "data_type": data_type,
+        "access_level": access_level,
+    }
+    return _create_dataset(db, token, metadata, filename, file_path, file_size, sha256)
+
+
+def _filename(filename: str) -> str:
+    try:
+        return safe_filename(filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _save(file: UploadFile, path: str) -> tuple:
+    """Stream an uploaded file to disk off the event loop; returns (size, sha256)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        return await run_in_threadpool(save_stream, file.file, path)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+def _create_dataset(
+    db: Session, token: dict, metadata: dict, filename: str, file_path: str, file_size: int, sha256: str
+) -> dict:
     dataset = Dataset(
-        name=name,
-        description=description,
-        species=species,
-        data_type=data_type,
+        name=metadata["name"],
+        description=metadata.get("description", ""),
+        species=metadata.get("species", ""),
+        data_type=metadata.get("data_type", "other"),
         file_path=file_path,
+        file_name=filename,
         file_size=file_size,
-        access_level=access_level,
+        sha256=sha256,
+        access_level=metadata.get("access_level", "registered"),
         uploaded_by=token.get("sub"),
     )
     
     db.add(dataset)
     db.commit()
     db.refresh(dataset)
+    dataset_catalog.invalidate()
     
     return {
         "id": dataset.id,
@@ -99,6 +152,116 @@ async def upload_dataset(
         "species": dataset.species,
         "data_type": dataset.data_type,
         "access_level": dataset.access_level,
+        "file_name": dataset.file_name,
         "file_size": dataset.file_size,
+        "sha256": dataset.sha256,
         "created_at": dataset.created_at,
     }
+
+
+# ==================== Resumable Uploads ====================
+# Create an upload, send it in chunks with PATCH at the offset reported by
+# HEAD/GET (resuming after an interruption), then complete it.
+
+def _get_upload(upload_id: str, token: dict) -> dict:
+    info = upload_store.get(upload_id)
+    if not info or info["user_id"] != token.get("sub"):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return info
+
+
+def _upload_state(info: dict) -> dict:
+    return {
+        "upload_id": info["id"],
+        "filename": info["filename"],
+        "size": info["size"],
+        "offset": info["offset"],
+    }
+
+
+def _offset_headers(info: dict) -> dict:
+    return {"Upload-Offset": str(info["offset"]), "Upload-Length": str(info["size"]), "Cache-Control": "no-store"}
+
+
+@router.post("/uploads")
+async def create_upload(
+    request: UploadCreate,
+    token: dict = Depends(auth_dependency)
+):
+    """
+    Start a resumable upload
+    
+    Body: filename, size (bytes), optional sha256 to verify on completion and
+    optional dataset (name, description, species, data_type, access_level)
+    to register the file as a dataset when it completes.
+    """
+    if request.dataset is not None and token.get("role") not in DATASET_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    metadata = request.model_dump(include={"sha256", "dataset"}, exclude_none=True)
+    try:
+        info = await run_in_threadpool(
+            upload_store.create, token.get("sub"), request.filename, request.size, metadata
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(_upload_state(info), status_code=201, headers=_offset_headers(info))
+
+
+@router.api_route("/uploads/{upload_id}", methods=["GET", "HEAD"])
+async def get_upload(upload_id: str, token: dict = Depends(auth_dependency)):
+    """Offset to resume an upload from (also in the Upload-Offset header)"""
+    info = _get_upload(upload_id, token)
+    return JSONResponse(_upload_state(info), headers=_offset_headers(info))
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, token: dict = Depends(auth_dependency)):
+    """Append the request body at the Upload-Offset header's offset"""
+    info = _get_upload(upload_id, token)
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    try:
+        info["offset"] = await upload_store.write(info, offset, request.stream())
+    except UploadConflict as e:
+        headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+        raise HTTPException(status_code=409, detail=str(e), headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return JSONResponse(_upload_state(info), headers=_offset_headers(info))
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """Finish an upload: verify it and store it (registering the dataset, if any)"""
+    info = _get_upload(upload_id, token)
+    dataset = info["metadata"].get("dataset")
+    if dataset is not None:
+        destination = blob_store.temp_path()
+    else:
+        destination = os.path.join(settings.UPLOAD_DIR, info["filename"])
+    try:
+        sha256 = await run_in_threadpool(upload_store.complete, info, destination)
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if dataset is not None:
+        file_path, _ = await run_in_threadpool(blob_store.put, destination, sha256)
+        return _create_dataset(db, token, dataset, info["filename"], file_path, info["size"], sha256)
+    return {"filename": info["filename"], "path": destination, "file_size": info["size"], "sha256": sha256}
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str, token: dict = Depends(auth_dependency)):
+    """Abandon an upload"""
+    _get_upload(upload_id, token)
+    await run_in_threadpool(upload_store.abort, upload_id)
+    return {"message": "Upload deleted"}
@@ -1,54 +1,193 @@
 """
 Genome browser API endpoints (Public access)
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
 from config import settings
+from services.fasta_service import fasta_service, SequenceReader
+from services.annotation_service import annotation_service
+from services.reference_registry import reference_registry, ReferenceInfo
+from services.summary_service import summary_service
 
 router = APIRouter()
 
+# Handlers that use the registry, annotations or sequence stores are plain
+# functions (run in the thread pool) or hand that work to it: a registry
+# lookup may rescan GENOME_DATA_DIR and a first open builds indexes.
+
 
 @router.get("/species")
-async def list_species():
+def list_species():
     """List available species"""
     return [
-        {"id": "giant_panda", "name": "Giant Panda (Ailuropoda melanoleuca)"},
-        {"id": "snow_leopard", "name": "Snow Leopard (Panthera uncia)"},
+        {"id": info.id, "name": info.name, "references": len(info.references)}
+        for info in reference_registry.list_species()
     ]
 
 
 @router.get("/{species}/refs")
-async def list_references(species: str):
+def list_references(species: str):
     """List reference genomes for a species"""
-    if species == "giant_panda":
-        return [
-            {
-                "id": "ASM200744v3_real",
-                "name": "ASM200744v3 (Real Test Data)",
-                "description": "Giant Panda Reference Genome ASM200744v3 - Test data with representative sequences",
-                "fasta_url": f"/api/files/genome/{species}/reference/ASM200744v3_genomic.fna",
-                "fai_url": f"/api/files/genome/{species}/reference/ASM200744v3_genomic.fna.fai",
-                "gff_url": f"/api/files/genome/{species}/annotation/genes.gff3",
-                "chromosomes": 22,
-                "total_length": "30.5 Mb (sample)",
-                "genes": 47140,
-                "data_source": "Test data based on ASM200744v3",
-            },
-        ]
+    info = reference_registry.get_species(species)
+    if not info:
+        raise HTTPException(status_code=404, detail="Species not found")
+    return [reference.to_dict() for reference in info.references]
+
+
+@router.get("/{species}/search")
+def search_features(species: str, q: str, ref: Optional[str] = None, limit: int = 10):
+    """Autocomplete gene IDs and names across a species' annotations"""
+    info = reference_registry.get_species(species)
+    if not info:
+        raise HTTPException(status_code=404, detail="Species not found")
+    limit = max(1, min(limit, 100))
+
+    results, searched = [], set()
+    for reference in info.references:
+        if ref and reference.id != ref:
+            continue
+        if not reference.gff_path or reference.gff_path in searched:
+            continue
+        searched.add(reference.gff_path)
+        for hit in annotation_service.open(reference.gff_path).names.search(q, limit):
+            hit["ref"] = reference.id
+            results.append(hit)
+
+    results.sort(key=lambda hit: not hit["exact"])
+    return {"query": q, "results": results[:limit]}
+
+
+@router.get("/{species}/tracks")
+def list_tracks(species: str):
+    """List available tracks for a species"""
+    info = reference_registry.get_species(species)
+    if not info:
+        raise HTTPException(status_code=404, detail="Species not found")
     return [
         {
-            "id": "chr1",
-            "name": "Chromosome 1",
-            "description": f"Chromosome 1 for {species.replace('_', ' ').title()}",
-            "fasta_url": f"/api/files/genome/{species}/reference/chr1.fa",
-            "fai_url": f"/api/files/genome/{species}/reference/chr1.fa.fai",
+            "id": f"{reference.id}_genes",
+            "ref": reference.id,
+            "name": f"Genes ({os.path.basename(reference.gff_path)})",
+            "type": "annotation",
+            "gff_url": reference.to_dict()["gff_url"],
+            "features_url": f"/api/genome/{species}/{reference.id}/features",
+            "genes": reference.gene_count,
         }
+        for reference in info.references
+        if reference.gff_path
     ]
 
 
-@router.get("/{species}/tracks")
-async def list_tracks(species: str):
-    """List available tracks for a species"""
-    return []
+def _get_reference(species: str, ref: str) -> ReferenceInfo:
+    reference = reference_registry.get_reference(species, ref)
+    if not reference:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    return reference
+
+
+def _open_reference(species: str, ref: str) -> SequenceReader:
+    """Open the sequence store (.2bit or indexed FASTA) of a reference or raise 404"""
+    return fasta_service.open(_get_reference(species, ref).sequence_path)
+
+
+def _region_error(fasta: SequenceReader, chrom: str, start: int, end: int) -> Optional[str]:
+    """Validate a 0-based, end-exclusive region against the reference"""
+    if chrom not in fasta.lengths:
+        return f"Sequence '{chrom}' not found"
+    if start < 0 or end <= start:
+        return "Region must satisfy 0 <= start < end"
+    if end - start > settings.MAX_SEQUENCE_REGION:
+        return f"Region larger than {settings.MAX_SEQUENCE_REGION} bp"
+    return None
+
+
+@router.get("/{species}/{ref}/sequence")
+def get_sequence(species: str, ref: str, chrom: str, start: int, end: int):
+    """Get reference bases of a region (0-based start, exclusive end)"""
+    fasta = _open_reference(species, ref)
+    error = _region_error(fasta, chrom, start, end)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    sequence = fasta.fetch(chrom, start, end)
+    return {
+        "chrom": chrom,
+        "start": start,
+        "end": start + len(sequence),
+        "sequence": sequence,
+    }
+
+
+@router.post("/{species}/{ref}/sequence")
+async def get_sequences(species: str, ref: str, request: Request):
+    """Get bases of many regions; the body is BED, the response is streamed FASTA"""
+    fasta = await run_in_threadpool(_open_reference, species, ref)
+    body = (await request.body()).decode("utf-8", errors="replace")
+
+    regions = []
+    for line_no, line in enumerate(body.splitlines(), 1):
+        if not line.strip() or line.startswith(("#", "track", "browser")):
+            continue
+        fields = line.split()
+        try:
+            chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+        except (IndexError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid BED line {line_no}")
+        error = _region_error(fasta, chrom, start, end)
+        if error:
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: {error}")
+        name = fields[3] if len(fields) > 3 else f"{chrom}:{start + 1}-{end}"
+        regions.append((chrom, start, end, name))
+
+    def generate():
+        for chrom, start, end, name in regions:
+            sequence = fasta.fetch(chrom, start, end)
+            lines = [sequence[i:i + 60] for i in range(0, len(sequence), 60)]
+            yield f">{name}\n" + "\n".join(lines) + "\n"
+
+    return StreamingResponse(generate(), media_type="text/x-fasta")
+
+
+@router.get("/{species}/{ref}/features")
+def get_features(species: str, ref: str, chrom: str, start: int, end: int):
+    """
+    Get annotated gene models overlapping a region (0-based start, exclusive end)
+
+    A plain function, so it runs in the thread pool: opening an annotation
+    for the first time parses the whole GFF3 to build its indexes.
+    """
+    gff_path = _get_reference(species, ref).gff_path
+    if not gff_path:
+        raise HTTPException(status_code=404, detail="Annotation not found")
+    if start < 0 or end <= start:
+        raise HTTPException(status_code=400, detail="Region must satisfy 0 <= start < end")
+    if end - start > settings.MAX_FEATURE_REGION:
+        raise HTTPException(status_code=400, detail=f"Region larger than {settings.MAX_FEATURE_REGION} bp")
+
+    features = annotation_service.open(gff_path).query(chrom, start, end)
+    return {
+        "chrom": chrom,
+        "start": start,
+        "end": end,
+        "features": features,
+    }
+
+
+@router.get("/{species}/{ref}/summary")
+async def get_summary(species: str, ref: str, chrom: str, start: int, end: int, bins: int = 500):
+    """Get GC content, N content and gene density of a region as a fixed number of bins"""
+    reference = await run_in_threadpool(_get_reference, species, ref)
+    if chrom not in reference.sequences:
+        raise HTTPException(status_code=404, detail=f"Sequence '{chrom}' not found")
+    if start < 0 or end <= start or start >= reference.sequences[chrom]:
+        raise HTTPException(status_code=400, detail="Region must satisfy 0 <= start < end <= length")
+    if not 1 <= bins <= settings.MAX_SUMMARY_BINS:
+        raise HTTPException(status_code=400, detail=f"bins must be between 1 and {settings.MAX_SUMMARY_BINS}")
+
+    # First request after a new assembly is dropped in builds the tiles
+    tiles = await run_in_threadpool(summary_service.open, reference)
+    return tiles.query(chrom, start, end, bins)
@@ -2,94 +2,232 @@
 Tools API endpoints (BLAST, alignment, etc.)
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import Dict
-from datetime import datetime
-from db import get_db, AnalysisJob
+from typing import Dict, List
+import asyncio
+import json
+import os
+from config import settings
+from core.permissions import get_role
+from db import get_db, SessionLocal, AnalysisJob
 from api.auth import auth_dependency
-from services.blast_service import blast_service
+from services.blast_db import blast_databases
+from services.blast_results import HITS_INDEX, read_hits
+from services.blast_service import parse_fasta_queries
+from services.job_events import job_events, format_sse, TERMINAL_STATUSES
+from services.job_executor import job_executor, job_result_dir, load_result
+from services.job_scheduler import queue_position
+from services.password_hasher import password_hasher
+from services.result_cache import blast_cache
+from services.result_files import iter_lines, read_range
+from services.result_retention import result_retention
 
 router = APIRouter()
 
 
+def _check_job_quota(db: Session, token: dict):
+    """Refuse a new job while the user already has their role's maximum queued"""
+    role = get_role(token.get("role"))
+    pending = db.query(func.count(AnalysisJob.id)).filter(
+        AnalysisJob.user_id == token.get("sub"), AnalysisJob.status == "pending"
+    ).scalar()
+    if pending >= role.max_pending_jobs:
+        raise HTTPException(
+            status_code=429,
+            detail=f"At most {role.max_pending_jobs} queued jobs per user; wait for some to finish",
+        )
+
+
 @router.post("/blast")
 async def submit_blast(
     request: Dict,
     token: dict = Depends(auth_dependency),
     db: Session = Depends(get_db)
 ):
-    """Submit and run BLAST search"""
+    """Queue a BLAST search; follow it with GET /jobs/events, then fetch GET /blast/{job_id}"""
     # Validate request
     query_sequence = request.get("sequence") or request.get("query")
     if not query_sequence:
         raise HTTPException(status_code=400, detail="Sequence is required")
+    try:
+        float(request.get("expect", 0.001))
+        int(request.get("num_results", 20))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid expect or num_results")
+    _check_job_quota(db, token)
     
-    database = request.get("database", "giant_panda")
-    program = request.get("program", "blastn")
-    expect = float(request.get("expect", 0.001))
-    num_results = int(request.get("num_results", 20))
-    
-    # Run BLAST
-    result = blast_service.run_blast(
-        query_sequence=query_sequence,
-        database=database,
-        program=program,
-        expect=expect,
-        num_results=num_results,
-    )
-    
-    # Create job record
+    # Create job record; the job executor picks it up
     job = AnalysisJob(
         user_id=token.get("sub"),
         job_type="blast",
-        status="completed",
+        status="pending",
         input_params=request,
-        result_path=result.get("job_id"),
-        started_at=datetime.utcnow(),
-        completed_at=datetime.utcnow(),
     )
     db.add(job)
     db.commit()
     db.refresh(job)
+    job_executor.notify()
+    await job_events.publish(job.id, "pending")
     
     return {
         "job_id": job.id,
-        "status": "completed",
-        "result": result,
+        "status": "pending",
+        "message": "BLAST job submitted. Use GET /api/tools/blast/{job_id} to check status.",
     }
 
 
-@router.post("/blast/simulate")
-async def submit_blast_simulate(
+@router.post("/blast/batch")
+async def submit_blast_batch(
     request: Dict,
     token: dict = Depends(auth_dependency),
     db: Session = Depends(get_db)
 ):
-    """Submit BLAST job (simulated)"""
-    query_sequence = request.get("sequence") or request.get("query")
-    if not query_sequence:
-        raise HTTPException(status_code=400, detail="Sequence is required")
+    """
+    Queue a multi-query BLAST search from a multi-FASTA body
     
-    database = request.get("database", "giant_panda")
+    All queries run through a few multi-query BLAST processes; results
+    are available per query or as an NDJSON stream while the job runs.
+    """
+    try:
+        queries = parse_fasta_queries(request.get("fasta") or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not queries:
+        raise HTTPException(status_code=400, detail="FASTA body is required")
+    if len(queries) > settings.BLAST_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BLAST_BATCH_MAX_QUERIES} queries per batch",
+        )
+    _check_job_quota(db, token)
     
-    # Create job
     job = AnalysisJob(
         user_id=token.get("sub"),
-        job_type="blast",
+        job_type="blast_batch",
         status="pending",
         input_params=request,
     )
     db.add(job)
     db.commit()
     db.refresh(job)
+    job_executor.notify()
+    await job_events.publish(job.id, "pending", queries_total=len(queries))
     
     return {
         "job_id": job.id,
         "status": "pending",
-        "message": "BLAST job submitted. Use GET /api/tools/blast/{job_id} to check status.",
+        "queries": len(queries),
+        "message": f"Batch submitted. Stream results from GET /api/tools/blast/{job.id}/stream.",
     }
 
 
+def _job_states(job_ids: List[int]) -> List[dict]:
+    """Current state of jobs, read with a session of its own (for long-lived streams)"""
+    db = SessionLocal()
+    try:
+        jobs = db.query(AnalysisJob.id, AnalysisJob.status, AnalysisJob.error_message).filter(
+            AnalysisJob.id.in_(job_ids)
+        ).all()
+        return [{"job_id": job_id, "status": status, "error": error} for job_id, status, error in jobs]
+    finally:
+        db.close()
+
+
+def _get_job(db: Session, token: dict, job_id: int, job_type: str = None) -> AnalysisJob:
+    """A job of the caller (any job for admins); 404 otherwise"""
+    query = db.query(AnalysisJob).filter(AnalysisJob.id == job_id)
+    if job_type:
+        query = query.filter(AnalysisJob.job_type == job_type)
+    if token.get("role") != "admin":
+        query = query.filter(AnalysisJob.user_id == token.get("sub"))
+    job = query.first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/events")
+async def stream_job_events(
+    ids: str,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events with the state and progress of one or more jobs
+    
+    ``ids`` is a comma-separated list of job ids. Each job's current state
+    is sent first as a ``job`` event, followed by one for every change
+    (pending, running with progress fields, completed with hit counts,
+    failed with the error). An ``end`` event closes the stream once every
+    job has finished.
+    """
+    try:
+        job_ids = sorted({int(i) for i in ids.split(",") if i.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated job ids")
+    if not job_ids or len(job_ids) > settings.JOB_EVENTS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {settings.JOB_EVENTS_MAX_IDS} job ids are required")
+    
+    # Subscribe before reading the jobs so no change between the two is missed
+    subscription = job_events.subscribe(job_ids)
+    query = db.query(AnalysisJob).filter(AnalysisJob.id.in_(job_ids))
+    if token.get("role") != "admin":
+        query = query.filter(AnalysisJob.user_id == token.get("sub"))
+    jobs = query.all()
+    if len(jobs) != len(job_ids):
+        subscription.close()
+        raise HTTPException(status_code=404, detail="Job not found")
+    states = {job.id: {"job_id": job.id, "status": job.status, "error": job.error_message} for job in jobs}
+    
+    # Without a bus that sees every executor, the database check is what detects changes
+    recheck = settings.JOB_EVENTS_RECHECK if job_events.authoritative else settings.JOB_POLL_INTERVAL
+    
+    async def events():
+        try:
+            for state in states.values():
+                yield format_sse("job", state)
+            open_ids = {job_id for job_id, state in states.items() if state["status"] not in TERMINAL_STATUSES}
+            while open_ids:
+                changes = await subscription.get(recheck)
+                if not changes:
+                    changes = [
+                        state for state in await run_in_threadpool(_job_states, list(open_ids))
+                        if state["status"] != states[state["job_id"]]["status"]
+                    ]
+                    if not changes:
+                        # Keeps proxies from timing the connection out
+                        yield b": keepalive\n\n"
+                for change in changes:
+                    if change["job_id"] not in open_ids:
+                        continue
+                    states[change["job_id"]] = change
+                    yield format_sse("job", change)
+                    if change["status"] in TERMINAL_STATUSES:
+                        open_ids.discard(change["job_id"])
+            yield format_sse("end", {"job_ids": job_ids})
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/blast/simulate")
+async def submit_blast_simulate(
+    request: Dict,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """Submit BLAST job (kept for older clients, same as POST /blast)"""
+    return await submit_blast(request, token, db)
+
+
 @router.get("/blast/{job_id}")
 async def get_blast_result(
     job_id: int,
@@ -97,16 +235,156 @@ async def get_blast_result(
     db: Session = Depends(get_db)
 ):
     """Get BLAST job status/result"""
-    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+    job = _get_job(db, token, job_id)
     
     return {
         "job_id": job.id,
         "status": job.status,
         "job_type": job.job_type,
-        "result": job.result_path,
+        "queue_position": queue_position(db, job),
+        "result": await run_in_threadpool(load_result, job),
+        "error": job.error_message,
         "created_at": job.created_at,
         "started_at": job.started_at,
         "completed_at": job.completed_at,
     }
+
+
+@router.get("/blast/{job_id}/hits")
+async def get_blast_hits(
+    job_id: int,
+    offset: int = 0,
+    limit: int = 50,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """Page through every hit of a BLAST job, each with all of its HSPs"""
+    offset = max(0, offset)
+    limit = max(1, min(limit, 500))
+    job = _get_job(db, token, job_id)
+    if job.status != "completed":
+        return {"job_id": job.id, "status": job.status, "offset": offset, "limit": limit, "total": None, "hits": []}
+    
+    out_dir = job_result_dir(job.id)
+    if not os.path.exists(os.path.join(out_dir, HITS_INDEX)):
+        raise HTTPException(status_code=404, detail="No hits stored for this job")
+    total, hits = await run_in_threadpool(read_hits, out_dir, offset, limit)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "hits": hits,
+    }
+
+
+def _job_status(job_id: int) -> tuple:
+    db = SessionLocal()
+    try:
+        job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        return job.status, job.error_message
+    finally:
+        db.close()
+
+
+@router.get("/blast/{job_id}/stream")
+async def stream_blast_batch(
+    job_id: int,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream per-query results of a batch job as NDJSON while it runs
+    
+    The last line reports the final job status.
+    """
+    job = _get_job(db, token, job_id, "blast_batch")
+    out_dir = job_result_dir(job.id)
+    
+    async def lines():
+        pos = 0
+        while True:
+            # Status first: anything written before completion is then read below
+            status, error = await run_in_threadpool(_job_status, job_id)
+            try:
+                # Plain while running, compressed once finished
+                data = await run_in_threadpool(read_range, out_dir, "queries.ndjson", pos)
+            except FileNotFoundError:
+                data = b""
+            # Only whole lines; a partial line is picked up next round
+            data = data[:data.rfind(b"\n") + 1]
+            pos += len(data)
+            if data:
+                yield data
+            if status in TERMINAL_STATUSES:
+                yield json.dumps({"status": status, "error": error}).encode() + b"\n"
+                return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/blast/{job_id}/queries/{query_id:path}")
+async def get_blast_query_result(
+    job_id: int,
+    query_id: str,
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """Result of one query of a batch job, once its chunk has finished"""
+    job = _get_job(db, token, job_id, "blast_batch")
+    
+    def find():
+        prefix = json.dumps({"query_id": query_id}, separators=(",", ":"))[:-1]
+        for line in iter_lines(job_result_dir(job.id), "queries.ndjson"):
+            if line.startswith(prefix) and line.endswith("\n"):
+                return json.loads(line)
+        return None
+    
+    result = await run_in_threadpool(find)
+    if result is None:
+        if job.status in ("pending", "running"):
+            return {"job_id": job.id, "query_id": query_id, "status": job.status}
+        raise HTTPException(status_code=404, detail="Query not found")
+    return {"job_id": job.id, "status": "completed", **result}
+
+
+@router.get("/usage")
+async def get_result_usage(
+    token: dict = Depends(auth_dependency),
+    db: Session = Depends(get_db)
+):
+    """Storage taken by the current user's job results and how long they are kept"""
+    jobs, result_bytes = db.query(
+        func.count(AnalysisJob.id), func.coalesce(func.sum(AnalysisJob.result_bytes), 0)
+    ).filter(AnalysisJob.user_id == token.get("sub"), AnalysisJob.status == "completed").one()
+    return {
+        "jobs": jobs,
+        "result_bytes": int(result_bytes),
+        "retention_days": get_role(token.get("role")).result_retention_days,
+    }
+
+
+@router.get("/metrics")
+async def get_tool_metrics(token: dict = Depends(auth_dependency)):
+    """Job executor and BLAST result cache counters, database builds and the last retention sweep (admin only)"""
+    if token.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    stats = job_executor.stats
+    lookups = stats["cache_hits"] + stats["cache_misses"] + stats["cache_coalesced"]
+    return {
+        "executor": {
+            "embedded": settings.JOB_EXECUTOR_EMBEDDED,
+            "workers": job_executor.workers,
+            **stats,
+        },
+        "blast_cache": {
+            "hit_rate": round((stats["cache_hits"] + stats["cache_coalesced"]) / lookups, 4) if lookups else None,
+            **await run_in_threadpool(blast_cache.usage),
+        },
+        "blast_databases": await run_in_threadpool(blast_databases.status),
+        "retention": result_retention.last_sweep,
+        "password_hasher": password_hasher.usage(),
+    }
@@ -0,0 +1,116 @@
+"""
+Login storm benchmark
+
+Fires a burst of concurrent logins at the API (in process, through
+httpx's ASGI transport) while another client keeps requesting /health,
+and reports login throughput and the latency of those other requests.
+The bounded hashing pool (services/password_hasher.py) is compared
+against hashing inline on the event loop, as login did before. Uses the
+configured DATABASE_URL; a throwaway user is registered on first run.
+
+Usage (from backend/): python benchmarks/login_storm.py [--logins 40] [--probe-interval 0.02]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import api.auth  # noqa: E402
+from config import settings  # noqa: E402
+from db.connection import engine, Base  # noqa: E402
+from main import app  # noqa: E402
+from services.password_hasher import PasswordHasher  # noqa: E402
+
+EMAIL = "login-storm@example.org"
+PASSWORD = "LoginStorm123!"
+
+
+class InlineHasher(PasswordHasher):
+    """Hashes on the calling thread, i.e. blocking the event loop"""
+
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def storm(client: httpx.AsyncClient, logins: int, probe_interval: float) -> dict:
+    done = asyncio.Event()
+    latencies: List[float] = []
+    statuses: List[int] = []
+
+    async def probe():
+        # Latency counts from when a request was due, so time the loop spent
+        # blocked before it could even be sent is included
+        due = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/health")
+            now = time.perf_counter()
+            latencies.append(now - due)
+            due = max(due + probe_interval, now)
+
+    async def login():
+        response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        statuses.append(response.status_code)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(probe_interval * 5)
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return {
+        "elapsed": elapsed,
+        "ok": statuses.count(200),
+        "rejected": statuses.count(503),
+        "latencies": latencies,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40, help="concurrent logins in the burst")
+    parser.add_argument("--probe-interval", type=float, default=0.02, help="seconds between /health requests")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/auth/register", json={
+            "email": EMAIL, "username": "login-storm", "password": PASSWORD,
+        })
+
+        print(f"{args.logins} concurrent logins, /health every {args.probe_interval}s, "
+              f"pool of {settings.PASSWORD_HASH_WORKERS} threads + {settings.PASSWORD_HASH_QUEUE} queued\n")
+        print(f"{'hashing':<8} {'logins/s':>9} {'ok':>5} {'503':>5} "
+              f"{'/health p50':>12} {'p95':>9} {'max':>9}")
+        hashers = {
+            "inline": InlineHasher(1, 0),
+            "pool": PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE),
+        }
+        for name, hasher in hashers.items():
+            api.auth.password_hasher = hasher
+            result = await storm(client, args.logins, args.probe_interval)
+            latencies = result["latencies"]
+            print(
+                f"{name:<8} {result['ok'] / result['elapsed']:>9.1f} {result['ok']:>5} {result['rejected']:>5} "
+                + " ".join(f"{percentile(latencies, pct) * 1000:>{width}.1f}ms"
+                           for pct, width in ((50, 10), (95, 7), (100, 7)))
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Scheduler load test
+
+Simulates the job executor's workers under a heavy user who submits
+BLAST jobs continuously alongside light users who submit occasionally,
+and reports how long jobs wait in the queue per class of user. The fair
+scheduler (services/job_scheduler.py, with the role quotas of
+core/permissions.py) is compared against the previous oldest-first
+claiming without quotas. Time is simulated, so a run takes seconds.
+
+Usage (from backend/): python benchmarks/scheduler_load.py [--workers 2] [--minutes 60]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+from collections import deque
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.permissions import get_role  # noqa: E402
+from services.job_scheduler import FairScheduler, UserQueue  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def simulate(policy: str, workers: int, minutes: float, heavy_interval: float,
+             light_users: int, light_interval: float, service_time: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    end = minutes * 60
+    users = {0: "collaborator"}
+    users.update({i: "researcher" for i in range(1, light_users + 1)})
+
+    # (time, order, kind, user) events; arrivals are Poisson per user
+    events = []
+    order = 0
+
+    def schedule(time, kind, user):
+        nonlocal order
+        heapq.heappush(events, (time, order, kind, user))
+        order += 1
+
+    schedule(0.0, "arrive", 0)
+    for user in range(1, light_users + 1):
+        schedule(rng.expovariate(1 / light_interval), "arrive", user)
+
+    queues: Dict[int, deque] = {user: deque() for user in users}
+    running: Dict[int, int] = {user: 0 for user in users}
+    waits: Dict[str, List[float]] = {"heavy": [], "light": []}
+    rejected = {"heavy": 0, "light": 0}
+    free = workers
+    scheduler = FairScheduler()
+    next_id = 0
+
+    def dispatch(now):
+        nonlocal free
+        while free:
+            if policy == "fifo":
+                candidates = [(queues[u][0][0], u) for u in users if queues[u]]
+                if not candidates:
+                    return
+                user = min(candidates)[1]
+            else:
+                chosen = scheduler.select([
+                    UserQueue(user_id=u, role=users[u], pending=len(queues[u]), running=running[u],
+                              head_id=queues[u][0][0] if queues[u] else None)
+                    for u in users if queues[u]
+                ])
+                if chosen is None:
+                    return
+                scheduler.dispatched(chosen)
+                user = chosen.user_id
+            job_id, submitted = queues[user].popleft()
+            waits["heavy" if user == 0 else "light"].append(now - submitted)
+            running[user] += 1
+            free -= 1
+            schedule(now + rng.expovariate(1 / service_time), "finish", user)
+
+    while events:
+        now, _, kind, user = heapq.heappop(events)
+        if now > end:
+            break
+        label = "heavy" if user == 0 else "light"
+        if kind == "arrive":
+            # Admission control only applies with the fair scheduler
+            if policy == "fair" and len(queues[user]) >= get_role(users[user]).max_pending_jobs:
+                rejected[label] += 1
+            else:
+                queues[user].append((next_id, now))
+                next_id += 1
+            interval = heavy_interval if user == 0 else rng.expovariate(1 / light_interval)
+            schedule(now + interval, "arrive", user)
+        else:
+            running[user] -= 1
+            free += 1
+        dispatch(now)
+
+    return {"waits": waits, "rejected": rejected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--heavy-interval", type=float, default=0.2, help="seconds between the heavy user's jobs")
+    parser.add_argument("--light-users", type=int, default=10)
+    parser.add_argument("--light-interval", type=float, default=120, help="mean seconds between a light user's jobs")
+    parser.add_argument("--service-time", type=float, default=1.0, help="mean seconds per job")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, heavy user every {args.heavy_interval}s, "
+          f"{args.light_users} light users every ~{args.light_interval}s, ~{args.service_time}s per job, "
+          f"{args.minutes:g} simulated minutes\n")
+    print(f"{'policy':<6} {'user':<6} {'jobs':>6} {'p50 wait':>10} {'p95 wait':>10} {'p99 wait':>10} {'max wait':>10} {'rejected':>9}")
+    for policy in ("fifo", "fair"):
+        result = simulate(
+            policy, args.workers, args.minutes, args.heavy_interval,
+            args.light_users, args.light_interval, args.service_time, args.seed,
+        )
+        for label in ("light", "heavy"):
+            waits = result["waits"][label]
+            print(
+                f"{policy:<6} {label:<6} {len(waits):>6} "
+                + " ".join(f"{percentile(waits, pct):>9.1f}s" for pct in (50, 95, 99, 100))
+                + f" {result['rejected'][label]:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Genome index build script
+
+Precomputes everything the genome browser and BLAST endpoints would
+otherwise build on first request: .fai indexes, annotation interval/name
+indexes, summary tiles and each species' search database, and packs each
+FASTA into a .2bit file that the sequence endpoints read from. Plain
+FASTA files are also bgzip-compressed (with .fai and .gzi indexes) for
+the genome browsers; once that is done the uncompressed FASTA may be
+deleted. Run it after dropping a new assembly into GENOME_DATA_DIR.
+"""
+import os
+import sys
+from services.bgzf import bgzip_file
+from services.fasta_service import fasta_service, write_fai, BGZF_SUFFIX
+from services.blast_db import blast_databases
+from services.reference_registry import reference_registry
+from services.summary_service import summary_service
+from services.twobit import fasta_to_twobit
+
+
+def build_indexes(species_filter=None):
+    """Build indexes for every reference, or only those of the given species"""
+    for species in reference_registry.list_species():
+        if species_filter and species.id not in species_filter:
+            continue
+        for reference in species.references:
+            # The registry scan has already (re)built .fai and annotation indexes
+            print(f"🧬 {species.id}/{reference.id}: {len(reference.sequences)} sequences")
+            if reference.fasta_path and not reference.bgzf_path:
+                bgzf_path = reference.fasta_path + BGZF_SUFFIX
+                bgzip_file(reference.fasta_path, bgzf_path)
+                # Offsets in a bgzip .fai refer to the uncompressed text, so they are unchanged
+                write_fai(bgzf_path + ".fai", list(fasta_service.open(reference.fasta_path).index.values()))
+                reference.bgzf_path = bgzf_path
+                ratio = os.path.getsize(reference.fasta_path) / max(os.path.getsize(bgzf_path), 1)
+                print(f"✅ Compressed {species.id}/{reference.id} into {os.path.basename(bgzf_path)} ({ratio:.1f}x)")
+            source_path = reference.fasta_path or reference.bgzf_path
+            if source_path and not reference.twobit_path:
+                base = source_path[:-len(BGZF_SUFFIX)] if source_path.endswith(BGZF_SUFFIX) else source_path
+                twobit_path = os.path.splitext(base)[0] + ".2bit"
+                fasta_to_twobit(fasta_service.open(source_path), twobit_path)
+                reference.twobit_path = twobit_path
+                print(f"✅ Packed {species.id}/{reference.id} into {os.path.basename(twobit_path)}")
+            if summary_service.ensure_built(reference):
+                print(f"✅ Built summary tiles for {species.id}/{reference.id}")
+        before = blast_databases.current(species.id)
+        build = blast_databases.ensure_current(species.id)
+        if before is None or before.version != build.version:
+            engine = "BLAST database and k-mer index" if build.blastdb else "k-mer index"
+            print(f"✅ Built {species.id} search database {build.version} ({engine})")
+
+
+if __name__ == "__main__":
+    print("Building genome indexes...")
+    build_indexes(sys.argv[1:])
+    print("Genome indexes up to date!")
@@ -4,6 +4,7 @@ Configuration for Panda Genomics Portal
 import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List
 
 
 class Settings(BaseSettings):
@@ -12,11 +13,19 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    SESSION_BACKEND: str = "local"  # "redis" shares validated sessions and revocations through REDIS_URL, needed with several API processes
+    SESSION_CACHE_TTL: int = 60  # Seconds a validated session is trusted without checking the database
+    SESSION_CACHE_SIZE: int = 100_000  # Validated sessions cached per process
+    MAX_SESSIONS_PER_USER: int = 10  # Live sessions per user; logging in beyond this ends the oldest
+    SESSION_PURGE_INTERVAL: int = 600  # Seconds between deletions of expired and revoked sessions
+    SESSION_PURGE_BATCH: int = 1000  # Sessions deleted per transaction
     
     # JWT
     JWT_SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    PASSWORD_HASH_WORKERS: int = 4  # bcrypt computations run at once per API process
+    PASSWORD_HASH_QUEUE: int = 64  # Sign-ins waiting for a hashing thread before new ones get 503
     
     # Email (optional)
     SMTP_HOST: str = ""
@@ -27,13 +36,48 @@ class Settings(BaseSettings):
     # File uploads
     UPLOAD_DIR: str = "./data"
     MAX_FILE_SIZE: int = 5 * 1024 * 1024 * 1024  # 5GB
+    UPLOAD_EXPIRY: int = 7 * 24 * 3600  # Resumable uploads without progress for this long are deleted
+    BLOB_GC_GRACE: int = 24 * 3600  # Unreferenced dataset blobs younger than this survive garbage collection
+    EXPORT_BATCH_SIZE: int = 1000  # Dataset rows fetched and written per batch when streaming exports
+    DATASET_COUNT_MODE: str = "cached"  # Default total of dataset listings: exact, estimated, cached or none
+    DATASET_COUNT_TTL: int = 60  # Seconds a cached dataset listing total is reused
     
     # Genome data
     GENOME_DATA_DIR: str = "./data/genomes"
+    MAX_SEQUENCE_REGION: int = 1_000_000  # Largest region served by /sequence
+    MAX_FEATURE_REGION: int = 10_000_000  # Largest region served by /features
+    MAX_SUMMARY_BINS: int = 2000  # Largest bin count served by /summary
+    GENOME_FILE_MAX_AGE: int = 365 * 24 * 3600  # Cache lifetime of reference FASTA files requested at their current version
     
     # BLAST
     BLAST_DB_PATH: str = "./data/blast"
+    BLAST_DB_CHECK_INTERVAL: int = 300  # Seconds between checks of the references for database rebuilds
+    BLAST_DB_KEEP_VERSIONS: int = 2  # Database builds kept per species, including the current one
+    BLAST_WARM_DATABASES: List[str] = []  # Databases paged in by every worker; empty means all
     TEMP_DIR: str = "./data/tmp"
+    BLAST_THREADS: int = 2  # -num_threads given to each BLAST process
+    BLAST_RESULT_PREVIEW: int = 50  # Hits embedded in a job result; the rest are paged from /hits
+    BLAST_BATCH_MAX_QUERIES: int = 1000  # Queries accepted by one batch submission
+    BLAST_BATCH_CHUNK: int = 100  # Queries searched per BLAST process in a batch
+    BLAST_CACHE_TTL: int = 7 * 24 * 3600  # Lifetime of a cached BLAST result
+    BLAST_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # Cached results beyond this are evicted, least recently used first
+    KMER_SIZE: int = 12  # K-mer length of the built-in search index (at most 16)
+    KMER_STEP: int = 4  # Reference k-mers are sampled this often; exact matches of KMER_SIZE + KMER_STEP - 1 bases always seed
+    KMER_MAX_OCCURRENCES: int = 500  # K-mers more frequent than this are treated as repeats and not seeded on
+    KMER_MAX_QUERY: int = 10_000  # Longest query the built-in search accepts
+    KMER_FAST_PATH_MAX: int = 100  # blastn queries up to this length use the built-in search directly
+    
+    # Analysis jobs
+    JOB_WORKERS: int = 2  # Jobs run concurrently per executor (worker processes)
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between checks for pending jobs
+    JOB_TIMEOUT: int = 3600  # Running jobs older than this are marked failed
+    JOB_EXECUTOR_EMBEDDED: bool = True  # Run the executor inside the API process; set False when using worker.py
+    RESULT_DIR: str = "./data/results"
+    RESULT_SWEEP_INTERVAL: int = 3600  # Seconds between sweeps for expired results and stale temp files
+    TEMP_FILE_MAX_AGE: int = 24 * 3600  # Temp files and unowned result directories older than this are removed
+    JOB_EVENTS_BACKEND: str = "local"  # "redis" relays job events through REDIS_URL, needed with worker.py or several API processes
+    JOB_EVENTS_RECHECK: int = 15  # Seconds between database checks of a job event stream's jobs
+    JOB_EVENTS_MAX_IDS: int = 100  # Jobs one event stream may follow
     
     class Config:
         env_file = ".env"
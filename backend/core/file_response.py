@@ -0,0 +1,202 @@
+"""
+File responses with HTTP Range, ETag and conditional GET support
+"""
+import os
+import stat
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Iterator, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+MAX_RANGES = 64
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_version(stat_result: os.stat_result) -> str:
+    """Token that changes whenever a file's size or modification time does"""
+    return f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag derived from file size and modification time"""
+    return f'"{file_version(stat_result)}"'
+
+
+def _media_type(path: str) -> str:
+    """
+    Content type of a served file
+
+    Compressed files (e.g. bgzip FASTA) are sent as-is with their own type and
+    never with Content-Encoding, so byte ranges address the compressed stream
+    as .gzi-aware clients expect.
+    """
+    media_type, encoding = guess_type(path)
+    if encoding == "gzip":
+        return "application/gzip"
+    if encoding:
+        return "application/octet-stream"
+    return media_type or "text/plain"
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a Range header into sorted, merged (start, end) byte ranges (end inclusive)
+
+    Returns None when the header is malformed, in which case it must be
+    ignored and the full file served. Raises RangeNotSatisfiable when no
+    range overlaps the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                # Suffix range: the last N bytes
+                suffix = int(last)
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges or len(ranges) > MAX_RANGES:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (If-None-Match takes precedence)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _read_multipart(path: str, parts: List[Tuple[bytes, int, int]], closing: bytes) -> Iterator[bytes]:
+    for header, start, end in parts:
+        yield header
+        yield from _read_range(path, start, end)
+        yield b"\r\n"
+    yield closing
+
+
+def send_file(request: Request, path: str, cache_control: str = "no-cache") -> Response:
+    """
+    Serve a file honouring Range, If-Range, If-None-Match and If-Modified-Since
+
+    Single ranges are answered with 206 and a Content-Range header, multiple
+    ranges with a multipart/byteranges body, unsatisfiable ranges with 416.
+    """
+    stat_result = os.stat(path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    media_type = _media_type(path)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+    head_only = request.method == "HEAD"
+
+    if _is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            ranges = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if not ranges:
+        headers["content-length"] = str(size)
+        if head_only:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        return StreamingResponse(_read_range(path, 0, size - 1), headers=headers, media_type=media_type)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        headers["content-length"] = str(end - start + 1)
+        if head_only:
+            return Response(status_code=206, headers=headers, media_type=media_type)
+        return StreamingResponse(
+            _read_range(path, start, end), status_code=206, headers=headers, media_type=media_type
+        )
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n".encode(),
+            start,
+            end,
+        )
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    headers["content-length"] = str(
+        sum(len(h) + (e - s + 1) + 2 for h, s, e in parts) + len(closing)
+    )
+    multipart_type = f"multipart/byteranges; boundary={boundary}"
+    if head_only:
+        return Response(status_code=206, headers=headers, media_type=multipart_type)
+    return StreamingResponse(
+        _read_multipart(path, parts, closing), status_code=206, headers=headers, media_type=multipart_type
+    )
@@ -10,6 +10,13 @@ class Role:
     name: str
     description: str
     permissions: List[str]
+    # Analysis job scheduling: share of the workers relative to other users
+    # with queued jobs, jobs run at once and jobs waiting in the queue
+    job_weight: float = 1.0
+    max_running_jobs: int = 1
+    max_pending_jobs: int = 10
+    # Days a finished job's result is kept before the retention sweep removes it
+    result_retention_days: int = 30
 
 
 # Define all roles and their permissions
@@ -20,7 +27,11 @@ ROLES: Dict[str, Role] = {
         permissions=[
             "view_public_datasets",
             "use_genome_browser",
-        ]
+        ],
+        job_weight=1.0,
+        max_running_jobs=1,
+        max_pending_jobs=5,
+        result_retention_days=7,
     ),
     "registered": Role(
         name="registered",
@@ -31,7 +42,11 @@ ROLES: Dict[str, Role] = {
             "download_datasets",
             "save_analysis",
             "view_history",
-        ]
+        ],
+        job_weight=1.0,
+        max_running_jobs=1,
+        max_pending_jobs=20,
+        result_retention_days=30,
     ),
     "researcher": Role(
         name="researcher",
@@ -45,7 +60,11 @@ ROLES: Dict[str, Role] = {
             "use_blast",
             "create_analysis",
             "private_workspace",
-        ]
+        ],
+        job_weight=2.0,
+        max_running_jobs=2,
+        max_pending_jobs=100,
+        result_retention_days=90,
     ),
     "collaborator": Role(
         name="collaborator",
@@ -61,24 +80,34 @@ ROLES: Dict[str, Role] = {
             "private_workspace",
             "access_shared_datasets",
             "team_workspace",
-        ]
+        ],
+        job_weight=2.0,
+        max_running_jobs=3,
+        max_pending_jobs=200,
+        result_retention_days=180,
     ),
     "admin": Role(
         name="admin",
         description="Administrator",
         permissions=[
             "*",  # All permissions
-        ]
+        ],
+        job_weight=4.0,
+        max_running_jobs=4,
+        max_pending_jobs=1000,
+        result_retention_days=365,
     ),
 }
 
 
+def get_role(role_name: str) -> Role:
+    """Get a role, falling back to public for unknown names"""
+    return ROLES.get(role_name) or ROLES["public"]
+
+
 def get_role_permissions(role_name: str) -> List[str]:
     """Get permissions for a role"""
-    role = ROLES.get(role_name)
-    if not role:
-        return ROLES["public"].permissions
-    return role.permissions
+    return get_role(role_name).permissions
 
 
 def can_access_dataset(
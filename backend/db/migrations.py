@@ -0,0 +1,53 @@
+"""
+Schema upgrades for databases created before a column or index existed
+
+create_all only creates missing tables, so columns and indexes added to
+existing tables are listed here and created when missing. Columns are
+added first so that indexes on them can be built. Safe to run on every
+start, from any number of processes.
+"""
+import logging
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from db.connection import engine, Base
+
+logger = logging.getLogger(__name__)
+
+# (table, column) added to tables that already existed, oldest first
+ADDED_COLUMNS = [
+    ("analysis_jobs", "error_message"),
+    ("analysis_jobs", "result_bytes"),
+    ("datasets", "file_name"),
+    ("datasets", "sha256"),
+]
+
+# Indexes added to tables that already existed, oldest first
+ADDED_INDEXES = [
+    "ix_analysis_jobs_status",
+    "ix_analysis_jobs_status_user",
+    "ix_analysis_jobs_status_completed",
+    "ix_datasets_sha256",
+]
+
+
+def upgrade(bind: Engine = engine):
+    """Add the listed columns and indexes a database is missing"""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    # Concurrent starts on PostgreSQL must not fail on a column another process just added
+    if_not_exists = "IF NOT EXISTS " if bind.dialect.name == "postgresql" else ""
+    with bind.begin() as conn:
+        for table_name, column_name in ADDED_COLUMNS:
+            if table_name not in tables:
+                continue
+            if column_name in {column["name"] for column in inspector.get_columns(table_name)}:
+                continue
+            column_type = Base.metadata.tables[table_name].c[column_name].type.compile(dialect=bind.dialect)
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table_name} ADD COLUMN {if_not_exists}{column_name} {column_type}"
+            )
+            logger.info("Added column %s.%s", table_name, column_name)
+
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    for name in ADDED_INDEXES:
+        indexes[name].create(bind=bind, checkfirst=True)
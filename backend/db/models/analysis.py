@@ -2,7 +2,7 @@
 Analysis job database model
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from db.connection import Base
 
@@ -13,12 +13,21 @@ class AnalysisJob(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     job_type = Column(String(50), nullable=False)  # blast, alignment, variant_calling
-    status = Column(String(50), default="pending")  # pending, running, completed, failed
+    status = Column(String(50), default="pending", index=True)  # pending, running, completed, failed, expired
     input_params = Column(JSON, nullable=False)
     result_path = Column(Text)
+    result_bytes = Column(BigInteger)  # Stored (compressed) size of the result directory
+    error_message = Column(Text)
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="analysis_jobs")
+    
+    __table_args__ = (
+        # Per-user queue scans of the scheduler
+        Index("ix_analysis_jobs_status_user", "status", "user_id", "id"),
+        # Retention sweeps of finished jobs
+        Index("ix_analysis_jobs_status_completed", "status", "completed_at"),
+    )
@@ -2,7 +2,7 @@
 Dataset database model
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, BigInteger, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, BigInteger, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from db.connection import Base
 
@@ -15,8 +15,10 @@ class Dataset(Base):
     description = Column(Text)
     species = Column(String(100))
     data_type = Column(String(50))  # genome, transcriptome, variant, alignment
-    file_path = Column(Text, nullable=False)
+    file_path = Column(Text, nullable=False)  # Blob in the content-addressed store
+    file_name = Column(String(255))  # Name the file was uploaded with
     file_size = Column(BigInteger)
+    sha256 = Column(String(64), index=True)  # Content hash, naming the blob
     access_level = Column(String(50), default="registered")  # public, registered, researcher, collaborator
     uploaded_by = Column(Integer, ForeignKey("users.id"))
     meta_data = Column(JSON, default=dict)
@@ -25,3 +27,11 @@ class Dataset(Base):
     
     # Relationships
     uploader = relationship("User", back_populates="datasets")
+
+    __table_args__ = (
+        # Keyset pages of listings, newest first, unfiltered and per filter column
+        Index("ix_datasets_created_id", "created_at", "id"),
+        Index("ix_datasets_species_created_id", "species", "created_at", "id"),
+        Index("ix_datasets_data_type_created_id", "data_type", "created_at", "id"),
+        Index("ix_datasets_access_level_created_id", "access_level", "created_at", "id"),
+    )
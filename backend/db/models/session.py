@@ -2,7 +2,7 @@
 User session database model (for JWT blacklisting)
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from db.connection import Base
 
@@ -12,10 +12,15 @@ class UserSession(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    token_hash = Column(String(255), nullable=False)
+    token_hash = Column(String(255), nullable=False, index=True)
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     revoked = Column(Boolean, default=False)
     
     # Relationships
     user = relationship("User", back_populates="sessions")
+    
+    __table_args__ = (
+        # Live sessions of a user (per-user cap, revoking all on password change)
+        Index("ix_user_sessions_user_expires", "user_id", "expires_at"),
+    )
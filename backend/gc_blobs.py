@@ -0,0 +1,56 @@
+"""
+Dataset blob maintenance script
+
+Moves datasets stored before the blob store existed (UPLOAD_DIR/datasets/
+<date>/<file>) into it, hard-linking each file under its SHA-256 and
+removing the old name once no dataset refers to it, then deletes blobs
+no dataset refers to. Safe to run while the API is serving; schedule it
+e.g. daily.
+"""
+import os
+from sqlalchemy import distinct
+from db import SessionLocal, Dataset
+from services.blob_store import blob_store
+
+
+def adopt_legacy_datasets() -> int:
+    """Point datasets without a hash at blobs of their files; returns the datasets moved"""
+    db = SessionLocal()
+    moved = 0
+    try:
+        paths = [path for path, in db.query(distinct(Dataset.file_path)).filter(Dataset.sha256.is_(None))]
+        for path in paths:
+            if not os.path.isfile(path):
+                print(f"⚠️  Missing dataset file {path}")
+                continue
+            blob_path, deduplicated = blob_store.adopt(path)
+            datasets = db.query(Dataset).filter(Dataset.file_path == path).all()
+            for dataset in datasets:
+                dataset.sha256 = os.path.basename(blob_path)
+                dataset.file_name = dataset.file_name or os.path.basename(path)
+                dataset.file_path = blob_path
+            db.commit()
+            os.remove(path)
+            moved += len(datasets)
+            print(f"✅ {path} -> {os.path.basename(blob_path)}{' (duplicate)' if deduplicated else ''}")
+    finally:
+        db.close()
+    return moved
+
+
+def collect_garbage():
+    db = SessionLocal()
+    try:
+        referenced = {sha256 for sha256, in db.query(distinct(Dataset.sha256)).filter(Dataset.sha256.isnot(None))}
+    finally:
+        db.close()
+    removed, freed = blob_store.gc(referenced)
+    print(f"🧹 Removed {removed} unreferenced blobs ({freed / 1024 ** 3:.2f} GB)")
+
+
+if __name__ == "__main__":
+    print("Moving legacy datasets into the blob store...")
+    print(f"Moved {adopt_legacy_datasets()} datasets")
+    collect_garbage()
+    usage = blob_store.usage()
+    print(f"Blob store: {usage['blobs']} blobs, {usage['bytes'] / 1024 ** 3:.2f} GB")
@@ -3,12 +3,14 @@ Database initialization script
 """
 from db.connection import engine, Base, SessionLocal
 from db.models import User, Role, Dataset, AnalysisJob, PedigreeRecord, UserSession
+from db.migrations import upgrade
 
 
 def init_db():
     """Create all tables and default roles"""
     # Create tables
     Base.metadata.create_all(bind=engine)
+    upgrade()
     
     print("✅ All tables created successfully!")
     
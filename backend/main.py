@@ -7,16 +7,33 @@ from contextlib import asynccontextmanager
 
 from config import settings
 from db.connection import engine, Base
+from db.migrations import upgrade
 from api import auth, users, genome, datasets, tools, pedigree, files
+from services.job_events import job_events
+from services.job_executor import job_executor
+from services.session_cache import session_cache
+from services.session_store import session_store
+from services.dataset_catalog import dataset_catalog
+from services.dataset_search import dataset_search
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create database tables
+    # Startup: Create database tables and upgrade ones created by older versions
     Base.metadata.create_all(bind=engine)
+    upgrade()
+    session_store.ensure_indexes()
+    dataset_catalog.ensure_indexes()
+    dataset_search.ensure_index()
+    session_store.start()
+    if settings.JOB_EXECUTOR_EMBEDDED:
+        job_executor.start()
     yield
-    # Shutdown: Cleanup if needed
-    pass
+    # Shutdown: Stop the job executor, returning interrupted jobs to the queue
+    await job_executor.stop()
+    await session_store.stop()
+    await job_events.close()
+    await session_cache.close()
 
 
 app = FastAPI(
@@ -4,3 +4,4 @@ Pydantic schemas package
 from schemas.auth import *
 from schemas.user import *
 from schemas.dataset import *
+from schemas.upload import *
@@ -28,7 +28,9 @@ class DatasetUpdate(BaseModel):
 class DatasetResponse(DatasetBase):
     id: int
     file_path: str
+    file_name: Optional[str] = None
     file_size: Optional[int]
+    sha256: Optional[str] = None
     uploader_id: Optional[int]
     created_at: datetime
     updated_at: datetime
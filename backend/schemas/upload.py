@@ -0,0 +1,22 @@
+"""
+Resumable upload Pydantic schemas
+"""
+from pydantic import BaseModel, conint, constr
+from typing import Optional
+from config import settings
+
+
+class UploadDataset(BaseModel):
+    """Dataset registered when the upload completes"""
+    name: constr(min_length=1)
+    description: str = ""
+    species: str = ""
+    data_type: str = "other"
+    access_level: str = "registered"
+
+
+class UploadCreate(BaseModel):
+    filename: constr(min_length=1)
+    size: conint(strict=True, gt=0, le=settings.MAX_FILE_SIZE)
+    sha256: Optional[constr(pattern=r"^[0-9a-fA-F]{64}$")] = None
+    dataset: Optional[UploadDataset] = None
@@ -0,0 +1,354 @@
+"""
+Annotation Service - GFF3 parsing and on-disk interval index for region queries
+"""
+import json
+import mmap
+import os
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+from config import settings
+
+
+INDEX_VERSION = 3
+# Width of a linear-index window, as in tabix
+LINEAR_WINDOW = 16 * 1024
+GFF_EXTENSIONS = (".gff3", ".gff")
+SIDECARS = (".idx", ".models", ".names")
+
+
+def parse_gff3(gff_path: str) -> List[dict]:
+    """
+    Parse a GFF3 file into gene models
+
+    Features are converted to 0-based, end-exclusive coordinates and nested
+    under their Parent; features without a (known) parent become roots. A
+    feature with several parents is attached to each of them.
+    """
+    features = []
+    by_id: Dict[str, dict] = {}
+
+    with open(gff_path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("##FASTA"):
+                break
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 9:
+                continue
+
+            attributes = {}
+            for item in fields[8].split(";"):
+                key, sep, value = item.strip().partition("=")
+                if sep:
+                    attributes[unquote(key)] = unquote(value)
+
+            feature = {
+                "chrom": fields[0],
+                "type": fields[2],
+                "start": int(fields[3]) - 1,
+                "end": int(fields[4]),
+                "strand": fields[6] if fields[6] in ("+", "-") else None,
+            }
+            if fields[1] != ".":
+                feature["source"] = fields[1]
+            if fields[5] != ".":
+                feature["score"] = float(fields[5])
+            if fields[7] != ".":
+                feature["phase"] = int(fields[7])
+            for key in ("ID", "Name"):
+                if key in attributes:
+                    feature[key.lower()] = attributes.pop(key)
+            parents = attributes.pop("Parent", "")
+            if attributes:
+                feature["attributes"] = attributes
+
+            features.append((feature, [p for p in parents.split(",") if p]))
+            if "id" in feature:
+                by_id.setdefault(feature["id"], feature)
+
+    roots = []
+    for feature, parents in features:
+        attached = False
+        for parent_id in parents:
+            parent = by_id.get(parent_id)
+            if parent is not None and parent is not feature:
+                parent.setdefault("subfeatures", []).append(feature)
+                attached = True
+        if not attached:
+            roots.append(feature)
+    return roots
+
+
+def _span(feature: dict) -> tuple:
+    """Extent of a feature including all of its descendants"""
+    start, end = feature["start"], feature["end"]
+    for child in feature.get("subfeatures", ()):
+        child_start, child_end = _span(child)
+        start, end = min(start, child_start), max(end, child_end)
+    return start, end
+
+
+def _count_types(feature: dict, counts: Dict[str, int]):
+    counts[feature["type"]] = counts.get(feature["type"], 0) + 1
+    for child in feature.get("subfeatures", ()):
+        _count_types(child, counts)
+
+
+def _name_records(roots: List[dict]) -> List[list]:
+    """Searchable records for genes and their transcripts: [id, name, type, chrom, start, end, description]"""
+    records = []
+    for root in roots:
+        for feature in [root] + root.get("subfeatures", []):
+            if "id" not in feature and "name" not in feature:
+                continue
+            records.append([
+                feature.get("id"),
+                feature.get("name"),
+                feature["type"],
+                feature["chrom"],
+                feature["start"],
+                feature["end"],
+                feature.get("attributes", {}).get("description"),
+            ])
+    return records
+
+
+def _write_name_index(path: str, roots: List[dict]):
+    """
+    Write the sorted search keys of an annotation
+
+    Keys are lower-cased IDs, Names and description words, each pointing
+    at a record; exact and prefix lookups are binary searches over them.
+    """
+    records = _name_records(roots)
+    entries = set()
+    for i, (feature_id, name, _, _, _, _, description) in enumerate(records):
+        for key in (feature_id, name):
+            if key:
+                entries.add((key.lower(), i))
+        for word in re.findall(r"[\w-]{3,}", description or ""):
+            entries.add((word.lower(), i))
+    entries = sorted(entries)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "keys": [key for key, _ in entries],
+                "targets": [target for _, target in entries],
+                "records": records,
+            },
+            f,
+            separators=(",", ":"),
+        )
+
+
+def build_index(gff_path: str):
+    """
+    Parse a GFF3 file and write its interval index next to it
+
+    ``<gff>.models`` holds one JSON gene model per line, sorted by
+    chromosome and start, and ``<gff>.idx`` holds per-chromosome
+    start/end/offset/type arrays plus a tabix-style linear index mapping each
+    16 kb window to the first model that can overlap it. The gene name
+    search index is written to ``<gff>.names``.
+    """
+    roots = parse_gff3(gff_path)
+    by_chrom: Dict[str, list] = {}
+    counts: Dict[str, int] = {}
+    for root in roots:
+        start, end = _span(root)
+        by_chrom.setdefault(root["chrom"], []).append((start, end, root))
+        _count_types(root, counts)
+
+    models_path = gff_path + ".models"
+    chroms = {}
+    with open(models_path + ".tmp", "wb") as out:
+        for chrom in sorted(by_chrom):
+            models = sorted(by_chrom[chrom], key=lambda m: (m[0], m[1]))
+            starts, ends, offsets, types = [], [], [], []
+            for start, end, root in models:
+                starts.append(start)
+                ends.append(end)
+                offsets.append(out.tell())
+                types.append(root["type"])
+                out.write(json.dumps(root, separators=(",", ":")).encode("utf-8") + b"\n")
+
+            windows = (max(ends) - 1) // LINEAR_WINDOW + 1 if ends else 0
+            linear = [bisect_left(starts, w * LINEAR_WINDOW) for w in range(windows)]
+            for i, (start, end) in enumerate(zip(starts, ends)):
+                for w in range(start // LINEAR_WINDOW, (max(end, start + 1) - 1) // LINEAR_WINDOW + 1):
+                    if i < linear[w]:
+                        linear[w] = i
+            chroms[chrom] = {"starts": starts, "ends": ends, "offsets": offsets, "types": types, "linear": linear}
+
+    index = {
+        "version": INDEX_VERSION,
+        "feature_counts": counts,
+        "chroms": chroms,
+    }
+    with open(gff_path + ".idx.tmp", "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    _write_name_index(gff_path + ".names.tmp", roots)
+    os.replace(models_path + ".tmp", models_path)
+    os.replace(gff_path + ".names.tmp", gff_path + ".names")
+    os.replace(gff_path + ".idx.tmp", gff_path + ".idx")
+
+
+class NameIndex:
+    """Exact and prefix search over gene IDs, names and description words"""
+
+    def __init__(self, path: str):
+        with open(path) as f:
+            index = json.load(f)
+        self.keys: List[str] = index["keys"]
+        self.targets: List[int] = index["targets"]
+        self.records: List[list] = index["records"]
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Look up features by exact key, then by key prefix
+
+        Exact matches rank first, prefix matches follow in order of key
+        length so that "BDN" suggests "BDNF" before "BDNF-AS1".
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        matches = []
+        i = bisect_left(self.keys, query)
+        # Prefix scan is bounded so a one-letter query cannot walk the whole index
+        while i < len(self.keys) and self.keys[i].startswith(query) and len(matches) < limit * 20:
+            matches.append((self.keys[i] != query, len(self.keys[i]), self.keys[i], self.targets[i]))
+            i += 1
+        matches.sort()
+
+        results, seen = [], set()
+        for exact_miss, _, _, target in matches:
+            if target in seen:
+                continue
+            seen.add(target)
+            feature_id, name, feature_type, chrom, start, end, description = self.records[target]
+            results.append({
+                "id": feature_id,
+                "name": name,
+                "type": feature_type,
+                "chrom": chrom,
+                "start": start,
+                "end": end,
+                "description": description,
+                "exact": not exact_miss,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+class AnnotationIndex:
+    """Read side of an annotation interval index"""
+
+    def __init__(self, gff_path: str):
+        self.path = gff_path
+        with open(gff_path + ".idx") as f:
+            index = json.load(f)
+        self.feature_counts: Dict[str, int] = index["feature_counts"]
+        self.chroms: Dict[str, dict] = index["chroms"]
+        self._file = open(gff_path + ".models", "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._names: Optional[NameIndex] = None
+        self._names_lock = threading.Lock()
+
+    @property
+    def names(self) -> NameIndex:
+        """Name search index, loaded on first use"""
+        if self._names is None:
+            with self._names_lock:
+                if self._names is None:
+                    self._names = NameIndex(self.path + ".names")
+        return self._names
+
+    def _model(self, offset: int) -> dict:
+        end = self._data.find(b"\n", offset)
+        return json.loads(self._data[offset:end if end >= 0 else None])
+
+    def query(self, chrom: str, start: int, end: int) -> List[dict]:
+        """Gene models overlapping a 0-based, end-exclusive region"""
+        entry = self.chroms.get(chrom)
+        if entry is None or end <= start:
+            return []
+        starts, ends, linear = entry["starts"], entry["ends"], entry["linear"]
+        window = start // LINEAR_WINDOW
+        if window >= len(linear):
+            return []
+
+        results = []
+        for i in range(linear[window], bisect_left(starts, end)):
+            if ends[i] > start:
+                results.append(self._model(entry["offsets"][i]))
+        return results
+
+
+def _is_stale(gff_path: str) -> bool:
+    mtime = os.path.getmtime(gff_path)
+    for sidecar in (gff_path + ext for ext in SIDECARS):
+        if not os.path.exists(sidecar) or os.path.getmtime(sidecar) < mtime:
+            return True
+    try:
+        with open(gff_path + ".idx") as f:
+            # The version key is written first, so a short read is enough
+            return f'"version":{INDEX_VERSION},' not in f.read(64)
+    except OSError:
+        return True
+
+
+class AnnotationService:
+    """Builds annotation indexes on first use and keeps them open"""
+
+    def __init__(self):
+        self.genome_data_dir = settings.GENOME_DATA_DIR
+        self._indexes: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def find_annotation(self, species: str, ref: str) -> Optional[str]:
+        """
+        Locate the GFF3 file annotating a reference
+
+        ``annotation/<ref>.gff3`` wins; otherwise a reference named
+        ``<assembly>_<variant>`` uses ``annotation/genes_<variant>.gff3``,
+        and everything else falls back to ``annotation/genes.gff3``.
+        """
+        for part in (species, ref):
+            if not part or part.startswith(".") or "/" in part or "\\" in part:
+                return None
+        base_path = os.path.join(self.genome_data_dir, species, "annotation")
+        candidates = [ref]
+        if "_" in ref:
+            candidates.append("genes_" + ref.split("_", 1)[1])
+        candidates.append("genes")
+        for name in candidates:
+            for ext in GFF_EXTENSIONS:
+                path = os.path.join(base_path, name + ext)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def open(self, gff_path: str) -> AnnotationIndex:
+        """Return the index of a GFF3 file, (re)building it if it is missing or stale"""
+        mtime = os.path.getmtime(gff_path)
+        with self._lock:
+            cached = self._indexes.get(gff_path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            if _is_stale(gff_path):
+                build_index(gff_path)
+            index = AnnotationIndex(gff_path)
+            self._indexes[gff_path] = (mtime, index)
+        return index
+
+
+# Global service instance
+annotation_service = AnnotationService()
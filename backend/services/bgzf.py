@@ -0,0 +1,157 @@
+"""
+BGZF (blocked gzip) compression with .gzi indexes for random access
+"""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Tuple
+
+# Uncompressed bytes per block, as used by bgzip
+BLOCK_INPUT_SIZE = 0xFF00
+MAX_BLOCK_SIZE = 0x10000
+# Decompressed blocks kept per open file (64 KB each)
+BLOCK_CACHE_SIZE = 256
+
+_HEADER = struct.Struct("<4BI2BH2BHH")
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def _compress_block(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    if len(cdata) + 26 > MAX_BLOCK_SIZE:
+        # Incompressible input: stored deflate blocks always fit
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+    block_size = len(cdata) + 26
+    header = _HEADER.pack(0x1F, 0x8B, 8, 4, 0, 0, 0xFF, 6, ord("B"), ord("C"), 2, block_size - 1)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def bgzip_file(src_path: str, dst_path: str, level: int = 6) -> List[Tuple[int, int]]:
+    """
+    Compress a file with BGZF and write its ``.gzi`` index
+
+    Returns the (compressed offset, uncompressed offset) of every block.
+    """
+    blocks = []
+    compressed = uncompressed = 0
+    with open(src_path, "rb") as src, open(dst_path + ".tmp", "wb") as dst:
+        while True:
+            data = src.read(BLOCK_INPUT_SIZE)
+            if not data:
+                break
+            block = _compress_block(data, level)
+            dst.write(block)
+            blocks.append((compressed, uncompressed))
+            compressed += len(block)
+            uncompressed += len(data)
+        dst.write(EOF_BLOCK)
+    write_gzi(dst_path + ".gzi", blocks)
+    os.replace(dst_path + ".tmp", dst_path)
+    return blocks
+
+
+def write_gzi(gzi_path: str, blocks: List[Tuple[int, int]]):
+    """Write a samtools/htslib .gzi index (the implicit first block at 0/0 is omitted)"""
+    entries = [b for b in blocks if b != (0, 0)]
+    with open(gzi_path, "wb") as f:
+        f.write(struct.pack("<Q", len(entries)))
+        for compressed, uncompressed in entries:
+            f.write(struct.pack("<QQ", compressed, uncompressed))
+
+
+def read_gzi(gzi_path: str) -> List[Tuple[int, int]]:
+    with open(gzi_path, "rb") as f:
+        count, = struct.unpack("<Q", f.read(8))
+        data = f.read(16 * count)
+    return [(0, 0)] + [struct.unpack_from("<QQ", data, 16 * i) for i in range(count)]
+
+
+class BgzfReader:
+    """Random access to the uncompressed content of a BGZF file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        gzi_path = path + ".gzi"
+        if os.path.exists(gzi_path) and os.path.getmtime(gzi_path) >= os.path.getmtime(path):
+            blocks = read_gzi(gzi_path)
+        else:
+            blocks = self._scan_blocks()
+            try:
+                write_gzi(gzi_path, blocks)
+            except OSError:
+                pass
+        self._compressed = [c for c, _ in blocks]
+        self._uncompressed = [u for _, u in blocks]
+        last = self._compressed[-1] if self._compressed else 0
+        self.size = (self._uncompressed[-1] + len(self._block(last))) if self._compressed else 0
+
+    def _block_size(self, offset: int) -> int:
+        magic1, magic2, _, flags, _, _, _, xlen = struct.unpack_from("<4BI2BH", self._data, offset)
+        if (magic1, magic2) != (0x1F, 0x8B) or not flags & 4:
+            raise ValueError(f"{self.path}: not a BGZF block at offset {offset}")
+        pos, end = offset + 12, offset + 12 + xlen
+        while pos < end:
+            si1, si2, slen = struct.unpack_from("<2BH", self._data, pos)
+            if (si1, si2) == (ord("B"), ord("C")):
+                return struct.unpack_from("<H", self._data, pos + 4)[0] + 1
+            pos += 4 + slen
+        raise ValueError(f"{self.path}: missing BGZF block size at offset {offset}")
+
+    def _scan_blocks(self) -> List[Tuple[int, int]]:
+        """Walk the block headers to rebuild a missing .gzi"""
+        blocks = []
+        compressed = uncompressed = 0
+        while compressed < len(self._data):
+            block_size = self._block_size(compressed)
+            isize, = struct.unpack_from("<I", self._data, compressed + block_size - 4)
+            if isize:
+                blocks.append((compressed, uncompressed))
+            compressed += block_size
+            uncompressed += isize
+        return blocks
+
+    def _block(self, offset: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(offset)
+            if data is not None:
+                self._cache.move_to_end(offset)
+                return data
+        block_size = self._block_size(offset)
+        xlen, = struct.unpack_from("<H", self._data, offset + 10)
+        data = zlib.decompress(self._data[offset + 12 + xlen:offset + block_size - 8], -15)
+        with self._lock:
+            self._cache[offset] = data
+            if len(self._cache) > BLOCK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return data
+
+    def read(self, start: int, end: int) -> bytes:
+        """Uncompressed bytes [start, end), inflating only the blocks that overlap"""
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        i = bisect_right(self._uncompressed, start) - 1
+        parts = []
+        pos = start
+        while pos < end:
+            block = self._block(self._compressed[i])
+            block_start = self._uncompressed[i]
+            parts.append(block[pos - block_start:end - block_start])
+            pos = block_start + len(block)
+            i += 1
+        return b"".join(parts)
+
+    def close(self):
+        self._data.close()
+        self._file.close()
@@ -0,0 +1,259 @@
+"""
+BLAST Databases - Versioned search database builds, switched atomically per species
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from config import settings
+from services.fasta_service import fasta_service
+from services.kmer_index import build_kmer_index, kmer_service, KMER_VERSION, KmerIndex
+from services.reference_registry import reference_registry, ReferenceInfo
+
+logger = logging.getLogger(__name__)
+
+BUILD_FILE = "build.json"
+CURRENT_LINK = "current"
+# Sequence written to makeblastdb's stdin per read
+WRITE_CHUNK = 4 * 1024 * 1024
+# Read size used to pull database files into the page cache without fadvise
+WARM_CHUNK = 1024 * 1024
+
+
+@dataclass
+class DatabaseBuild:
+    """One immutable build of a database, stored in BLAST_DB_PATH/<database>/<version>/"""
+    database: str
+    version: str
+    path: str
+    reference: str
+    blastdb: bool
+    built_at: str
+
+    @property
+    def blast_prefix(self) -> str:
+        """-db argument of blastn for this build"""
+        return os.path.join(self.path, self.database)
+
+    @property
+    def kmer_path(self) -> str:
+        return os.path.join(self.path, self.database + ".kmer")
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in asdict(self).items() if key != "path"}
+
+
+def _warm_file(path: str):
+    """Ask the kernel to page a file in; reads it through when fadvise is unavailable"""
+    with open(path, "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while f.read(WARM_CHUNK):
+                pass
+
+
+class BlastDatabaseManager:
+    """
+    Builds a search database per species from its first reference
+
+    The version of a build is a hash of the reference file (path, size,
+    mtime) and of how it is built, so it changes exactly when the
+    reference or the indexer does. Each version is built in a temporary
+    directory, renamed into place and published by atomically replacing
+    the ``current`` symlink; searches resolve the symlink once, so a job
+    keeps reading the build it started with. The last
+    BLAST_DB_KEEP_VERSIONS builds are kept.
+
+    With makeblastdb installed a build holds a nucleotide BLAST database;
+    either way it holds the built-in search's k-mer index, which serves
+    short queries and stands in for blastn when it is not installed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def reference(self, database: str) -> Optional[ReferenceInfo]:
+        """Reference assembly a database is built from: the species' first reference"""
+        info = reference_registry.get_species(database)
+        return info.references[0] if info else None
+
+    def _builder(self) -> str:
+        return "makeblastdb" if shutil.which("makeblastdb") else "kmer"
+
+    def source_version(self, database: str, reference: Optional[ReferenceInfo] = None) -> Optional[str]:
+        """Version the current reference of a database builds into, or None if it has none"""
+        reference = reference or self.reference(database)
+        if reference is None:
+            return None
+        st = os.stat(reference.sequence_path)
+        parts = [
+            f"{os.path.abspath(reference.sequence_path)}:{st.st_size}:{st.st_mtime_ns}",
+            self._builder(),
+            f"kmer:{KMER_VERSION}:{settings.KMER_SIZE}:{settings.KMER_STEP}",
+        ]
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+    def _database_dir(self, database: str) -> str:
+        return os.path.join(self.root, database)
+
+    def current(self, database: str) -> Optional[DatabaseBuild]:
+        """Build the ``current`` symlink of a database points at, or None"""
+        database_dir = self._database_dir(database)
+        try:
+            version = os.readlink(os.path.join(database_dir, CURRENT_LINK))
+            with open(os.path.join(database_dir, version, BUILD_FILE)) as f:
+                return DatabaseBuild(path=os.path.join(database_dir, version), **json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def ensure_current(self, database: str) -> DatabaseBuild:
+        """Current build of a database, building and switching to a new version if its reference changed"""
+        reference = self.reference(database)
+        if reference is None:
+            raise ValueError(f"No reference sequence available for database '{database}'")
+        version = self.source_version(database, reference)
+        build = self.current(database)
+        if build and build.version == version:
+            return build
+        with self._lock:
+            build = self.current(database)
+            if build and build.version == version:
+                return build
+            if not os.path.isfile(os.path.join(self._database_dir(database), version, BUILD_FILE)):
+                self._build(database, reference, version)
+            self._switch(database, version)
+            self._prune(database)
+        return self.current(database)
+
+    def _build(self, database: str, reference: ReferenceInfo, version: str):
+        database_dir = self._database_dir(database)
+        tmp = os.path.join(database_dir, f"{version}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            logger.info("Building %s database %s from %s", database, version, reference.id)
+            blastdb = self._builder() == "makeblastdb" and self._makeblastdb(reference, os.path.join(tmp, database))
+            build_kmer_index(reference, os.path.join(tmp, database + ".kmer"))
+            with open(os.path.join(tmp, BUILD_FILE), "w") as f:
+                json.dump({
+                    "database": database,
+                    "version": version,
+                    "reference": f"{reference.species}/{reference.id}",
+                    "blastdb": blastdb,
+                    "built_at": datetime.utcnow().isoformat(),
+                }, f)
+            try:
+                os.rename(tmp, os.path.join(database_dir, version))
+            except OSError:
+                # Another process finished the same version first
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def _makeblastdb(self, reference: ReferenceInfo, prefix: str) -> bool:
+        """
+        Build a nucleotide BLAST database with makeblastdb; returns False if it fails
+
+        Sequences are streamed to its stdin from the reference reader, so
+        .2bit and bgzip references need no uncompressed copy on disk.
+        """
+        cmd = [
+            "makeblastdb", "-in", "-", "-dbtype", "nucl", "-parse_seqids",
+            "-title", f"{reference.species} {reference.id}", "-out", prefix,
+        ]
+        fasta = fasta_service.open(reference.sequence_path)
+        with subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as proc:
+            try:
+                for chrom, length in reference.sequences.items():
+                    proc.stdin.write(f">{chrom}\n".encode())
+                    for start in range(0, length, WRITE_CHUNK):
+                        proc.stdin.write(fasta.fetch_bytes(chrom, start, start + WRITE_CHUNK) + b"\n")
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            stderr = proc.stderr.read()
+        if proc.returncode != 0:
+            logger.warning("makeblastdb failed for %s: %s", reference.id, stderr.decode(errors="replace")[:200])
+            return False
+        return True
+
+    def _switch(self, database: str, version: str):
+        """Point ``current`` at a version with a single rename"""
+        database_dir = self._database_dir(database)
+        tmp_link = os.path.join(database_dir, f"{CURRENT_LINK}.{os.getpid()}.tmp")
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, os.path.join(database_dir, CURRENT_LINK))
+        logger.info("Switched %s database to %s", database, version)
+
+    def _prune(self, database: str):
+        """Remove all but the newest BLAST_DB_KEEP_VERSIONS builds (never the current one)"""
+        current = self.current(database)
+        builds = []
+        for entry in os.scandir(self._database_dir(database)):
+            if entry.is_dir(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                builds.append((entry.stat().st_mtime, entry.path))
+        for _, path in sorted(builds, reverse=True)[settings.BLAST_DB_KEEP_VERSIONS:]:
+            if current is None or path != current.path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def databases(self) -> List[str]:
+        """Every database that can be built: one per species"""
+        return [species.id for species in reference_registry.list_species()]
+
+    def refresh(self) -> List[str]:
+        """Bring every database up to date with its reference; returns those that were rebuilt"""
+        rebuilt = []
+        for database in self.databases():
+            before = self.current(database)
+            build = self.ensure_current(database)
+            if before is None or before.version != build.version:
+                rebuilt.append(database)
+        return rebuilt
+
+    def warm(self, databases: Optional[List[str]] = None) -> List[str]:
+        """
+        Page in the current builds of the hot databases (BLAST_WARM_DATABASES, default all)
+
+        Database files are read ahead into the shared page cache and the
+        k-mer index is mapped in this process, so the first search after
+        a start or a switch does not pay for cold reads.
+        """
+        warmed = []
+        for database in databases or settings.BLAST_WARM_DATABASES or self.databases():
+            build = self.current(database)
+            if build is None:
+                continue
+            for entry in os.scandir(build.path):
+                if entry.is_file():
+                    _warm_file(entry.path)
+            self.open_kmer(build)
+            warmed.append(database)
+        return warmed
+
+    def open_kmer(self, build: DatabaseBuild) -> KmerIndex:
+        reference = self.reference(build.database)
+        return kmer_service.open(build.kmer_path, reference)
+
+    def status(self) -> Dict[str, Optional[dict]]:
+        """Current build of every database"""
+        builds = {}
+        for database in self.databases():
+            build = self.current(database)
+            builds[database] = build.to_dict() if build else None
+        return builds
+
+
+# Global database manager
+blast_databases = BlastDatabaseManager(settings.BLAST_DB_PATH)
@@ -0,0 +1,112 @@
+"""
+BLAST Results - Streaming output parsing and compact paginated hit storage
+"""
+import json
+import os
+import struct
+from typing import Iterable, Iterator, List, Tuple
+from services.result_files import read_range
+
+HITS_FILE = "hits.ndjson"
+# Little-endian uint64 byte offsets of every hit line plus the end of file
+HITS_INDEX = "hits.idx"
+
+_OFFSET = struct.Struct("<Q")
+
+# Columns requested from BLAST with -outfmt; HSPs of one subject are consecutive rows
+TABULAR_FIELDS = (
+    "qseqid", "sseqid", "sacc", "stitle", "slen", "score", "bitscore", "evalue", "nident",
+    "gaps", "length", "qstart", "qend", "sstart", "send", "qframe", "sframe", "qseq", "sseq",
+)
+TABULAR_FORMAT = "6 " + " ".join(TABULAR_FIELDS)
+
+
+def _parse_hsp(row: dict) -> dict:
+    align_len = int(row["length"])
+    identities = int(row["nident"])
+    return {
+        "score": float(row["score"]),
+        "bit_score": float(row["bitscore"]),
+        "evalue": row["evalue"],
+        "identity": round(identities / align_len * 100, 2) if align_len else 0.0,
+        "identities": identities,
+        "gaps": int(row["gaps"]),
+        "align_len": align_len,
+        "query_start": int(row["qstart"]),
+        "query_end": int(row["qend"]),
+        "hit_start": int(row["sstart"]),
+        "hit_end": int(row["send"]),
+        "query_frame": int(row["qframe"]),
+        "hit_frame": int(row["sframe"]),
+        "qseq": row["qseq"],
+        "hseq": row["sseq"],
+    }
+
+
+def make_hit(hit_id: str, hit_def: str, accession: str, length: int, hsps: List[dict]) -> dict:
+    """A hit with all of its HSPs; the best (first) HSP is also flattened in for summary views"""
+    hit = {"hit_id": hit_id, "hit_def": hit_def, "accession": accession, "length": length}
+    best = hsps[0]
+    for key in ("score", "evalue", "identity", "query_start", "query_end", "hit_start", "hit_end"):
+        hit[key] = best[key]
+    hit["hsps"] = hsps
+    return hit
+
+
+def _make_hit(row: dict, hsps: List[dict]) -> dict:
+    return make_hit(row["sseqid"], row["stitle"], row["sacc"], int(row["slen"]), hsps)
+
+
+def iter_blast_tabular(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Stream (query id, hit) pairs from BLAST tabular output (-outfmt TABULAR_FORMAT)
+
+    Rows are read one at a time and grouped into hits, so memory stays
+    bounded by the HSPs of a single hit. Raises ValueError on malformed rows.
+    """
+    current = None
+    hsps: List[dict] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            values = line.rstrip("\n").split("\t")
+            if len(values) != len(TABULAR_FIELDS):
+                raise ValueError(f"Unexpected BLAST output row: {line[:80]!r}")
+            row = dict(zip(TABULAR_FIELDS, values))
+            if current is not None and (row["qseqid"], row["sseqid"]) != (current["qseqid"], current["sseqid"]):
+                yield current["qseqid"], _make_hit(current, hsps)
+                hsps = []
+            if not hsps:
+                current = row
+            hsps.append(_parse_hsp(row))
+    if current is not None:
+        yield current["qseqid"], _make_hit(current, hsps)
+
+
+def write_hits(out_dir: str, hits: Iterable[dict]) -> int:
+    """Write hits as NDJSON with an offset index for random access; returns the hit count"""
+    count = 0
+    with open(os.path.join(out_dir, HITS_FILE), "wb") as out, open(os.path.join(out_dir, HITS_INDEX), "wb") as index:
+        for hit in hits:
+            index.write(_OFFSET.pack(out.tell()))
+            out.write(json.dumps(hit, separators=(",", ":")).encode("utf-8") + b"\n")
+            count += 1
+        index.write(_OFFSET.pack(out.tell()))
+    return count
+
+
+def read_hits(out_dir: str, offset: int, limit: int) -> Tuple[int, List[dict]]:
+    """(total hit count, hits [offset, offset + limit)) of a stored result"""
+    index_path = os.path.join(out_dir, HITS_INDEX)
+    total = os.path.getsize(index_path) // _OFFSET.size - 1
+    if offset >= total or limit <= 0:
+        return total, []
+    last = min(offset + limit, total)
+    with open(index_path, "rb") as index:
+        index.seek(offset * _OFFSET.size)
+        start, = _OFFSET.unpack(index.read(_OFFSET.size))
+        index.seek(last * _OFFSET.size)
+        end, = _OFFSET.unpack(index.read(_OFFSET.size))
+    data = read_range(out_dir, HITS_FILE, start, end)
+    return total, [json.loads(line) for line in data.splitlines()]
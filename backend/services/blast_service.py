@@ -5,9 +5,54 @@ import subprocess
 import os
 import uuid
 import json
-import random
+import hashlib
+import logging
 from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 from config import settings
+from services.blast_results import TABULAR_FORMAT, iter_blast_tabular, read_hits, write_hits
+from services.blast_db import blast_databases, DatabaseBuild
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(sequence: str) -> str:
+    """Residues of a query, upper-cased, without FASTA header lines or whitespace"""
+    lines = [line for line in sequence.splitlines() if not line.startswith(">")]
+    return "".join("".join(lines).split()).upper()
+
+
+def parse_fasta_queries(text: str) -> List[Tuple[str, str]]:
+    """
+    Split a (multi-)FASTA body into (query id, sequence) pairs
+
+    The id is the first word of each header; a bare sequence without a
+    header becomes a single query named "query". Raises ValueError on
+    empty records or duplicate ids.
+    """
+    queries: List[Tuple[str, List[str]]] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith(">"):
+            fields = line[1:].split()
+            if not fields:
+                raise ValueError("Empty FASTA header")
+            queries.append((fields[0], []))
+        elif line:
+            if not queries:
+                queries.append(("query", []))
+            queries[-1][1].append(line)
+
+    parsed, seen = [], set()
+    for query_id, lines in queries:
+        sequence = normalize_query("".join(lines))
+        if not sequence:
+            raise ValueError(f"Query '{query_id}' has no sequence")
+        if query_id in seen:
+            raise ValueError(f"Duplicate query id '{query_id}'")
+        seen.add(query_id)
+        parsed.append((query_id, sequence))
+    return parsed
 
 
 class BlastService:
@@ -19,141 +64,245 @@ class BlastService:
         os.makedirs(self.blast_db_path, exist_ok=True)
         os.makedirs(self.temp_dir, exist_ok=True)
     
-    def run_blast(
+    def database_version(self, database: str) -> Optional[str]:
+        """Version of a database as built from its current reference (None if it has none)"""
+        return blast_databases.source_version(database)
+    
+    def search_kmer(self, query_sequence: str, build: DatabaseBuild, expect: float, num_results: int) -> list:
+        """
+        Search a nucleotide query with the built-in k-mer index of a database build
+        
+        Used when blastn is unavailable and as the fast path for short
+        queries (primers, guides); alignments are ungapped.
+        """
+        query = normalize_query(query_sequence)
+        if len(query) > settings.KMER_MAX_QUERY:
+            raise ValueError(f"Queries over {settings.KMER_MAX_QUERY} bp need BLAST+ installed")
+        return blast_databases.open_kmer(build).search(query, expect, num_results)
+    
+    def _blast_unavailable(self, program: str, database: str, detail: str):
+        """Log why blastn could not run; raises for searches the built-in index cannot do"""
+        if program != "blastn":
+            raise RuntimeError(f"{program} requires BLAST+ ({detail})")
+        logger.warning("blastn unavailable for %s (%s); using the built-in k-mer search", database, detail)
+    
+    def cache_key(
         self,
         query_sequence: str,
         database: str = "giant_panda",
         program: str = "blastn",
         expect: float = 0.001,
         num_results: int = 20
+    ) -> str:
+        """Hash of everything that determines a search result"""
+        payload = json.dumps([
+            normalize_query(query_sequence),
+            database,
+            self.database_version(database),
+            settings.KMER_MAX_OCCURRENCES,
+            program,
+            float(expect),
+            int(num_results),
+        ])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def run_blast(
+        self,
+        query_sequence: str,
+        out_dir: str,
+        database: str = "giant_panda",
+        program: str = "blastn",
+        expect: float = 0.001,
+        num_results: int = 20,
+        num_threads: int = 1
     ) -> dict:
         """
         Run BLAST search
         
+        Hits, with all of their HSPs, are streamed from the BLAST output into
+        ``hits.ndjson`` in ``out_dir``; the returned summary embeds only the
+        first BLAST_RESULT_PREVIEW of them.
+        
         Args:
             query_sequence: Input DNA/Protein sequence
+            out_dir: Directory receiving the hit file
             database: Database to search against
             program: BLAST program (blastn, blastp, blastx, etc.)
             expect: E-value threshold
             num_results: Maximum number of results
+            num_threads: Threads used by the BLAST process
         
         Returns:
-            dict with job_id, status, and results
+            dict with job_id, status, hit_count and the leading results
         """
         job_id = str(uuid.uuid4())[:8]
+        query = normalize_query(query_sequence)
+        # Resolved once, so the whole search reads one build even if a newer one is published meanwhile
+        build = blast_databases.ensure_current(database)
         
-        # Create input file
-        input_file = os.path.join(self.temp_dir, f"query_{job_id}.txt")
-        with open(input_file, 'w') as f:
-            f.write(f">query\n{query_sequence}\n")
+        # Short nucleotide queries skip the BLAST process and database load entirely
+        engine = "kmer" if program == "blastn" and len(query) <= settings.KMER_FAST_PATH_MAX else "blastn"
+        if engine == "blastn":
+            hit_count = self._run_blast_process(job_id, query, out_dir, build, program, expect, num_results, num_threads)
+            if hit_count is None:
+                engine = "kmer"
+        if engine == "kmer":
+            hit_count = write_hits(out_dir, self.search_kmer(query, build, expect, num_results))
         
-        # Output file
-        output_file = os.path.join(self.temp_dir, f"blast_{job_id}.json")
+        return {
+            "job_id": job_id,
+            "status": "completed",
+            "program": program,
+            "database": database,
+            "database_version": build.version,
+            "engine": engine,
+            "query_length": len(query),
+            "hit_count": hit_count,
+            "results": read_hits(out_dir, 0, settings.BLAST_RESULT_PREVIEW)[1],
+            "completed_at": datetime.utcnow().isoformat(),
+        }
+    
+    def _run_blast_process(
+        self,
+        job_id: str,
+        query: str,
+        out_dir: str,
+        build: DatabaseBuild,
+        program: str,
+        expect: float,
+        num_results: int,
+        num_threads: int
+    ) -> Optional[int]:
+        """Run blastn and store its hits; returns the hit count, or None when BLAST is not installed"""
+        if not build.blastdb:
+            # Built without makeblastdb: the k-mer index is the database
+            if program != "blastn":
+                raise RuntimeError(f"{program} requires BLAST+ (no BLAST database for {build.database})")
+            return None
+        # The query goes to blastn's stdin; only its output touches the disk
+        output_file = os.path.join(self.temp_dir, f"blast_{job_id}.tsv")
         
         # Build BLAST command
         cmd = [
             "blastn",
-            "-query", input_file,
-            "-db", os.path.join(self.blast_db_path, database),
+            "-query", "-",
+            "-db", build.blast_prefix,
             "-evalue", str(expect),
-            "-num_descriptions", str(num_results),
-            "-outfmt", "5",  # XML format
+            "-max_target_seqs", str(num_results),
+            "-outfmt", TABULAR_FORMAT,
+            "-num_threads", str(num_threads),
             "-out", output_file
         ]
         
-        # Try to run BLAST (if installed)
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutes timeout
-            )
-            
-            if result.returncode == 0:
-                # Parse XML output (simplified)
-                status = "completed"
-                results = self._parse_blast_xml(output_file)
-            else:
-                # Return mock results for demo
-                status = "completed"
-                results = self._mock_results(query_sequence, num_results)
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            # BLAST not installed, return mock results
-            status = "completed"
-            results = self._mock_results(query_sequence, num_results)
-        
-        # Clean up input file
         try:
-            os.remove(input_file)
-        except:
-            pass
-        
-        return {
-            "job_id": job_id,
-            "status": status,
-            "program": program,
-            "database": database,
-            "query_length": len(query_sequence.replace("\n", "").replace(" ", "")),
-            "results": results,
-            "completed_at": datetime.utcnow().isoformat(),
-        }
+            try:
+                result = subprocess.run(
+                    cmd,
+                    input=f">query\n{query}\n",
+                    capture_output=True,
+                    text=True,
+                    timeout=settings.JOB_TIMEOUT
+                )
+            except FileNotFoundError:
+                self._blast_unavailable(program, build.database, "blastn not installed")
+                return None
+            except subprocess.TimeoutExpired:
+                raise RuntimeError("BLAST search timed out")
+            if result.returncode != 0:
+                raise RuntimeError(f"BLAST search failed: {result.stderr.strip()[:200]}")
+            return write_hits(out_dir, (hit for _, hit in iter_blast_tabular(output_file)))
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
     
-    def _mock_results(self, query: str, num: int) -> list:
-        """Generate mock BLAST results for demo"""
-        clean_query = query.replace("\n", "").replace(" ", "").upper()[:50]
-        return [
-            {
-                "hit_id": f"chr{random.randint(1, 20)}",
-                "hit_def": f"Panda Chromosome {random.randint(1, 20)}",
-                "accession": f"NC_{random.randint(100000, 999999)}",
-                "length": random.randint(100000, 250000000),
-                "score": round(random.uniform(50, 500), 1),
-                "evalue": f"{random.uniform(1e-100, 1e-10):.2e}",
-                "identity": random.randint(80, 100),
-                "query_start": 1,
-                "query_end": min(len(clean_query), 100),
-                "hit_start": random.randint(1, 1000000),
-                "hit_end": random.randint(100100, 2000000),
-                "alignment": f"{clean_query[:30]}...{clean_query[-30:] if len(clean_query) > 60 else ''}",
+    def run_blast_batch(
+        self,
+        queries: List[Tuple[str, str]],
+        database: str = "giant_panda",
+        program: str = "blastn",
+        expect: float = 0.001,
+        num_results: int = 20,
+        num_threads: int = 1,
+        chunk_size: Optional[int] = None
+    ) -> Iterator[dict]:
+        """
+        Run many queries through a few multi-query BLAST processes
+        
+        Queries are searched ``chunk_size`` at a time (one process and one
+        database load per chunk) and each query's result is yielded as soon
+        as its chunk finishes.
+        """
+        chunk_size = chunk_size or settings.BLAST_BATCH_CHUNK
+        build = blast_databases.ensure_current(database)
+        for i in range(0, len(queries), chunk_size):
+            chunk = queries[i:i + chunk_size]
+            # Short nucleotide queries take the built-in fast path, as in run_blast
+            blast_ids = {
+                query_id for query_id, sequence in chunk
+                if program != "blastn" or len(sequence) > settings.KMER_FAST_PATH_MAX
             }
-            for i in range(num)
-        ]
-    
-    def _parse_blast_xml(self, xml_file: str) -> list:
-        """Parse BLAST XML output"""
-        # Simplified parser - return structured results
-        results = []
-        try:
-            import xml.etree.ElementTree as ET
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-            
-            for hit in root.findall(".//Hit"):
-                hit_data = {
-                    "hit_id": hit.findtext("HitId", ""),
-                    "hit_def": hit.findtext("HitDef", ""),
-                    "length": int(hit.findtext("HitLen", "0")),
+            hits = {}
+            if blast_ids:
+                blast_queries = [query for query in chunk if query[0] in blast_ids]
+                hits = self._run_blast_chunk(blast_queries, build, program, expect, num_results, num_threads)
+            for query_id, sequence in chunk:
+                if hits is not None and query_id in blast_ids:
+                    results = hits.get(query_id, [])
+                else:
+                    results = self.search_kmer(sequence, build, expect, num_results)
+                yield {
+                    "query_id": query_id,
+                    "query_length": len(sequence),
+                    "results": results,
                 }
-                
-                # Get first alignment
-                hsps = hit.findall(".//Hsp")
-                if hsps:
-                    hsp = hsps[0]
-                    hit_data["score"] = float(hsp.findtext("HspScore", "0"))
-                    hit_data["evalue"] = hsp.findtext("HspEvalue", "")
-                    hit_data["identity"] = float(hsp.findtext("HspIdentity", "0")) / float(hsp.findtext("HspAlignLen", "1")) * 100
-                    hit_data["query_start"] = int(hsp.findtext("HspQueryFrom", "0"))
-                    hit_data["query_end"] = int(hsp.findtext("HspQueryTo", "0"))
-                    hit_data["hit_start"] = int(hsp.findtext("HspHitFrom", "0"))
-                    hit_data["hit_end"] = int(hsp.findtext("HspHitTo", "0"))
-                
-                results.append(hit_data)
-        except:
-            pass
+    
+    def _run_blast_chunk(
+        self,
+        chunk: List[Tuple[str, str]],
+        build: DatabaseBuild,
+        program: str,
+        expect: float,
+        num_results: int,
+        num_threads: int
+    ) -> Optional[Dict[str, list]]:
+        """Hits per query id of one multi-query blastn run, or None when BLAST is not installed"""
+        if not build.blastdb:
+            if program != "blastn":
+                raise RuntimeError(f"{program} requires BLAST+ (no BLAST database for {build.database})")
+            return None
+        run_id = str(uuid.uuid4())[:8]
+        output_file = os.path.join(self.temp_dir, f"batch_{run_id}.tsv")
+        fasta = "".join(f">{query_id}\n{sequence}\n" for query_id, sequence in chunk)
         
-        return results
+        cmd = [
+            "blastn",
+            "-query", "-",
+            "-db", build.blast_prefix,
+            "-evalue", str(expect),
+            "-max_target_seqs", str(num_results),
+            "-outfmt", TABULAR_FORMAT,
+            "-num_threads", str(num_threads),
+            "-out", output_file
+        ]
+        try:
+            try:
+                result = subprocess.run(
+                    cmd, input=fasta, capture_output=True, text=True, timeout=settings.JOB_TIMEOUT
+                )
+            except FileNotFoundError:
+                self._blast_unavailable(program, build.database, "blastn not installed")
+                return None
+            except subprocess.TimeoutExpired:
+                raise RuntimeError("BLAST search timed out")
+            if result.returncode != 0:
+                raise RuntimeError(f"BLAST search failed: {result.stderr.strip()[:200]}")
+            hits = {}
+            for query_id, hit in iter_blast_tabular(output_file):
+                hits.setdefault(query_id, []).append(hit)
+            return hits
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
 
 
 # Global service instance
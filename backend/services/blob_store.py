@@ -0,0 +1,119 @@
+"""
+Blob Store - Content-addressed file storage shared by datasets
+"""
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Iterator, Optional, Set, Tuple
+from config import settings
+from services.upload_store import hash_file
+
+logger = logging.getLogger(__name__)
+
+TMP_DIR = "tmp"
+# Blobs are never modified in place: several datasets may share one
+BLOB_MODE = 0o444
+
+
+def _is_sha256(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+class BlobStore:
+    """
+    Files stored once under their SHA-256, in UPLOAD_DIR/blobs/ab/cd/<sha256>
+
+    Storing content that is already present only refreshes the existing
+    blob's mtime, so re-uploads of shared reference panels and reads take
+    no extra space. Dataset rows point at blobs; blobs no row refers to
+    are removed by gc() once older than BLOB_GC_GRACE (which covers the
+    gap between storing a blob and committing its row).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(self.directory, TMP_DIR), exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.directory, sha256[:2], sha256[2:4], sha256)
+
+    def temp_path(self) -> str:
+        """Path for staging a new file on the store's filesystem (so it can be renamed in)"""
+        return os.path.join(self.directory, TMP_DIR, uuid.uuid4().hex)
+
+    def put(self, src_path: str, sha256: str) -> Tuple[str, bool]:
+        """
+        Move a staged file into the store under its hash; returns (blob path, deduplicated)
+
+        When the content is already stored the staged file is discarded.
+        """
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.remove(src_path)
+            os.utime(path)
+            return path, True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(src_path, BLOB_MODE)
+        # A concurrent put of the same content replaces it with identical bytes
+        os.replace(src_path, path)
+        return path, False
+
+    def adopt(self, src_path: str, sha256: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Store an existing file by hard-linking it (copying across filesystems); the source is left in place
+
+        Returns (blob path, deduplicated).
+        """
+        sha256 = sha256 or hash_file(src_path)
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.utime(path)
+            return path, True
+        tmp = self.temp_path()
+        try:
+            os.link(src_path, tmp)
+        except OSError:
+            shutil.copyfile(src_path, tmp)
+        return self.put(tmp, sha256)
+
+    def blobs(self) -> Iterator[os.DirEntry]:
+        for shard in os.scandir(self.directory):
+            if shard.name == TMP_DIR or not shard.is_dir():
+                continue
+            for subshard in os.scandir(shard.path):
+                if not subshard.is_dir():
+                    continue
+                for entry in os.scandir(subshard.path):
+                    if _is_sha256(entry.name):
+                        yield entry
+
+    def gc(self, referenced: Set[str]) -> Tuple[int, int]:
+        """
+        Remove blobs whose hash is not in ``referenced`` and abandoned
+        staging files, older than BLOB_GC_GRACE; returns (files removed, bytes freed)
+        """
+        cutoff = time.time() - settings.BLOB_GC_GRACE
+        removed = freed = 0
+        candidates = [entry for entry in self.blobs() if entry.name not in referenced]
+        candidates += list(os.scandir(os.path.join(self.directory, TMP_DIR)))
+        for entry in candidates:
+            try:
+                st = entry.stat()
+                if st.st_mtime >= cutoff:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += st.st_size
+        return removed, freed
+
+    def usage(self) -> dict:
+        sizes = [entry.stat().st_size for entry in self.blobs()]
+        return {"blobs": len(sizes), "bytes": sum(sizes)}
+
+
+# Global blob store
+blob_store = BlobStore(os.path.join(settings.UPLOAD_DIR, "blobs"))
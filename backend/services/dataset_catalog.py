@@ -0,0 +1,113 @@
+"""
+Dataset Catalog - Keyset cursors and cheap totals for dataset listings
+"""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Query, Session
+from config import settings
+from db import Dataset, engine
+
+COUNT_MODES = ("exact", "estimated", "cached", "none")
+# Distinct filter combinations whose totals are kept
+MAX_CACHED_COUNTS = 1024
+# Indexes serving keyset pages
+KEYSET_INDEXES = (
+    "ix_datasets_created_id",
+    "ix_datasets_species_created_id",
+    "ix_datasets_data_type_created_id",
+    "ix_datasets_access_level_created_id",
+)
+
+
+def encode_cursor(dataset: Dataset) -> str:
+    """Opaque cursor pointing just after a dataset in (created_at, id) descending order"""
+    raw = json.dumps([dataset.created_at.isoformat(), dataset.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) of a cursor; raises ValueError if it is not one"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, dataset_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(dataset_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+class DatasetCatalog:
+    """
+    Totals for dataset listings without a full count on every page
+
+    "exact" counts the filtered rows, "estimated" asks the PostgreSQL
+    planner (other databases fall back to "cached"), "cached" keeps exact
+    counts per filter combination for DATASET_COUNT_TTL seconds (dropped
+    when a dataset is added through this process) and "none" skips the
+    total.
+    """
+
+    def __init__(self):
+        self._counts: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self):
+        """Add the listing indexes to databases created before they existed"""
+        with engine.begin() as conn:
+            # Keyset pages need a created_at on every row
+            conn.execute(
+                update(Dataset).where(Dataset.created_at.is_(None)).values(created_at=datetime(1970, 1, 1))
+            )
+        for index in Dataset.__table__.indexes:
+            if index.name in KEYSET_INDEXES:
+                index.create(bind=engine, checkfirst=True)
+
+    def count(self, db: Session, query: Query, mode: str) -> Tuple[Optional[int], str]:
+        """Total rows of a filtered listing query; returns (total, mode actually used)"""
+        if mode == "none":
+            return None, mode
+        if mode == "exact":
+            return query.count(), mode
+        if mode == "estimated" and engine.dialect.name == "postgresql":
+            return self._estimate(db, query), mode
+        return self._cached(query), "cached"
+
+    @staticmethod
+    def _estimate(db: Session, query: Query) -> int:
+        compiled = query.statement.compile(dialect=engine.dialect)
+        plan = db.connection().exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def _cached(self, query: Query) -> int:
+        compiled = query.statement.compile(dialect=engine.dialect)
+        key = str(compiled) + json.dumps(compiled.params, sort_keys=True, default=str)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry and entry[0] > now:
+                self._counts.move_to_end(key)
+                return entry[1]
+        total = query.count()
+        with self._lock:
+            self._counts[key] = (now + settings.DATASET_COUNT_TTL, total)
+            self._counts.move_to_end(key)
+            while len(self._counts) > MAX_CACHED_COUNTS:
+                self._counts.popitem(last=False)
+        return total
+
+    def invalidate(self):
+        with self._lock:
+            self._counts.clear()
+
+
+# Global dataset catalog
+dataset_catalog = DatasetCatalog()
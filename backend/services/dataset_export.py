@@ -0,0 +1,153 @@
+"""
+Dataset Export - Catalogue exports streamed in batches as CSV, JSON, NDJSON or Parquet
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple
+from config import settings
+from db import SessionLocal, Dataset
+
+# Exported columns, in order
+EXPORT_COLUMNS = ("id", "name", "description", "species", "data_type", "access_level", "file_size", "created_at")
+
+
+def iter_batches(access_levels: List[str]) -> Iterator[List[Tuple]]:
+    """
+    Rows of the datasets at the given access levels, EXPORT_BATCH_SIZE at a time
+
+    Rows are fetched with yield_per (a server-side cursor on PostgreSQL),
+    so memory is bounded by one batch however large the catalogue is.
+    Uses its own session, since it runs while the response streams.
+    """
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(*(getattr(Dataset, column) for column in EXPORT_COLUMNS))
+            .filter(Dataset.access_level.in_(access_levels))
+            .order_by(Dataset.id)
+            .yield_per(settings.EXPORT_BATCH_SIZE)
+        )
+        batch = []
+        for row in query:
+            batch.append(tuple(row))
+            if len(batch) >= settings.EXPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        db.close()
+
+
+def _record(row: Tuple) -> dict:
+    record = dict(zip(EXPORT_COLUMNS, row))
+    record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+    return record
+
+
+def csv_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    yield out.getvalue().encode()
+    for batch in batches:
+        out.seek(0)
+        out.truncate()
+        for ds in map(_record, batch):
+            writer.writerow([
+                ds["id"],
+                ds["name"],
+                ds["description"] or '',
+                ds["species"] or '',
+                ds["data_type"],
+                ds["access_level"],
+                ds["file_size"] or 0,
+                ds["created_at"] or '',
+            ])
+        yield out.getvalue().encode()
+
+
+def ndjson_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(json.dumps(_record(row)) + "\n" for row in batch).encode()
+
+
+def json_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """One JSON document; the count comes last since it is only known at the end"""
+    yield f'{{"exported_at": {json.dumps(datetime.utcnow().isoformat())}, "datasets": ['.encode()
+    count = 0
+    for batch in batches:
+        yield ((", " if count else "") + ", ".join(json.dumps(_record(row)) for row in batch)).encode()
+        count += len(batch)
+    yield f'], "total_count": {count}}}'.encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer produces until it is drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """
+    A Parquet file with one row group per batch
+
+    Requires pyarrow; raises ImportError before anything is produced when
+    it is not installed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("description", pa.string()),
+        ("species", pa.string()),
+        ("data_type", pa.string()),
+        ("access_level", pa.string()),
+        ("file_size", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+            ))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+# Export formats: chunk generator, media type and file extension
+EXPORT_FORMATS = {
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "json": (json_chunks, "application/json", "json"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson", "ndjson"),
+    "parquet": (parquet_chunks, "application/vnd.apache.parquet", "parquet"),
+}
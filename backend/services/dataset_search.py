@@ -0,0 +1,228 @@
+"""
+Dataset Search - Ranked full-text search over the dataset catalogue
+"""
+import logging
+import re
+from typing import List, Optional
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from db import engine
+
+logger = logging.getLogger(__name__)
+
+# Markers around matched terms in highlights
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+# Rows indexed per statement when indexing existing datasets
+BACKFILL_BATCH = 10000
+
+_WORD = re.compile(r"\w+")
+# A term of web search syntax: optionally negated quoted phrase or word
+_TERM = re.compile(r'(-?)(?:"([^"]*)"?|(\S+))')
+
+
+def fts5_query(query: str) -> str:
+    """
+    FTS5 expression for web search syntax, as websearch_to_tsquery reads it
+
+    Words must all match, "quoted phrases" match in order, ``or`` separates
+    alternatives and -word excludes. Words are quoted so FTS5 operators
+    typed by users stay literal. Empty when nothing but exclusions is left.
+    """
+    groups, excluded = [[]], []
+    for negate, phrase, word in _TERM.findall(query):
+        if word.lower() == "or" and not negate:
+            groups.append([])
+            continue
+        words = _WORD.findall(phrase or word)
+        if not words:
+            continue
+        term = '"' + " ".join(words) + '"'
+        if negate:
+            excluded.append(term)
+        else:
+            groups[-1].append(term)
+    expression = " OR ".join(" AND ".join(group) for group in groups if group)
+    if expression and excluded:
+        expression = f"({expression})" + "".join(f" NOT {term}" for term in excluded)
+    return expression
+
+
+# PostgreSQL: a tsvector column kept up to date by a trigger, weighted
+# name (A) > description (B) > meta_data keys (C), under a GIN index
+_PG_SETUP = [
+    "SELECT pg_advisory_xact_lock(hashtext('datasets_search'))",
+    "ALTER TABLE datasets ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION datasets_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B') ||
+            setweight(to_tsvector('english', CASE WHEN json_typeof(NEW.meta_data::json) = 'object'
+                THEN (SELECT coalesce(string_agg(key, ' '), '') FROM json_object_keys(NEW.meta_data::json) AS key)
+                ELSE '' END), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS datasets_search_vector_update ON datasets",
+    """
+    CREATE TRIGGER datasets_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, meta_data ON datasets
+    FOR EACH ROW EXECUTE FUNCTION datasets_search_vector()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_datasets_search_vector ON datasets USING GIN (search_vector)",
+]
+# Re-setting a column fires the trigger on rows indexed before it existed
+_PG_BACKFILL = f"""
+UPDATE datasets SET name = name
+WHERE id IN (SELECT id FROM datasets WHERE search_vector IS NULL LIMIT {BACKFILL_BATCH})
+"""
+_PG_SEARCH = f"""
+SELECT id, rank,
+       ts_headline('english', name, query,
+                   'HighlightAll=true, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}') AS name_highlight,
+       ts_headline('english', coalesce(description, ''), query,
+                   'MaxFragments=2, MinWords=8, MaxWords=24, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}')
+           AS description_highlight
+FROM (
+    SELECT id, name, description, query, ts_rank_cd(search_vector, query) AS rank
+    FROM datasets, websearch_to_tsquery('english', :query) AS query
+    WHERE search_vector @@ query AND access_level IN :levels {{filters}}
+    ORDER BY rank DESC, id DESC
+    LIMIT :limit OFFSET :skip
+) AS hits
+ORDER BY rank DESC, id DESC
+"""
+
+# SQLite: an FTS5 table keyed by dataset id, kept up to date by triggers
+_SQLITE_KEYS = """(SELECT coalesce(group_concat(key, ' '), '') FROM json_each(
+    CASE WHEN json_valid({row}.meta_data) AND json_type({row}.meta_data) = 'object' THEN {row}.meta_data ELSE '{{}}' END
+))"""
+_SQLITE_INDEX_ROW = f"""
+INSERT INTO datasets_fts (rowid, name, description, meta_keys)
+VALUES ({{row}}.id, coalesce({{row}}.name, ''), coalesce({{row}}.description, ''), {_SQLITE_KEYS});
+"""
+_SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS datasets_fts
+    USING fts5(name, description, meta_keys, tokenize = 'porter unicode61')
+    """,
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_insert AFTER INSERT ON datasets BEGIN"
+    + _SQLITE_INDEX_ROW.format(row="new") + "END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_delete AFTER DELETE ON datasets BEGIN "
+    "DELETE FROM datasets_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS datasets_fts_update AFTER UPDATE OF name, description, meta_data ON datasets BEGIN "
+    "DELETE FROM datasets_fts WHERE rowid = old.id;"
+    + _SQLITE_INDEX_ROW.format(row="new") + "END",
+    # Datasets added before the table existed
+    f"""
+    INSERT INTO datasets_fts (rowid, name, description, meta_keys)
+    SELECT d.id, coalesce(d.name, ''), coalesce(d.description, ''), {_SQLITE_KEYS.format(row="d")}
+    FROM datasets AS d WHERE d.id NOT IN (SELECT rowid FROM datasets_fts)
+    """,
+]
+_SQLITE_SEARCH = f"""
+WITH hits AS (
+    SELECT d.id, bm25(datasets_fts, 10.0, 4.0, 2.0) AS score
+    FROM datasets_fts JOIN datasets AS d ON d.id = datasets_fts.rowid
+    WHERE datasets_fts MATCH :query AND d.access_level IN :levels {{filters}}
+    ORDER BY score, d.id DESC
+    LIMIT :limit OFFSET :skip
+)
+SELECT hits.id, -hits.score AS rank,
+       highlight(datasets_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}') AS name_highlight,
+       snippet(datasets_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 24) AS description_highlight
+FROM hits JOIN datasets_fts ON datasets_fts.rowid = hits.id
+WHERE datasets_fts MATCH :query
+ORDER BY hits.score, hits.id DESC
+"""
+
+
+class DatasetSearch:
+    """
+    Full-text search over dataset names, descriptions and meta_data keys
+
+    On PostgreSQL each row carries a trigger-maintained tsvector under a
+    GIN index and results are ranked with ts_rank_cd; on SQLite (dev and
+    tests) an FTS5 table maintained by triggers is ranked with bm25.
+    Matches come from the index, every match is ranked (ties broken by
+    newest id, so pages are stable) and only the returned page is
+    highlighted. Other databases have no search.
+    """
+
+    def __init__(self):
+        self.backend: Optional[str] = None
+
+    def ensure_index(self):
+        """Create the search column or table, its triggers and index, and index existing datasets"""
+        dialect = engine.dialect.name
+        try:
+            if dialect == "postgresql":
+                with engine.begin() as conn:
+                    for statement in _PG_SETUP:
+                        conn.exec_driver_sql(statement)
+                while True:
+                    with engine.begin() as conn:
+                        if not conn.exec_driver_sql(_PG_BACKFILL).rowcount:
+                            break
+            elif dialect == "sqlite":
+                with engine.begin() as conn:
+                    for statement in _SQLITE_SETUP:
+                        conn.exec_driver_sql(statement)
+            else:
+                logger.warning("Dataset search is not available on %s", dialect)
+                return
+        except OperationalError:
+            logger.exception("Dataset search index could not be set up")
+            return
+        self.backend = dialect
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        access_levels: List[str],
+        species: Optional[str] = None,
+        data_type: Optional[str] = None,
+        limit: int = 20,
+        skip: int = 0,
+    ) -> List[dict]:
+        """
+        Best matches first, as dicts of id, rank, name_highlight and description_highlight
+
+        Raises ValueError if ``query`` has no words and RuntimeError if
+        search is not available.
+        """
+        expression = fts5_query(query)
+        if not expression:
+            raise ValueError("Search text must contain a word to look for")
+        if self.backend == "postgresql":
+            sql = _PG_SEARCH
+        elif self.backend == "sqlite":
+            sql = _SQLITE_SEARCH
+            query = expression
+        else:
+            raise RuntimeError("Dataset search is not available")
+
+        filters = ""
+        params = {
+            "query": query,
+            "levels": access_levels,
+            "limit": limit,
+            "skip": skip,
+        }
+        if species:
+            filters += " AND species = :species"
+            params["species"] = species
+        if data_type:
+            filters += " AND data_type = :data_type"
+            params["data_type"] = data_type
+        statement = text(sql.format(filters=filters)).bindparams(bindparam("levels", expanding=True))
+        return [dict(row._mapping) for row in db.execute(statement, params)]
+
+
+# Global dataset search
+dataset_search = DatasetSearch()
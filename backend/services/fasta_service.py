@@ -0,0 +1,228 @@
+"""
+FASTA Service - Random access to reference sequence through .fai or .2bit indexes
+"""
+import gzip
+import mmap
+import os
+import threading
+from collections import namedtuple
+from typing import Dict, List, Union
+from services.bgzf import BgzfReader
+from services.twobit import TwoBitFile
+
+
+FASTA_EXTENSIONS = (".fa", ".fasta", ".fna")
+# Suffix of bgzip-compressed FASTA files (e.g. ``ref.fa.gz``)
+BGZF_SUFFIX = ".gz"
+
+# One line of a samtools-compatible .fai index
+FaiRecord = namedtuple("FaiRecord", ["name", "length", "offset", "line_bases", "line_width"])
+
+
+def build_fai(fasta_path: str) -> List[FaiRecord]:
+    """
+    Scan a FASTA file and compute its .fai records
+
+    bgzip-compressed files are read through gzip; their offsets refer to the
+    uncompressed stream, as with samtools faidx. Raises ValueError if a record has inconsistent line lengths, which
+    makes offset arithmetic (and therefore indexing) impossible.
+    """
+    records = []
+    name = None
+    length = offset = line_bases = line_width = 0
+    short_line = False
+    pos = 0
+
+    opener = gzip.open if fasta_path.endswith(BGZF_SUFFIX) else open
+    with opener(fasta_path, "rb") as f:
+        for line in f:
+            line_len = len(line)
+            if line.startswith(b">"):
+                if name is not None:
+                    records.append(FaiRecord(name, length, offset, line_bases, line_width))
+                fields = line[1:].split()
+                if not fields:
+                    raise ValueError(f"Empty sequence name at byte {pos}")
+                name = fields[0].decode("utf-8")
+                length = line_bases = line_width = 0
+                offset = pos + line_len
+                short_line = False
+            else:
+                bases = len(line.rstrip(b"\r\n"))
+                if name is None:
+                    if bases:
+                        raise ValueError("Sequence data before first header")
+                elif bases:
+                    if short_line:
+                        raise ValueError(f"Inconsistent line length in sequence '{name}'")
+                    if not line_bases:
+                        line_bases, line_width = bases, line_len
+                    elif bases > line_bases:
+                        raise ValueError(f"Inconsistent line length in sequence '{name}'")
+                    elif bases < line_bases or line_len != line_width:
+                        # Only the last line of a record may be shorter
+                        short_line = True
+                    length += bases
+                else:
+                    short_line = True
+            pos += line_len
+
+    if name is not None:
+        records.append(FaiRecord(name, length, offset, line_bases, line_width))
+    return records
+
+
+def read_fai(fai_path: str) -> List[FaiRecord]:
+    """Read a .fai index file"""
+    records = []
+    with open(fai_path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            records.append(FaiRecord(fields[0], *(int(v) for v in fields[1:5])))
+    return records
+
+
+def write_fai(fai_path: str, records: List[FaiRecord]):
+    """Write a .fai index file"""
+    with open(fai_path, "w") as f:
+        for r in records:
+            f.write(f"{r.name}\t{r.length}\t{r.offset}\t{r.line_bases}\t{r.line_width}\n")
+
+
+def _fai_matches(read, size: int, records: List[FaiRecord]) -> bool:
+    """Cheap sanity check that every record offset lands just after a header line"""
+    for r in records:
+        if r.offset <= 0 or r.offset > size or read(r.offset - 1, r.offset) != b"\n":
+            return False
+        if r.length and (r.line_bases <= 0 or read(r.offset, r.offset + 1) == b">"):
+            return False
+        if r.length:
+            last = r.offset + ((r.length - 1) // r.line_bases) * r.line_width + (r.length - 1) % r.line_bases
+            if last >= size:
+                return False
+    return True
+
+
+class IndexedFasta:
+    """Memory-mapped FASTA file addressed through its .fai index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+        self.index: Dict[str, FaiRecord] = {r.name: r for r in self._load_index()}
+        self.lengths: Dict[str, int] = {name: r.length for name, r in self.index.items()}
+
+    def _open(self):
+        self._file = open(self.path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def _read(self, start: int, end: int) -> bytes:
+        """Bytes [start, end) of the FASTA text"""
+        return self._data[start:end]
+
+    def _load_index(self) -> List[FaiRecord]:
+        """Use the .fai next to the FASTA if it is current, otherwise rebuild it"""
+        fai_path = self.path + ".fai"
+        if os.path.exists(fai_path) and os.path.getmtime(fai_path) >= os.path.getmtime(self.path):
+            records = read_fai(fai_path)
+            if _fai_matches(self._read, self.size, records):
+                return records
+
+        records = build_fai(self.path)
+        try:
+            write_fai(fai_path, records)
+        except OSError:
+            # Read-only data directory, keep the index in memory only
+            pass
+        return records
+
+    @property
+    def references(self) -> List[str]:
+        return list(self.index)
+
+    def fetch(self, chrom: str, start: int, end: int) -> str:
+        """
+        Fetch bases of a region
+
+        Args:
+            chrom: Sequence name as it appears in the .fai
+            start: 0-based start (inclusive)
+            end: 0-based end (exclusive), clipped to the sequence length
+
+        Returns:
+            Sequence string with line breaks removed
+        """
+        return self.fetch_bytes(chrom, start, end).decode("ascii")
+
+    def fetch_bytes(self, chrom: str, start: int, end: int) -> bytes:
+        """Same as fetch() but returns the raw ASCII bytes"""
+        r = self.index.get(chrom)
+        if r is None:
+            raise KeyError(chrom)
+        start = max(0, start)
+        end = min(end, r.length)
+        if start >= end:
+            return b""
+
+        first = r.offset + (start // r.line_bases) * r.line_width + start % r.line_bases
+        last = r.offset + ((end - 1) // r.line_bases) * r.line_width + (end - 1) % r.line_bases + 1
+        return self._read(first, last).translate(None, b"\r\n")
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class BgzfFasta(IndexedFasta):
+    """
+    bgzip-compressed FASTA addressed through its .fai and .gzi indexes
+
+    Only the 64 KB blocks overlapping a request are decompressed, and
+    recently used blocks are cached by the underlying BgzfReader.
+    """
+
+    def _open(self):
+        self._reader = BgzfReader(self.path)
+        self.size = self._reader.size
+
+    def _read(self, start: int, end: int) -> bytes:
+        return self._reader.read(start, end)
+
+    def close(self):
+        self._reader.close()
+
+
+SequenceReader = Union[IndexedFasta, BgzfFasta, TwoBitFile]
+
+
+class FastaService:
+    """Keeps one open reader per reference sequence file (FASTA, bgzip FASTA or .2bit)"""
+
+    def __init__(self):
+        self._readers: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> SequenceReader:
+        """Return a cached reader for a sequence file, reopening it if the file changed"""
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._readers.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            if path.endswith(".2bit"):
+                reader = TwoBitFile(path)
+            elif path.endswith(BGZF_SUFFIX):
+                reader = BgzfFasta(path)
+            else:
+                reader = IndexedFasta(path)
+            self._readers[path] = (mtime, reader)
+        # Old reader may still be in use by an in-flight request; let GC close it
+        return reader
+
+
+# Global service instance
+fasta_service = FastaService()
@@ -0,0 +1,159 @@
+"""
+Job Events - Publish/subscribe bus for analysis job state changes and progress
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis channel carrying every job event
+CHANNEL = "panda:job-events"
+TERMINAL_STATUSES = ("completed", "failed", "expired")
+
+
+class Subscription:
+    """
+    Events of a set of jobs for one listener
+
+    Events are merged per job until read, so a slow listener sees the
+    latest state of each job (with every field reported so far) rather
+    than an unbounded backlog of progress updates.
+    """
+
+    def __init__(self, bus: "JobEventBus", job_ids: Iterable[int]):
+        self.bus = bus
+        self.job_ids: Set[int] = set(job_ids)
+        self._pending: Dict[int, dict] = {}
+        self._finished: Set[int] = set()
+        self._ready = asyncio.Event()
+
+    def deliver(self, event: dict):
+        job_id = event["job_id"]
+        if event["status"] in TERMINAL_STATUSES:
+            self._finished.add(job_id)
+        elif job_id in self._finished:
+            # Progress relayed from a worker can arrive after the job finished
+            return
+        self._pending[job_id] = {**self._pending.get(job_id, {}), **event}
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[dict]:
+        """Events received since the last call, waiting up to ``timeout`` seconds for one"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class JobEventBus:
+    """
+    In-process event bus
+
+    Reaches only listeners in the process that publishes, i.e. when the
+    job executor is embedded in a single API process.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+
+    @property
+    def authoritative(self) -> bool:
+        """True if every state change of a job reaches this process's listeners"""
+        return settings.JOB_EXECUTOR_EMBEDDED
+
+    def subscribe(self, job_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(self, job_ids)
+        for job_id in subscription.job_ids:
+            self._subscriptions.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for job_id in subscription.job_ids:
+            listeners = self._subscriptions.get(job_id)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._subscriptions[job_id]
+
+    def dispatch(self, event: dict):
+        for subscription in self._subscriptions.get(event["job_id"], ()):
+            subscription.deliver(event)
+
+    async def publish(self, job_id: int, status: str, **fields):
+        """Announce a job's state (pending, running, completed, failed) and any progress fields"""
+        self.dispatch({"job_id": job_id, "status": status, **fields, "time": time.time()})
+
+    async def close(self):
+        pass
+
+
+class RedisJobEventBus(JobEventBus):
+    """
+    Event bus over Redis pub/sub
+
+    Every process publishes to one channel and each API process runs a
+    single subscriber that fans events out to its local listeners, so
+    executors in worker.py processes or other hosts reach every client.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def authoritative(self) -> bool:
+        return True
+
+    def subscribe(self, job_ids: Iterable[int]) -> Subscription:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return super().subscribe(job_ids)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Listeners fall back to their periodic database check meanwhile
+                logger.exception("Job event subscription lost; reconnecting")
+                await asyncio.sleep(1)
+
+    async def publish(self, job_id: int, status: str, **fields):
+        event = {"job_id": job_id, "status": status, **fields, "time": time.time()}
+        try:
+            await self._redis.publish(CHANNEL, json.dumps(event))
+        except Exception:
+            logger.exception("Publishing job event failed")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._redis.close()
+
+
+def format_sse(event: str, data: dict) -> bytes:
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+# Global event bus
+job_events = RedisJobEventBus(settings.REDIS_URL) if settings.JOB_EVENTS_BACKEND == "redis" else JobEventBus()
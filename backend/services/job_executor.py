@@ -0,0 +1,419 @@
+"""
+Job Executor - Runs queued analysis jobs in a bounded process pool
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import update
+from config import settings
+from db import SessionLocal, AnalysisJob
+from services.blast_db import blast_databases
+from services.blast_service import blast_service, parse_fasta_queries
+from services.job_events import job_events
+from services.job_scheduler import job_scheduler, load_queues
+from services.result_cache import blast_cache, link_tree
+from services.result_retention import (
+    RESULT_FILE, compress_results, dir_size, read_result, result_retention, write_result,
+)
+
+logger = logging.getLogger(__name__)
+
+# Minimum delay between two progress reports of a job
+PROGRESS_INTERVAL = 0.5
+
+# Worker process state: the executor's progress queue and the job being run
+_progress_queue = None
+_current_job: Optional[int] = None
+
+
+def report_progress(**fields):
+    """Send progress of the current job (e.g. partial hit counts) to the executor's event bus"""
+    if _progress_queue is not None and _current_job is not None:
+        _progress_queue.put({"job_id": _current_job, **fields})
+
+
+def _blast_args(params: dict) -> dict:
+    return {
+        "query_sequence": params.get("sequence") or params.get("query"),
+        "database": params.get("database", "giant_panda"),
+        "program": params.get("program", "blastn"),
+        "expect": float(params.get("expect", 0.001)),
+        "num_results": int(params.get("num_results", 20)),
+    }
+
+
+def run_blast_job(params: dict, out_dir: str) -> dict:
+    """BLAST job handler"""
+    return blast_service.run_blast(**_blast_args(params), out_dir=out_dir, num_threads=settings.BLAST_THREADS)
+
+
+def run_blast_batch_job(params: dict, out_dir: str) -> dict:
+    """
+    Batch BLAST job handler
+
+    Per-query results are appended to ``queries.ndjson`` in the job's
+    result directory as each chunk of queries finishes.
+    """
+    queries = parse_fasta_queries(params["fasta"])
+    args = _blast_args(params)
+    del args["query_sequence"]
+    count = hits = 0
+    reported = time.monotonic()
+    report_progress(queries_done=0, queries_total=len(queries), hits=0)
+    with open(os.path.join(out_dir, "queries.ndjson"), "w") as out:
+        for result in blast_service.run_blast_batch(queries, **args, num_threads=settings.BLAST_THREADS):
+            out.write(json.dumps(result, separators=(",", ":")) + "\n")
+            out.flush()
+            count += 1
+            hits += len(result["results"])
+            if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                report_progress(queries_done=count, queries_total=len(queries), hits=hits)
+    return {
+        "program": args["program"],
+        "database": args["database"],
+        "queries": count,
+        "hit_count": hits,
+        "completed_at": datetime.utcnow().isoformat(),
+    }
+
+
+# Handlers run in a worker process: they take the job's input_params and
+# result directory and return a JSON-serialisable result
+JOB_HANDLERS: Dict[str, Callable[[dict, str], dict]] = {
+    "blast": run_blast_job,
+    "blast_batch": run_blast_batch_job,
+}
+
+# Job types with cached results: cache and a function keying input_params
+JOB_CACHES = {
+    "blast": (blast_cache, lambda params: blast_service.cache_key(**_blast_args(params))),
+}
+
+
+def init_worker(progress_queue):
+    """Worker process initializer: keep the progress queue and page in the hot search databases"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    try:
+        blast_databases.warm()
+    except Exception:
+        # A worker that cannot warm up still runs jobs, just with cold reads
+        logger.exception("Warming search databases failed")
+
+
+def refresh_databases() -> list:
+    """Rebuild search databases whose reference changed and warm the current builds (in a worker)"""
+    rebuilt = blast_databases.refresh()
+    blast_databases.warm()
+    return rebuilt
+
+
+def job_result_dir(job_id: int) -> str:
+    return os.path.join(settings.RESULT_DIR, str(job_id))
+
+
+def execute_job(job_id: int, job_type: str, params: dict) -> str:
+    """Run one job (in a worker process) and store its result compressed; returns the result path"""
+    global _current_job
+    out_dir = job_result_dir(job_id)
+    os.makedirs(out_dir, exist_ok=True)
+    _current_job = job_id
+    try:
+        result = JOB_HANDLERS[job_type](params, out_dir)
+    finally:
+        _current_job = None
+    compress_results(out_dir)
+    return write_result(out_dir, result)
+
+
+def link_result(cached_dir: str, job_id: int) -> str:
+    """Give a job its own names for the files of a cached result; returns the result path"""
+    out_dir = job_result_dir(job_id)
+    link_tree(cached_dir, out_dir)
+    return os.path.join(out_dir, RESULT_FILE)
+
+
+def result_summary(result_path: str) -> dict:
+    """Counts of a stored result announced with its job's completion"""
+    result = read_result(result_path)
+    return {key: result[key] for key in ("hit_count", "queries") if key in result}
+
+
+def load_result(job: AnalysisJob) -> Optional[dict]:
+    """Stored result of a completed job, or None"""
+    if job.status != "completed" or not job.result_path or not os.path.isfile(job.result_path):
+        return None
+    return read_result(job.result_path)
+
+
+class JobExecutor:
+    """
+    Claims pending AnalysisJob rows and runs them in a process pool
+
+    Several executors (API processes and/or worker.py instances) can share
+    one database: a job is claimed with a conditional UPDATE from pending
+    to running, so each job runs exactly once. Jobs move through
+    pending -> running -> completed/failed. Which pending job runs next
+    is decided by the fair scheduler (services/job_scheduler.py).
+
+    Results of cacheable job types are looked up by content hash first,
+    and a job identical to one already running in this executor waits for
+    that run instead of starting another (single-flight).
+
+    Every BLAST_DB_CHECK_INTERVAL one worker rebuilds the search databases
+    whose reference changed; workers page the current builds in when they
+    start and after each check. Every RESULT_SWEEP_INTERVAL the retention
+    sweep (services/result_retention.py) removes expired results and
+    stale temp files.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.JOB_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[int, asyncio.Task] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {
+            "completed": 0, "failed": 0, "cache_hits": 0, "cache_misses": 0, "cache_coalesced": 0,
+        }
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+        self._sweep: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+        self._progress = None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked so they never inherit DB connections or threads
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self._progress,),
+        )
+
+    def _forward_progress(self, loop: asyncio.AbstractEventLoop):
+        """Relay progress reports from worker processes to the event bus (runs in a thread)"""
+        while True:
+            report = self._progress.get()
+            if report is None:
+                return
+            job_id = report.pop("job_id")
+            asyncio.run_coroutine_threadsafe(job_events.publish(job_id, "running", **report), loop)
+
+    async def _refresh_databases(self):
+        """Check the references for search database rebuilds in a worker process"""
+        try:
+            rebuilt = await asyncio.get_running_loop().run_in_executor(self._pool, refresh_databases)
+            if rebuilt:
+                logger.info("Rebuilt search databases: %s", ", ".join(rebuilt))
+        except Exception:
+            logger.exception("Search database refresh failed")
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._last_refresh < settings.BLAST_DB_CHECK_INTERVAL:
+            return
+        if self._refresh is None or self._refresh.done():
+            self._last_refresh = now
+            self._refresh = asyncio.create_task(self._refresh_databases())
+
+    async def _sweep_results(self):
+        try:
+            await asyncio.to_thread(result_retention.sweep)
+        except Exception:
+            logger.exception("Result retention sweep failed")
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < settings.RESULT_SWEEP_INTERVAL:
+            return
+        if self._sweep is None or self._sweep.done():
+            self._last_sweep = now
+            self._sweep = asyncio.create_task(self._sweep_results())
+
+    def _claim(self) -> Optional[tuple]:
+        """
+        Atomically move the pending job chosen by the fair scheduler to
+        running; returns (id, type, params)
+        """
+        db = SessionLocal()
+        try:
+            # Another executor may claim the chosen job first; choose again then
+            for _ in range(self.workers + 1):
+                queue = job_scheduler.select(load_queues(db, list(JOB_HANDLERS)))
+                if queue is None:
+                    return None
+                claimed = db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == queue.head_id, AnalysisJob.status == "pending")
+                    .values(status="running", started_at=datetime.utcnow())
+                ).rowcount
+                db.commit()
+                if claimed:
+                    job_scheduler.dispatched(queue)
+                    job = db.query(AnalysisJob.job_type, AnalysisJob.input_params).filter(
+                        AnalysisJob.id == queue.head_id
+                    ).one()
+                    return queue.head_id, job.job_type, job.input_params
+            return None
+        finally:
+            db.close()
+
+    def _set_status(self, job_ids: List[int], status: str, **values):
+        db = SessionLocal()
+        try:
+            db.execute(update(AnalysisJob).where(AnalysisJob.id.in_(job_ids)).values(status=status, **values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _expire_stale(self):
+        """Fail jobs left running longer than JOB_TIMEOUT (e.g. by a crashed executor)"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_TIMEOUT)
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.status == "running", AnalysisJob.started_at < cutoff)
+                .values(status="failed", completed_at=datetime.utcnow(), error_message="Job timed out")
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _execute(self, job_id: int, job_type: str, params: dict) -> str:
+        pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, execute_job, job_id, job_type, params)
+        except BrokenProcessPool:
+            if self._pool is pool:
+                self._pool = self._new_pool()
+            raise
+
+    async def _execute_cached(self, job_id: int, job_type: str, params: dict) -> str:
+        cache, make_key = JOB_CACHES[job_type]
+        key = await asyncio.to_thread(make_key, params)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached:
+            self.stats["cache_hits"] += 1
+        elif key in self._inflight:
+            self.stats["cache_coalesced"] += 1
+            cached = await asyncio.shield(self._inflight[key])
+        else:
+            self.stats["cache_misses"] += 1
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            try:
+                result_path = await self._execute(job_id, job_type, params)
+                future.set_result(await asyncio.to_thread(cache.put, key, os.path.dirname(result_path)))
+                return result_path
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Mark retrieved; waiters still receive it
+                future.exception()
+                raise
+            finally:
+                del self._inflight[key]
+        try:
+            return await asyncio.to_thread(link_result, cached, job_id)
+        except FileNotFoundError:
+            # Entry evicted while being linked; run the job instead
+            return await self._execute(job_id, job_type, params)
+
+    async def _run(self, job_id: int, job_type: str, params: dict):
+        try:
+            if job_type in JOB_CACHES:
+                result_path = await self._execute_cached(job_id, job_type, params)
+            else:
+                result_path = await self._execute(job_id, job_type, params)
+            result_bytes = await asyncio.to_thread(dir_size, os.path.dirname(result_path))
+            await asyncio.to_thread(
+                self._set_status, [job_id], "completed",
+                result_path=result_path, result_bytes=result_bytes, completed_at=datetime.utcnow(),
+            )
+            self.stats["completed"] += 1
+            await job_events.publish(job_id, "completed", **await asyncio.to_thread(result_summary, result_path))
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self.stats["failed"] += 1
+            error = str(e) or type(e).__name__
+            await asyncio.to_thread(
+                self._set_status, [job_id], "failed", error_message=error, completed_at=datetime.utcnow(),
+            )
+            await job_events.publish(job_id, "failed", error=error)
+        finally:
+            self._running.pop(job_id, None)
+            self._wakeup.set()
+
+    async def serve(self):
+        """Claim and run jobs until cancelled"""
+        self._wakeup = asyncio.Event()
+        self._progress = multiprocessing.get_context("spawn").Queue()
+        forwarder = threading.Thread(
+            target=self._forward_progress, args=(asyncio.get_running_loop(),), name="job-progress", daemon=True,
+        )
+        forwarder.start()
+        self._pool = self._new_pool()
+        try:
+            while True:
+                await asyncio.to_thread(self._expire_stale)
+                self._maybe_refresh()
+                self._maybe_sweep()
+                while len(self._running) < self.workers:
+                    claimed = await asyncio.to_thread(self._claim)
+                    if not claimed:
+                        break
+                    job_id = claimed[0]
+                    await job_events.publish(job_id, "running")
+                    self._running[job_id] = asyncio.create_task(self._run(*claimed))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Jobs interrupted by shutdown go back to the queue
+            interrupted = list(self._running)
+            for task in self._running.values():
+                task.cancel()
+            for task in (self._refresh, self._sweep):
+                if task is not None:
+                    task.cancel()
+            if interrupted:
+                self._set_status(interrupted, "pending", started_at=None)
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._progress.put(None)
+
+    def notify(self):
+        """Wake the executor after a job was queued (no-op when it runs in another process)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self.serve())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global executor instance
+job_executor = JobExecutor()
@@ -0,0 +1,164 @@
+"""
+Job Scheduler - Weighted fair queueing of analysis jobs between users
+"""
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import settings
+from core.permissions import get_role
+from db import AnalysisJob, User, Role
+
+
+@dataclass
+class UserQueue:
+    """Pending jobs of one user, as seen by the scheduler"""
+    user_id: int
+    role: str
+    pending: int
+    running: int = 0
+    head_id: Optional[int] = None
+    head_cost: float = 1.0
+
+    @property
+    def weight(self) -> float:
+        return get_role(self.role).job_weight
+
+    @property
+    def at_capacity(self) -> bool:
+        return self.running >= get_role(self.role).max_running_jobs
+
+
+def job_cost(job_type: str, params: dict) -> float:
+    """Relative amount of work of a job: one per BLAST process it will run"""
+    if job_type == "blast_batch":
+        queries = (params.get("fasta") or "").count(">") or 1
+        return float(math.ceil(queries / settings.BLAST_BATCH_CHUNK))
+    return 1.0
+
+
+class FairScheduler:
+    """
+    Picks the next job with start-time weighted fair queueing between users
+
+    Each user's queue is FIFO. A job's virtual start is the later of the
+    global virtual time and its user's last finish tag, and its finish tag
+    adds cost / weight (the weight comes from the user's role). The job
+    with the smallest finish tag runs next, so backlogged users share the
+    workers in proportion to their weights and a user with a short queue
+    is never stuck behind a long one. Users at their role's
+    max_running_jobs are skipped. Tags live in memory: each executor
+    schedules fairly among the jobs it claims.
+    """
+
+    def __init__(self):
+        self._vtime = 0.0
+        self._finish: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _start_tag(self, user_id: int) -> float:
+        return max(self._vtime, self._finish.get(user_id, 0.0))
+
+    def select(self, queues: Iterable[UserQueue]) -> Optional[UserQueue]:
+        """Queue whose head job should run next, or None if every user is at capacity"""
+        eligible = [q for q in queues if q.pending and not q.at_capacity]
+        if not eligible:
+            return None
+        with self._lock:
+            return min(eligible, key=lambda q: (self._start_tag(q.user_id) + q.head_cost / q.weight, q.head_id))
+
+    def dispatched(self, queue: UserQueue):
+        """Record that the head job of a queue was started"""
+        with self._lock:
+            start = self._start_tag(queue.user_id)
+            self._finish[queue.user_id] = start + queue.head_cost / queue.weight
+            self._vtime = start
+            # Tags at or behind the virtual time no longer affect any start tag
+            for user_id in [u for u, finish in self._finish.items() if finish <= self._vtime]:
+                del self._finish[user_id]
+
+    def queue_position(self, user_id: int, ahead: int, queues: Iterable[UserQueue]) -> int:
+        """
+        Estimated 1-based dispatch position of a user's pending job with
+        ``ahead`` older jobs of the same user, assuming unit job costs
+        """
+        queues = {q.user_id: q for q in queues}
+        own = queues.get(user_id)
+        weight = own.weight if own else 1.0
+        with self._lock:
+            target = self._start_tag(user_id) + (ahead + 1) / weight
+            position = ahead + 1
+            for other in queues.values():
+                if other.user_id == user_id:
+                    continue
+                # Jobs of another user that finish (in virtual time) no later than this one
+                position += min(other.pending, max(0, math.floor((target - self._start_tag(other.user_id)) * other.weight)))
+        return position
+
+
+def load_queues(db: Session, job_types: List[str]) -> List[UserQueue]:
+    """Per-user pending queues (with their head job) and running counts, in three grouped queries"""
+    pending = (
+        db.query(AnalysisJob.user_id, Role.name, func.count(AnalysisJob.id), func.min(AnalysisJob.id))
+        .join(User, User.id == AnalysisJob.user_id)
+        .outerjoin(Role, Role.id == User.role_id)
+        .filter(AnalysisJob.status == "pending", AnalysisJob.job_type.in_(job_types))
+        .group_by(AnalysisJob.user_id, Role.name)
+        .all()
+    )
+    if not pending:
+        return []
+    running = dict(
+        db.query(AnalysisJob.user_id, func.count(AnalysisJob.id))
+        .filter(AnalysisJob.status == "running", AnalysisJob.user_id.in_([row[0] for row in pending]))
+        .group_by(AnalysisJob.user_id)
+        .all()
+    )
+    heads = {
+        job_id: job_cost(job_type, params or {})
+        for job_id, job_type, params in db.query(AnalysisJob.id, AnalysisJob.job_type, AnalysisJob.input_params)
+        .filter(AnalysisJob.id.in_([row[3] for row in pending]))
+        .all()
+    }
+    return [
+        UserQueue(
+            user_id=user_id,
+            role=role or "public",
+            pending=count,
+            running=running.get(user_id, 0),
+            head_id=head_id,
+            head_cost=heads.get(head_id, 1.0),
+        )
+        for user_id, role, count, head_id in pending
+    ]
+
+
+def pending_counts(db: Session) -> List[UserQueue]:
+    """Pending job count and role of every user with queued jobs (for position estimates)"""
+    rows = (
+        db.query(AnalysisJob.user_id, Role.name, func.count(AnalysisJob.id))
+        .join(User, User.id == AnalysisJob.user_id)
+        .outerjoin(Role, Role.id == User.role_id)
+        .filter(AnalysisJob.status == "pending")
+        .group_by(AnalysisJob.user_id, Role.name)
+        .all()
+    )
+    return [UserQueue(user_id=user_id, role=role or "public", pending=count) for user_id, role, count in rows]
+
+
+def queue_position(db: Session, job: AnalysisJob) -> Optional[int]:
+    """Estimated position of a pending job in the fair queue, None once it has started"""
+    if job.status != "pending":
+        return None
+    ahead = (
+        db.query(func.count(AnalysisJob.id))
+        .filter(AnalysisJob.user_id == job.user_id, AnalysisJob.status == "pending", AnalysisJob.id < job.id)
+        .scalar()
+    )
+    return job_scheduler.queue_position(job.user_id, ahead, pending_counts(db))
+
+
+# Global scheduler
+job_scheduler = FairScheduler()
@@ -0,0 +1,296 @@
+"""
+K-mer Index - In-process seed-and-extend nucleotide search over reference assemblies
+"""
+import json
+import math
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import settings
+from services.blast_results import make_hit
+from services.fasta_service import fasta_service
+from services.reference_registry import ReferenceInfo
+
+MAGIC = b"PKMR"
+KMER_VERSION = 1
+# Sequence is read in chunks that are a whole number of sampling steps
+READ_CHUNK = 4 * 1024 * 1024
+# Diagonals (ranked by seed count) extended per query strand
+MAX_DIAGONALS = 256
+
+# Ungapped scoring and its Karlin-Altschul parameters (as blastn -reward 1 -penalty -2)
+MATCH, MISMATCH = 1, -2
+LAMBDA, K = 1.28, 0.46
+
+# A=0, C=1, G=2, T=3; anything else (N, IUPAC codes) is 4 and never seeds
+_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _base in enumerate(b"ACGT"):
+    _CODES[_base] = _i
+    _CODES[_base | 0x20] = _i
+_COMPLEMENT = bytes.maketrans(b"ACGTNacgtn", b"TGCANtgcan")
+
+
+def reverse_complement(seq: bytes) -> bytes:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+def _kmers(codes: np.ndarray, k: int, step: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """(2-bit packed values, start positions) of the k-mers at every ``step``-th position without N"""
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int64)
+    starts = np.arange(0, count, step, dtype=np.int64)
+    values = np.zeros(len(starts), dtype=np.uint32)
+    for i in range(k):
+        values = (values << np.uint32(2)) | (codes[starts + i] & 3)
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = invalid[starts + k] == invalid[starts]
+    return values[valid], starts[valid]
+
+
+def build_kmer_index(reference: ReferenceInfo, path: str, k: Optional[int] = None, step: Optional[int] = None):
+    """
+    Index the k-mers of a reference into ``path``
+
+    K-mers are sampled every ``step`` bases, so any exact match of at least
+    k + step - 1 bases contains a seed. File layout: ``PKMR``, version and
+    header length (little-endian uint32s), a JSON header with k, step and
+    the chromosome offsets in the concatenated genome, then the k-mer
+    values (uint32, sorted) and their genome positions (uint64).
+    """
+    k = k or settings.KMER_SIZE
+    step = step or settings.KMER_STEP
+    if not 1 <= k <= 16:
+        raise ValueError("K-mer size must be between 1 and 16")
+    fasta = fasta_service.open(reference.sequence_path)
+    chunk = READ_CHUNK - READ_CHUNK % step
+    values, positions, chroms = [], [], []
+    offset = 0
+    for chrom, length in reference.sequences.items():
+        chroms.append([chrom, offset, length])
+        for chunk_start in range(0, length, chunk):
+            # Overlap the next chunk so k-mers spanning the boundary are kept
+            seq = np.frombuffer(fasta.fetch_bytes(chrom, chunk_start, chunk_start + chunk + k - 1), dtype=np.uint8)
+            chunk_values, starts = _kmers(_CODES[seq], k, step)
+            keep = starts < chunk
+            values.append(chunk_values[keep])
+            positions.append(starts[keep] + offset + chunk_start)
+        offset += length
+
+    values = np.concatenate(values) if values else np.zeros(0, dtype=np.uint32)
+    positions = np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+    order = np.argsort(values, kind="stable")
+    header = {"k": k, "step": step, "count": len(values), "chroms": chroms}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # Pad the header so the arrays start 8-byte aligned
+    header_bytes += b" " * (-(12 + len(header_bytes)) % 8)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<II", KMER_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(values[order].astype("<u4").tobytes())
+        # Keep the uint32 array a multiple of 8 bytes long
+        if len(values) % 2:
+            f.write(b"\0" * 4)
+        f.write(positions[order].astype("<u8").tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def _read_header(path: str) -> Optional[Tuple[dict, int]]:
+    """(JSON header, array offset) of an index file, or None if it is not a current one"""
+    with open(path, "rb") as f:
+        preamble = f.read(12)
+        if len(preamble) < 12 or preamble[:4] != MAGIC:
+            return None
+        version, header_len = struct.unpack("<II", preamble[4:])
+        if version != KMER_VERSION:
+            return None
+        return json.loads(f.read(header_len)), 12 + header_len
+
+
+def _format_evalue(evalue: float) -> str:
+    return "0.0" if evalue < 1e-180 else f"{evalue:.2g}"
+
+
+class KmerIndex:
+    """Memory-mapped k-mer index of one reference with seed-and-extend search"""
+
+    def __init__(self, path: str, reference: ReferenceInfo):
+        header = _read_header(path)
+        if header is None:
+            raise ValueError(f"Unsupported k-mer index {path}")
+        self.header, data_offset = header
+        self.reference = reference
+        self.k = self.header["k"]
+        self.step = self.header["step"]
+        count = self.header["count"]
+        self._values = np.memmap(path, dtype="<u4", mode="r", offset=data_offset, shape=(count,)) if count else np.zeros(0, "<u4")
+        positions_offset = data_offset + 4 * (count + count % 2)
+        self._positions = np.memmap(path, dtype="<u8", mode="r", offset=positions_offset, shape=(count,)) if count else np.zeros(0, "<u8")
+        self._chrom_names = [name for name, _, _ in self.header["chroms"]]
+        self._chrom_offsets = np.array([offset for _, offset, _ in self.header["chroms"]], dtype=np.int64)
+        self._chrom_lengths = [length for _, _, length in self.header["chroms"]]
+        self._fasta = fasta_service.open(reference.sequence_path)
+
+    @property
+    def genome_length(self) -> int:
+        return int(sum(self._chrom_lengths))
+
+    def _seed_diagonals(self, query: bytes) -> List[Tuple[int, int]]:
+        """(diagonal, genome position of a seed) of the best-supported diagonals of one query strand"""
+        query_values, query_starts = _kmers(_CODES[np.frombuffer(query, dtype=np.uint8)], self.k)
+        lo = np.searchsorted(self._values, query_values, side="left")
+        hi = np.searchsorted(self._values, query_values, side="right")
+        counts = hi - lo
+        # K-mers occurring too often are repeats; seeding on them only costs time
+        usable = (counts > 0) & (counts <= settings.KMER_MAX_OCCURRENCES)
+        lo, counts, query_starts = lo[usable], counts[usable], query_starts[usable]
+        total = int(counts.sum())
+        if not total:
+            return []
+        index = np.arange(total) + np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        positions = self._positions[index].astype(np.int64)
+        diagonals, first, seeds = np.unique(
+            positions - np.repeat(query_starts, counts), return_index=True, return_counts=True
+        )
+        best = np.argsort(-seeds, kind="stable")[:MAX_DIAGONALS]
+        return list(zip(diagonals[best].tolist(), positions[first[best]].tolist()))
+
+    def _extend(self, query: bytes, diagonal: int, seed: int) -> Optional[dict]:
+        """Best-scoring ungapped segment of a query strand along one genome diagonal"""
+        # Extension stays within the chromosome of the seed
+        chrom_idx = int(np.searchsorted(self._chrom_offsets, seed, side="right")) - 1
+        chrom_offset = int(self._chrom_offsets[chrom_idx])
+        chrom_length = self._chrom_lengths[chrom_idx]
+        ref_start = diagonal - chrom_offset
+        q_first = max(0, -ref_start)
+        q_last = min(len(query), chrom_length - ref_start)
+        if q_last - q_first < self.k:
+            return None
+        target = self._fasta.fetch_bytes(self._chrom_names[chrom_idx], ref_start + q_first, ref_start + q_last).upper()
+        segment = query[q_first:q_last]
+        matches = np.frombuffer(segment, dtype=np.uint8) == np.frombuffer(target, dtype=np.uint8)
+        matches &= _CODES[np.frombuffer(segment, dtype=np.uint8)] != 4
+        # Maximum-sum subarray: the best end minus the lowest prefix before it
+        cumulative = np.concatenate(([0], np.cumsum(np.where(matches, MATCH, MISMATCH))))
+        lowest = np.minimum.accumulate(cumulative)
+        end = int(np.argmax(cumulative - lowest))
+        start = int(np.argmin(cumulative[:end + 1]))
+        score = int(cumulative[end] - cumulative[start])
+        if score <= 0:
+            return None
+        return {
+            "chrom_idx": chrom_idx,
+            "score": score,
+            "identities": int(matches[start:end].sum()),
+            "query_start": q_first + start,
+            "query_end": q_first + end,
+            "ref_start": ref_start + q_first + start,
+            "ref_end": ref_start + q_first + end,
+            "qseq": segment[start:end].decode("ascii"),
+            "hseq": target[start:end].decode("ascii"),
+        }
+
+    def search(self, query: str, expect: float = 10.0, num_results: int = 50) -> List[dict]:
+        """
+        Search both strands of a nucleotide query
+
+        Seeds are exact k-mer matches; each diagonal supported by a seed is
+        extended without gaps. Returns hits (one per chromosome, best
+        first) in the same format as parsed BLAST output, with 1-based
+        coordinates and hit_start > hit_end on the minus strand.
+        """
+        forward = query.upper().encode("ascii")
+        search_space = len(forward) * self.genome_length
+        segments = []
+        for strand, seq in ((1, forward), (-1, reverse_complement(forward))):
+            for diagonal, seed in self._seed_diagonals(seq):
+                segment = self._extend(seq, diagonal, seed)
+                if segment is not None:
+                    segment["strand"] = strand
+                    segments.append(segment)
+
+        # Diagonals next to each other find the same alignment; keep the best of overlapping ones
+        segments.sort(key=lambda s: -s["score"])
+        kept: List[dict] = []
+        for segment in segments:
+            if not any(
+                s["strand"] == segment["strand"] and s["chrom_idx"] == segment["chrom_idx"]
+                and s["ref_start"] < segment["ref_end"] and segment["ref_start"] < s["ref_end"]
+                and s["query_start"] < segment["query_end"] and segment["query_start"] < s["query_end"]
+                for s in kept
+            ):
+                kept.append(segment)
+
+        hsps_by_chrom: Dict[int, List[dict]] = {}
+        for segment in kept:
+            bit_score = (LAMBDA * segment["score"] - math.log(K)) / math.log(2)
+            evalue = search_space * 2.0 ** -bit_score
+            if evalue > expect:
+                continue
+            length = segment["query_end"] - segment["query_start"]
+            if segment["strand"] == 1:
+                query_start, query_end = segment["query_start"] + 1, segment["query_end"]
+                hit_start, hit_end = segment["ref_start"] + 1, segment["ref_end"]
+                qseq, hseq = segment["qseq"], segment["hseq"]
+            else:
+                # Report minus-strand alignments on the forward query, as BLAST does
+                query_start, query_end = len(forward) - segment["query_end"] + 1, len(forward) - segment["query_start"]
+                hit_start, hit_end = segment["ref_end"], segment["ref_start"] + 1
+                qseq = reverse_complement(segment["qseq"].encode()).decode("ascii")
+                hseq = reverse_complement(segment["hseq"].encode()).decode("ascii")
+            hsps_by_chrom.setdefault(segment["chrom_idx"], []).append({
+                "score": float(segment["score"]),
+                "bit_score": round(bit_score, 1),
+                "evalue": _format_evalue(evalue),
+                "identity": round(segment["identities"] / length * 100, 2),
+                "identities": segment["identities"],
+                "gaps": 0,
+                "align_len": length,
+                "query_start": query_start,
+                "query_end": query_end,
+                "hit_start": hit_start,
+                "hit_end": hit_end,
+                "query_frame": 1,
+                "hit_frame": segment["strand"],
+                "qseq": qseq,
+                "hseq": hseq,
+            })
+
+        # Segments were visited best first, so each chromosome's HSPs are already ordered
+        hits = [
+            make_hit(
+                self._chrom_names[chrom_idx],
+                f"{self.reference.id} {self._chrom_names[chrom_idx]}",
+                self._chrom_names[chrom_idx],
+                self._chrom_lengths[chrom_idx],
+                hsps,
+            )
+            for chrom_idx, hsps in hsps_by_chrom.items()
+        ]
+        hits.sort(key=lambda hit: -hit["hsps"][0]["score"])
+        return hits[:num_results]
+
+
+class KmerService:
+    """Keeps k-mer indexes mapped; index files are immutable once written"""
+
+    def __init__(self):
+        self._indexes: Dict[str, KmerIndex] = {}
+        self._lock = threading.Lock()
+
+    def open(self, path: str, reference: ReferenceInfo) -> KmerIndex:
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                # Forget indexes of database builds that have been pruned
+                for old in [old for old in self._indexes if not os.path.exists(old)]:
+                    del self._indexes[old]
+                index = KmerIndex(path, reference)
+                self._indexes[path] = index
+        return index
+
+
+# Global service instance
+kmer_service = KmerService()
@@ -0,0 +1,68 @@
+"""
+Password Hasher - bcrypt off the event loop with bounded concurrency
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+import bcrypt
+from config import settings
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the hashing queue is full"""
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated thread pool
+
+    bcrypt releases the GIL, so PASSWORD_HASH_WORKERS threads hash in
+    parallel while the event loop keeps serving other requests. Up to
+    PASSWORD_HASH_QUEUE more requests wait for a thread; beyond that new
+    ones are refused at once (PasswordHasherBusy) instead of queueing
+    for longer than a client would wait, e.g. during a login storm.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="password-hash")
+        self._inflight = 0
+        self.stats: Dict[str, int] = {"hashed": 0, "errors": 0, "rejected": 0}
+
+    async def _run(self, fn: Callable, *args):
+        # Only the event loop thread changes the count, so no lock is needed
+        if self._inflight >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            raise PasswordHasherBusy("Too many sign-ins at once; try again shortly")
+        self._inflight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._inflight -= 1
+        self.stats["hashed"] += 1
+        return result
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    def usage(self) -> dict:
+        return {"workers": self.workers, "max_queue": self.max_queue, "inflight": self._inflight, **self.stats}
+
+
+# Global password hasher
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
@@ -0,0 +1,224 @@
+"""
+Reference Registry - Species and reference assemblies discovered from GENOME_DATA_DIR
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from config import settings
+from core.file_response import file_version
+from services.fasta_service import fasta_service, FASTA_EXTENSIONS, BGZF_SUFFIX
+from services.annotation_service import annotation_service
+
+logger = logging.getLogger(__name__)
+
+# Minimum delay between two mtime checks of the same species directory
+CHECK_INTERVAL = 1.0
+
+
+@dataclass
+class ReferenceInfo:
+    species: str
+    id: str
+    sequences: Dict[str, int]
+    fasta_path: Optional[str] = None
+    bgzf_path: Optional[str] = None
+    twobit_path: Optional[str] = None
+    gff_path: Optional[str] = None
+    gene_count: Optional[int] = None
+    # Version of the served FASTA when it was scanned
+    fasta_version: Optional[str] = None
+
+    @property
+    def sequence_path(self) -> str:
+        """File the sequence endpoints read from; the packed .2bit when available"""
+        return self.twobit_path or self.fasta_path or self.bgzf_path
+
+    @property
+    def served_path(self) -> Optional[str]:
+        """FASTA genome browsers are pointed at; the compressed one when it exists"""
+        return self.bgzf_path or self.fasta_path
+
+    @property
+    def total_length(self) -> int:
+        return sum(self.sequences.values())
+
+    def to_dict(self) -> dict:
+        base_url = f"/api/files/genome/{self.species}"
+        served_path = self.served_path
+        file_url = f"{base_url}/reference/{os.path.basename(served_path)}" if served_path else None
+        # The FASTA URL names its version, so it can be cached for good; the
+        # indexes keep plain URLs and are revalidated
+        fasta_url = f"{file_url}?v={self.fasta_version}" if file_url and self.fasta_version else file_url
+        return {
+            "id": self.id,
+            "name": self.id,
+            "description": f"{_display_name(self.species)} reference genome {self.id}",
+            "fasta_url": fasta_url,
+            "fai_url": f"{file_url}.fai" if file_url else None,
+            "gzi_url": f"{file_url}.gzi" if self.bgzf_path else None,
+            "twobit_url": f"{base_url}/reference/{os.path.basename(self.twobit_path)}" if self.twobit_path else None,
+            "gff_url": f"{base_url}/annotation/{os.path.basename(self.gff_path)}" if self.gff_path else None,
+            "chromosomes": len(self.sequences),
+            "total_length": _format_length(self.total_length),
+            "total_length_bp": self.total_length,
+            "genes": self.gene_count,
+        }
+
+
+@dataclass
+class SpeciesInfo:
+    id: str
+    name: str
+    references: List[ReferenceInfo] = field(default_factory=list)
+
+
+def _display_name(species: str) -> str:
+    return species.replace("_", " ").title()
+
+
+def _format_length(length: int) -> str:
+    for unit, size in (("Gb", 1e9), ("Mb", 1e6), ("kb", 1e3)):
+        if length >= size:
+            return f"{length / size:.1f} {unit}"
+    return f"{length} bp"
+
+
+def _gff_species(gff_path: str) -> Optional[str]:
+    """Scientific name from the ##species pragma of a GFF3 header, if present"""
+    with open(gff_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            if line.startswith("##species"):
+                value = line[len("##species"):].strip()
+                if value and not value.startswith("http"):
+                    return value
+    return None
+
+
+class ReferenceRegistry:
+    """
+    Scans GENOME_DATA_DIR for species and their reference assemblies
+
+    Layout: ``<species>/reference/<ref>.fa`` (+ ``.fai``), ``<ref>.fa.gz``
+    (bgzip, + ``.fai`` and ``.gzi``) and/or ``<ref>.2bit``, and optional ``<species>/annotation/*.gff3``. Results are cached in memory and
+    rescanned only when a file in those directories changes.
+    """
+
+    def __init__(self):
+        self.genome_data_dir = settings.GENOME_DATA_DIR
+        self._species: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, species: str) -> tuple:
+        entries = []
+        for sub in ("reference", "annotation"):
+            path = os.path.join(self.genome_data_dir, species, sub)
+            if not os.path.isdir(path):
+                continue
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        entries.append((entry.path, entry.stat().st_mtime_ns))
+        return tuple(sorted(entries))
+
+    def _scan(self, species: str) -> Optional[SpeciesInfo]:
+        ref_dir = os.path.join(self.genome_data_dir, species, "reference")
+        if not os.path.isdir(ref_dir):
+            return None
+
+        files: Dict[str, dict] = {}
+        for filename in sorted(os.listdir(ref_dir)):
+            ref, ext = os.path.splitext(filename)
+            if ext == BGZF_SUFFIX:
+                ref, ext = os.path.splitext(ref)
+                if ext in FASTA_EXTENSIONS:
+                    files.setdefault(ref, {}).setdefault("bgzf_path", os.path.join(ref_dir, filename))
+            elif ext in FASTA_EXTENSIONS:
+                files.setdefault(ref, {}).setdefault("fasta_path", os.path.join(ref_dir, filename))
+            elif ext == ".2bit":
+                files.setdefault(ref, {})["twobit_path"] = os.path.join(ref_dir, filename)
+
+        info = SpeciesInfo(id=species, name=_display_name(species))
+        for ref, paths in files.items():
+            fasta_path, bgzf_path = paths.get("fasta_path"), paths.get("bgzf_path")
+            twobit_path = paths.get("twobit_path")
+            # Derived files older than the plain FASTA are stale and ignored until rebuilt
+            if fasta_path:
+                fasta_mtime = os.path.getmtime(fasta_path)
+                if bgzf_path and os.path.getmtime(bgzf_path) < fasta_mtime:
+                    bgzf_path = None
+                if twobit_path and os.path.getmtime(twobit_path) < fasta_mtime:
+                    twobit_path = None
+            elif bgzf_path and twobit_path and os.path.getmtime(twobit_path) < os.path.getmtime(bgzf_path):
+                twobit_path = None
+            try:
+                sequences = fasta_service.open(twobit_path or fasta_path or bgzf_path).lengths
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping reference %s/%s: %s", species, ref, e)
+                continue
+
+            reference = ReferenceInfo(
+                species=species,
+                id=ref,
+                sequences=sequences,
+                fasta_path=fasta_path,
+                bgzf_path=bgzf_path,
+                twobit_path=twobit_path,
+            )
+            if reference.served_path:
+                reference.fasta_version = file_version(os.stat(reference.served_path))
+            reference.gff_path = annotation_service.find_annotation(species, ref)
+            if reference.gff_path:
+                counts = annotation_service.open(reference.gff_path).feature_counts
+                reference.gene_count = counts.get("gene", 0)
+                scientific_name = _gff_species(reference.gff_path)
+                if scientific_name:
+                    info.name = f"{_display_name(species)} ({scientific_name})"
+            info.references.append(reference)
+
+        return info if info.references else None
+
+    def get_species(self, species: str) -> Optional[SpeciesInfo]:
+        """Species entry with its references, or None if the species has no usable reference"""
+        if not species or species.startswith(".") or "/" in species or "\\" in species:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._species.get(species)
+            if cached and now - cached[0] < CHECK_INTERVAL:
+                return cached[2]
+            signature = self._signature(species)
+            if cached and cached[1] == signature:
+                self._species[species] = (now, signature, cached[2])
+                return cached[2]
+            info = self._scan(species)
+            # Scanning may (re)write index sidecars, so take the signature afterwards
+            self._species[species] = (now, self._signature(species), info)
+            return info
+
+    def list_species(self) -> List[SpeciesInfo]:
+        if not os.path.isdir(self.genome_data_dir):
+            return []
+        species = []
+        for name in sorted(os.listdir(self.genome_data_dir)):
+            info = self.get_species(name)
+            if info:
+                species.append(info)
+        return species
+
+    def get_reference(self, species: str, ref: str) -> Optional[ReferenceInfo]:
+        info = self.get_species(species)
+        if not info:
+            return None
+        for reference in info.references:
+            if reference.id == ref:
+                return reference
+        return None
+
+
+# Global registry instance
+reference_registry = ReferenceRegistry()
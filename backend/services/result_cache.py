@@ -0,0 +1,152 @@
+"""
+Result Cache - Content-addressed job results with TTL and LRU eviction
+"""
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+from config import settings
+
+# Minimum delay between two eviction sweeps
+EVICT_INTERVAL = 60.0
+# File of an entry whose times record its age and last use
+STAMP_FILE = "result.json.gz"
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-link a file (sharing its blocks), copying when the filesystem cannot"""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def link_tree(src_dir: str, dst_dir: str):
+    """link_or_copy every file of a (flat) directory into another"""
+    os.makedirs(dst_dir, exist_ok=True)
+    for entry in os.scandir(src_dir):
+        if entry.is_file():
+            link_or_copy(entry.path, os.path.join(dst_dir, entry.name))
+
+
+class ResultCache:
+    """
+    Result directories stored under the hash of the inputs that produced them
+
+    An entry expires ``ttl`` seconds after it was written (the mtime of its
+    result.json.gz); when the cache grows past ``max_bytes`` the least recently
+    used entries go first. Use is recorded in the atime, set explicitly on
+    every hit so it does not depend on the filesystem's atime mount options.
+    """
+
+    def __init__(self, directory: str, ttl: int, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Directory of a live cache entry, or None"""
+        path = self._path(key)
+        stamp = os.path.join(path, STAMP_FILE)
+        try:
+            st = os.stat(stamp)
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - st.st_mtime > self.ttl:
+            self._remove(path)
+            return None
+        os.utime(stamp, (now, st.st_mtime))
+        return path
+
+    def put(self, key: str, src_dir: str) -> str:
+        """Store the files of a result directory under a key; returns the cache entry path"""
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        link_tree(src_dir, tmp)
+        # Hard links keep the source's mtime; restart the TTL from now
+        now = time.time()
+        os.utime(os.path.join(tmp, STAMP_FILE), (now, now))
+        self._remove(path)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Another process stored the same result meanwhile
+            self._remove(tmp)
+        if now - self._last_evict > EVICT_INTERVAL:
+            self.evict()
+        return path
+
+    def _remove(self, path: str):
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _entries(self) -> list:
+        """(path, stamp stat, total bytes) of every entry"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir() or entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    files = [f.stat() for f in os.scandir(entry.path) if f.is_file()]
+                except FileNotFoundError:
+                    continue
+                try:
+                    stamp = os.stat(os.path.join(entry.path, STAMP_FILE))
+                except FileNotFoundError:
+                    # Stored with an older result layout: no lookup can hit it
+                    self._remove(entry.path)
+                    continue
+                entries.append((entry.path, stamp, sum(f.st_size for f in files)))
+        return entries
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self._lock:
+            self._last_evict = time.time()
+            now = self._last_evict
+            removed = 0
+            live = []
+            for path, stamp, size in self._entries():
+                if now - stamp.st_mtime > self.ttl:
+                    self._remove(path)
+                    removed += 1
+                else:
+                    live.append((stamp.st_atime, size, path))
+            total = sum(size for _, size, _ in live)
+            for _, size, path in sorted(live):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+            return removed
+
+    def usage(self) -> dict:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+
+# Global BLAST result cache
+blast_cache = ResultCache(
+    os.path.join(settings.TEMP_DIR, "blast_cache"),
+    ttl=settings.BLAST_CACHE_TTL,
+    max_bytes=settings.BLAST_CACHE_MAX_BYTES,
+)
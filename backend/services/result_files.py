@@ -0,0 +1,42 @@
+"""
+Result Files - Reading job result files, whether still plain or already compressed
+"""
+import gzip
+import os
+from typing import Iterator, Optional
+from services.bgzf import BgzfReader
+
+
+def read_range(out_dir: str, name: str, start: int, end: Optional[int] = None) -> bytes:
+    """
+    Uncompressed bytes [start, end) of a result file, plain or compressed
+
+    A running job's file is plain; it is replaced by its .gz when the job
+    finishes, so a reader that loses the race reads the compressed copy.
+    Raises FileNotFoundError if neither exists.
+    """
+    path = os.path.join(out_dir, name)
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+    except FileNotFoundError:
+        pass
+    reader = BgzfReader(path + ".gz")
+    try:
+        return reader.read(start, reader.size if end is None else end)
+    finally:
+        reader.close()
+
+
+def iter_lines(out_dir: str, name: str) -> Iterator[str]:
+    """Lines of a result file, plain or compressed; nothing if neither exists"""
+    path = os.path.join(out_dir, name)
+    for opener, candidate in ((open, path), (gzip.open, path + ".gz")):
+        try:
+            f = opener(candidate, "rt", encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with f:
+            yield from f
+        return
@@ -0,0 +1,199 @@
+"""
+Result Retention - Compressed job result storage, per-role expiry and temp file cleanup
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import or_, update
+from config import settings
+from core.permissions import ROLES
+from db import SessionLocal, AnalysisJob, User, Role
+from services.bgzf import bgzip_file
+from services.result_cache import blast_cache
+
+logger = logging.getLogger(__name__)
+
+RESULT_FILE = "result.json.gz"
+# Files streamed by job handlers, compressed with BGZF once the job finishes:
+# offsets into their uncompressed content (e.g. hits.idx) stay valid
+COMPRESSED_FILES = ("hits.ndjson", "queries.ndjson")
+# Jobs expired per database round trip of a sweep
+SWEEP_BATCH = 500
+
+
+def write_result(out_dir: str, result: dict) -> str:
+    """Store a job's result summary gzip-compressed; returns its path"""
+    path = os.path.join(out_dir, RESULT_FILE)
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_result(path: str) -> dict:
+    """Result summary stored by write_result (or uncompressed, by older versions)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compress_results(out_dir: str):
+    """BGZF-compress the streamed files of a finished job in place"""
+    for name in COMPRESSED_FILES:
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path):
+            continue
+        bgzip_file(path, path + ".gz")
+        # The .gzi is written first; date it with the data so readers trust it
+        st = os.stat(path + ".gz")
+        os.utime(path + ".gz.gzi", ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.remove(path)
+
+
+def dir_size(path: str) -> int:
+    """Total size of the files of a (flat) directory"""
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except FileNotFoundError:
+        return 0
+
+
+class ResultRetention:
+    """
+    Removes job results past their owner's retention period and stale temp files
+
+    A finished job keeps its result directory for its owner's role's
+    result_retention_days after completion; the sweep then deletes the
+    directory and marks the job expired, keeping the row as history.
+    Result directories without a live job and files in TEMP_DIR older
+    than TEMP_FILE_MAX_AGE (left behind by crashed processes) are removed
+    too, and the BLAST result cache is evicted.
+    """
+
+    def __init__(self, result_dir: str, temp_dir: str):
+        self.result_dir = result_dir
+        self.temp_dir = temp_dir
+        self.last_sweep: Dict[str, object] = {}
+
+    def _remove_dir(self, path: str):
+        shutil.rmtree(path, ignore_errors=True)
+
+    def expire_results(self) -> int:
+        """Expire finished jobs older than their owner's role allows"""
+        now = datetime.utcnow()
+        expired = 0
+        db = SessionLocal()
+        try:
+            for role in ROLES.values():
+                cutoff = now - timedelta(days=role.result_retention_days)
+                # Users without a role are treated as public, as by get_role
+                role_filter = Role.name == role.name if role.name != "public" else or_(
+                    Role.name == role.name, Role.name.is_(None), Role.name.notin_(list(ROLES))
+                )
+                while True:
+                    job_ids = [
+                        job_id for job_id, in db.query(AnalysisJob.id)
+                        .join(User, User.id == AnalysisJob.user_id)
+                        .outerjoin(Role, Role.id == User.role_id)
+                        .filter(
+                            AnalysisJob.status.in_(("completed", "failed")),
+                            AnalysisJob.completed_at < cutoff,
+                            role_filter,
+                        )
+                        .limit(SWEEP_BATCH)
+                        .all()
+                    ]
+                    if not job_ids:
+                        break
+                    for job_id in job_ids:
+                        self._remove_dir(os.path.join(self.result_dir, str(job_id)))
+                    expired += db.execute(
+                        update(AnalysisJob)
+                        .where(AnalysisJob.id.in_(job_ids), AnalysisJob.status.in_(("completed", "failed")))
+                        .values(status="expired", result_path=None, result_bytes=0)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                    db.commit()
+        finally:
+            db.close()
+        return expired
+
+    def remove_orphans(self) -> int:
+        """Remove old result directories whose job no longer has a result"""
+        if not os.path.isdir(self.result_dir):
+            return 0
+        cutoff = time.time() - settings.TEMP_FILE_MAX_AGE
+        candidates: Dict[int, str] = {}
+        for entry in os.scandir(self.result_dir):
+            if entry.is_dir(follow_symlinks=False) and entry.name.isdigit() and entry.stat().st_mtime < cutoff:
+                candidates[int(entry.name)] = entry.path
+        removed = 0
+        db = SessionLocal()
+        try:
+            ids = list(candidates)
+            for i in range(0, len(ids), SWEEP_BATCH):
+                batch = ids[i:i + SWEEP_BATCH]
+                live = {
+                    job_id for job_id, in db.query(AnalysisJob.id).filter(
+                        AnalysisJob.id.in_(batch),
+                        AnalysisJob.status.in_(("pending", "running", "completed", "failed")),
+                    )
+                }
+                for job_id in batch:
+                    if job_id not in live:
+                        self._remove_dir(candidates[job_id])
+                        removed += 1
+        finally:
+            db.close()
+        return removed
+
+    def remove_stale_temp(self) -> int:
+        """Remove files and partial directories in TEMP_DIR older than TEMP_FILE_MAX_AGE"""
+        if not os.path.isdir(self.temp_dir):
+            return 0
+        cutoff = time.time() - settings.TEMP_FILE_MAX_AGE
+        cache_dir = os.path.abspath(blast_cache.directory)
+        removed = 0
+        stale: List[os.DirEntry] = []
+        for entry in os.scandir(self.temp_dir):
+            if os.path.abspath(entry.path) == cache_dir:
+                # Cache entries keep their results' old mtimes; only partial writes are stale
+                for shard in os.scandir(entry.path):
+                    if shard.is_dir(follow_symlinks=False):
+                        stale.extend(e for e in os.scandir(shard.path) if e.name.endswith(".tmp"))
+            else:
+                stale.append(entry)
+        for entry in stale:
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    self._remove_dir(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def sweep(self) -> dict:
+        """One full retention pass; returns what was removed"""
+        result = {
+            "expired_jobs": self.expire_results(),
+            "orphaned_results": self.remove_orphans(),
+            "temp_files": self.remove_stale_temp(),
+            "cache_entries": blast_cache.evict(),
+        }
+        if any(result.values()):
+            logger.info("Retention sweep removed %s", result)
+        self.last_sweep = {**result, "at": datetime.utcnow().isoformat()}
+        return result
+
+
+# Global retention sweeper
+result_retention = ResultRetention(settings.RESULT_DIR, settings.TEMP_DIR)
@@ -0,0 +1,199 @@
+"""
+Session Cache - Validated access tokens and revocations, shared between API processes
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis channel announcing revoked token hashes, and key prefix of shared session states
+CHANNEL = "panda:session-revocations"
+KEY_PREFIX = "panda:session:"
+# Minimum delay between two purges of expired revocations
+PRUNE_INTERVAL = 60.0
+
+
+class SessionCache:
+    """
+    In-process cache of validated session token hashes with a revocation set
+
+    A token hash found live in user_sessions is trusted for
+    SESSION_CACHE_TTL seconds (never past the token's expiry), so most
+    authenticated requests skip the database. Revoked hashes are kept
+    until their token expires, so a validation racing a logout cannot
+    cache the token again. Only revocations made in this process are
+    seen: with several API processes use the Redis backend.
+    """
+
+    def __init__(self):
+        self._valid: "OrderedDict[str, float]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "revocations": 0}
+
+    def _local(self, token_hash: str, now: float) -> Optional[bool]:
+        """True if cached as valid, False if revoked, None if unknown here"""
+        with self._lock:
+            if token_hash in self._revoked:
+                return False
+            until = self._valid.get(token_hash)
+            if until is None:
+                return None
+            if until <= now:
+                del self._valid[token_hash]
+                return None
+            self._valid.move_to_end(token_hash)
+            return True
+
+    def _remember(self, token_hash: str, expires: float):
+        with self._lock:
+            if token_hash in self._revoked:
+                return
+            self._valid[token_hash] = min(time.time() + settings.SESSION_CACHE_TTL, expires)
+            self._valid.move_to_end(token_hash)
+            while len(self._valid) > settings.SESSION_CACHE_SIZE:
+                self._valid.popitem(last=False)
+
+    def _mark_revoked(self, token_hash: str, expires: float):
+        now = time.time()
+        with self._lock:
+            self._valid.pop(token_hash, None)
+            self._revoked[token_hash] = expires
+            if now - self._last_prune > PRUNE_INTERVAL:
+                self._last_prune = now
+                # An expired token is refused by its own exp claim
+                for expired in [h for h, until in self._revoked.items() if until <= now]:
+                    del self._revoked[expired]
+
+    def _forget_valid(self):
+        with self._lock:
+            self._valid.clear()
+
+    async def validate(self, token_hash: str, expires: float, lookup: Callable[[], bool]) -> bool:
+        """
+        Whether a token's session is live; ``lookup`` asks the database
+        and is only called when the cache cannot answer
+        """
+        state = self._local(token_hash, time.time())
+        if state is not None:
+            self.stats["hits"] += 1
+            return state
+        self.stats["misses"] += 1
+        valid = lookup()
+        if valid:
+            self._remember(token_hash, expires)
+        return valid
+
+    async def revoke(self, token_hash: str, expires: float):
+        """Refuse a token from now on (after its session row was marked revoked)"""
+        self.stats["revocations"] += 1
+        self._mark_revoked(token_hash, expires)
+
+    async def close(self):
+        pass
+
+
+class RedisSessionCache(SessionCache):
+    """
+    Session cache shared through Redis
+
+    Each session's state ("valid" or "revoked") is kept under its token
+    hash until the token expires, so a token validated by one process is
+    trusted by all of them, and a revocation overwrites it (a racing
+    validation only sets the key if it is absent). Revocations are also
+    published, and each process drops the token from its in-process
+    cache as soon as the message arrives. While that subscription is
+    down the in-process cache is bypassed, since revocations could be
+    missed.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = False
+
+    def _key(self, token_hash: str) -> str:
+        return KEY_PREFIX + token_hash
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "subscribe":
+                            # Anything cached before now may have missed a revocation
+                            self._forget_valid()
+                            self._listening = True
+                        elif message["type"] == "message":
+                            event = json.loads(message["data"])
+                            self._mark_revoked(event["token_hash"], event["expires"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Session revocation subscription lost; reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                self._listening = False
+
+    async def validate(self, token_hash: str, expires: float, lookup: Callable[[], bool]) -> bool:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        if self._listening:
+            state = self._local(token_hash, time.time())
+            if state is not None:
+                self.stats["hits"] += 1
+                return state
+        ttl = int(expires - time.time())
+        try:
+            state = await self._redis.get(self._key(token_hash))
+        except Exception:
+            logger.exception("Reading session state failed")
+            state = None
+            ttl = 0
+        if state == b"revoked":
+            self._mark_revoked(token_hash, expires)
+            return False
+        if state == b"valid":
+            self.stats["hits"] += 1
+            if self._listening:
+                self._remember(token_hash, expires)
+            return True
+        self.stats["misses"] += 1
+        valid = lookup()
+        if valid and ttl > 0:
+            try:
+                await self._redis.set(self._key(token_hash), "valid", ex=min(ttl, settings.SESSION_CACHE_TTL), nx=True)
+            except Exception:
+                logger.exception("Storing session state failed")
+            if self._listening:
+                self._remember(token_hash, expires)
+        return valid
+
+    async def revoke(self, token_hash: str, expires: float):
+        await super().revoke(token_hash, expires)
+        ttl = max(1, int(expires - time.time()))
+        try:
+            await self._redis.set(self._key(token_hash), "revoked", ex=ttl)
+            await self._redis.publish(CHANNEL, json.dumps({"token_hash": token_hash, "expires": expires}))
+        except Exception:
+            # The database still refuses the token once other processes' caches lapse
+            logger.exception("Publishing session revocation failed")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._redis.close()
+
+
+# Global session cache
+session_cache = RedisSessionCache(settings.REDIS_URL) if settings.SESSION_BACKEND == "redis" else SessionCache()
@@ -0,0 +1,117 @@
+"""
+Session Store - User session rows: per-user caps, revocation and purging
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from config import settings
+from db import SessionLocal, UserSession, engine
+from services.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+
+def timestamp(value: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _live(db: Session, user_id: int):
+    return db.query(UserSession).filter(
+        UserSession.user_id == user_id,
+        UserSession.revoked == False,
+        UserSession.expires_at > datetime.utcnow()
+    )
+
+
+class SessionStore:
+    """
+    Keeps user_sessions small so token lookups cost the same after months
+
+    Opening a session beyond MAX_SESSIONS_PER_USER revokes the user's
+    oldest ones. Rows that are expired or revoked are no longer needed
+    (a token is only accepted with a live row) and are deleted
+    SESSION_PURGE_BATCH at a time every SESSION_PURGE_INTERVAL seconds,
+    so a purge never holds long locks on the table.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"purged": 0, "capped": 0}
+
+    def ensure_indexes(self):
+        """Add the session table's indexes to databases created before they existed"""
+        for index in UserSession.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    async def open(self, db: Session, user_id: int, token_hash: str, expires_at: datetime):
+        """Record a new session, revoking the oldest ones past the user's cap"""
+        live = _live(db, user_id).order_by(UserSession.expires_at).all()
+        excess = live[:max(0, len(live) + 1 - settings.MAX_SESSIONS_PER_USER)]
+        for session in excess:
+            session.revoked = True
+        db.add(UserSession(user_id=user_id, token_hash=token_hash, expires_at=expires_at))
+        db.commit()
+        self.stats["capped"] += len(excess)
+        for session in excess:
+            await session_cache.revoke(session.token_hash, timestamp(session.expires_at))
+
+    async def revoke_user(self, db: Session, user_id: int):
+        """Revoke every live session of a user (e.g. after a password change)"""
+        sessions = _live(db, user_id).all()
+        for session in sessions:
+            session.revoked = True
+        db.commit()
+        for session in sessions:
+            await session_cache.revoke(session.token_hash, timestamp(session.expires_at))
+
+    def purge(self) -> int:
+        """Delete expired and revoked sessions in batches; returns the rows deleted"""
+        purged = 0
+        db = SessionLocal()
+        try:
+            while True:
+                ids = [
+                    session_id for session_id, in db.query(UserSession.id).filter(
+                        (UserSession.expires_at <= datetime.utcnow()) | (UserSession.revoked == True)
+                    ).limit(settings.SESSION_PURGE_BATCH)
+                ]
+                if not ids:
+                    break
+                purged += db.query(UserSession).filter(UserSession.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                if len(ids) < settings.SESSION_PURGE_BATCH:
+                    break
+        finally:
+            db.close()
+        self.stats["purged"] += purged
+        return purged
+
+    async def serve(self):
+        """Purge periodically until cancelled"""
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge)
+                if purged:
+                    logger.info("Purged %d expired or revoked sessions", purged)
+            except Exception:
+                logger.exception("Session purge failed")
+            await asyncio.sleep(settings.SESSION_PURGE_INTERVAL)
+
+    def start(self):
+        self._task = asyncio.create_task(self.serve())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global session store
+session_store = SessionStore()
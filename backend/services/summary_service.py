@@ -0,0 +1,219 @@
+"""
+Summary Service - Multi-resolution GC / N / gene density tiles for zoomed-out views
+"""
+import json
+import os
+import struct
+import threading
+from typing import Dict, Optional
+import numpy as np
+from services.fasta_service import fasta_service
+from services.annotation_service import annotation_service
+from services.reference_registry import ReferenceInfo
+
+MAGIC = b"PSUM"
+SUMMARY_VERSION = 2
+# Zoom levels in bases per bin, each 4x coarser than the previous (as in bigWig)
+ZOOM_LEVELS = (1_000, 4_000, 16_000, 64_000, 256_000, 1_024_000)
+# Counters stored per bin: valid (non-N) bases, G+C bases, N bases, gene starts
+FIELDS = ("bases", "gc", "n", "genes")
+# Sequence is read in chunks that are a whole number of finest bins
+READ_CHUNK = ZOOM_LEVELS[0] * 1024
+
+_GC_TABLE = np.zeros(256, dtype=np.uint8)
+_GC_TABLE[list(b"GCSgcs")] = 1
+_N_TABLE = np.zeros(256, dtype=np.uint8)
+_N_TABLE[list(b"Nn")] = 1
+
+
+def summary_path(reference: ReferenceInfo) -> str:
+    return os.path.join(os.path.dirname(reference.sequence_path), reference.id + ".summary")
+
+
+def _bin_counts(reference: ReferenceInfo, chrom: str, length: int) -> np.ndarray:
+    """Counters for every finest-level bin of one chromosome"""
+    fasta = fasta_service.open(reference.sequence_path)
+    bin_size = ZOOM_LEVELS[0]
+    counts = np.zeros((-(-length // bin_size), len(FIELDS)), dtype=np.uint32)
+
+    for chunk_start in range(0, length, READ_CHUNK):
+        seq = np.frombuffer(fasta.fetch_bytes(chrom, chunk_start, chunk_start + READ_CHUNK), dtype=np.uint8)
+        edges = np.arange(0, len(seq), bin_size)
+        first_bin = chunk_start // bin_size
+        rows = slice(first_bin, first_bin + len(edges))
+        n = np.add.reduceat(_N_TABLE[seq], edges)
+        sizes = np.diff(np.append(edges, len(seq)))
+        counts[rows, 0] = sizes - n
+        counts[rows, 1] = np.add.reduceat(_GC_TABLE[seq], edges)
+        counts[rows, 2] = n
+
+    if reference.gff_path:
+        index = annotation_service.open(reference.gff_path)
+        entry = index.chroms.get(chrom)
+        if entry:
+            # Gene models are the index roots of type gene (not repeats, ncRNAs...); count each at its start bin
+            starts = np.asarray(entry["starts"], dtype=np.int64)
+            starts = starts[(np.asarray(entry["types"]) == "gene") & (starts < length)] // bin_size
+            np.add.at(counts[:, 3], starts, 1)
+    return counts
+
+
+def build_summary(reference: ReferenceInfo):
+    """
+    Precompute the zoom pyramid of a reference and write it next to its sequence
+
+    File layout: ``PSUM``, version and header length (little-endian
+    uint32s), a JSON header with the zoom levels and per-chromosome array
+    offsets, then uint32 counter arrays of shape (bins, 4) per chromosome
+    and level. Coarser levels are sums of the finest one.
+    """
+    header = {"levels": list(ZOOM_LEVELS), "fields": list(FIELDS), "chroms": {}}
+    arrays = []
+    offset = 0
+    for chrom, length in reference.sequences.items():
+        counts = _bin_counts(reference, chrom, length)
+        levels = []
+        for bin_size in ZOOM_LEVELS:
+            factor = bin_size // ZOOM_LEVELS[0]
+            level = np.add.reduceat(counts, np.arange(0, len(counts), factor), axis=0) if len(counts) else counts
+            level = np.ascontiguousarray(level, dtype="<u4")
+            levels.append({"offset": offset, "bins": len(level)})
+            arrays.append(level)
+            offset += level.nbytes
+        header["chroms"][chrom] = {"length": length, "levels": levels}
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # Pad the header so the counter arrays start 8-byte aligned
+    header_bytes += b" " * (-(12 + len(header_bytes)) % 8)
+    path = summary_path(reference)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<II", SUMMARY_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for level in arrays:
+            f.write(level.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def _read_preamble(f) -> tuple:
+    """(version, header length) of a summary file, version 0 if the magic is wrong"""
+    preamble = f.read(12)
+    if len(preamble) < 12 or preamble[:4] != MAGIC:
+        return 0, 0
+    return struct.unpack("<II", preamble[4:])
+
+
+class SummaryTiles:
+    """Memory-mapped zoom pyramid of one reference"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            version, header_len = _read_preamble(f)
+            if version != SUMMARY_VERSION:
+                raise ValueError(f"Unsupported summary file {path}")
+            self.header = json.loads(f.read(header_len))
+        data_offset = 12 + header_len
+        size = os.path.getsize(path)
+        self._data = np.memmap(path, dtype="<u4", mode="r", offset=data_offset) if size > data_offset else None
+        self.levels = self.header["levels"]
+
+    def query(self, chrom: str, start: int, end: int, bins: int) -> Optional[dict]:
+        """
+        Summarise a region into exactly ``bins`` values per metric
+
+        Uses the coarsest zoom level that still has at least one stored bin
+        per output bin, so cost depends on ``bins`` rather than region width.
+        Stored bins count towards each output bin by their overlap with it,
+        so bins narrower than the finest level report a share of its
+        counts (gene density becomes fractional) instead of all of them.
+        """
+        entry = self.header["chroms"].get(chrom)
+        if entry is None:
+            return None
+        end = min(end, entry["length"])
+        span = (end - start) / bins
+
+        level_idx = 0
+        for i, bin_size in enumerate(self.levels):
+            if bin_size <= span:
+                level_idx = i
+        bin_size = self.levels[level_idx]
+        level = entry["levels"][level_idx]
+        edges = np.linspace(start, end, bins + 1)
+
+        # Only the stored bins under the region are touched
+        lo = min(start // bin_size, level["bins"] - 1)
+        hi = min(-(-end // bin_size), level["bins"])
+        base = level["offset"] // 4
+        counts = self._data[base + lo * len(FIELDS):base + hi * len(FIELDS)]
+        counts = counts.reshape(hi - lo, len(FIELDS)).astype(np.float64)
+        cumulative = np.vstack([np.zeros((1, len(FIELDS))), np.cumsum(counts, axis=0)])
+        # A stored bin partly under an output bin contributes in proportion to the
+        # overlap (the last bin of a chromosome may be shorter than bin_size)
+        boundaries = np.minimum(np.arange(lo, hi + 1) * bin_size, entry["length"])
+        totals = np.column_stack([
+            np.diff(np.interp(edges, boundaries, cumulative[:, field])) for field in range(len(FIELDS))
+        ])
+
+        bases, gc, n, genes = totals.T
+        covered = bases + n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gc_fraction = np.where(bases > 0, gc / bases, np.nan)
+            n_fraction = np.where(covered > 0, n / covered, np.nan)
+
+        def to_list(values):
+            return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+        return {
+            "chrom": chrom,
+            "start": start,
+            "end": end,
+            "bins": bins,
+            "bin_size": span,
+            "zoom_level": bin_size,
+            "gc": to_list(gc_fraction),
+            "n": to_list(n_fraction),
+            "genes": [round(float(v), 4) for v in genes],
+        }
+
+
+def _is_stale(reference: ReferenceInfo) -> bool:
+    path = summary_path(reference)
+    if not os.path.exists(path):
+        return True
+    mtime = os.path.getmtime(path)
+    sources = [reference.sequence_path] + ([reference.gff_path] if reference.gff_path else [])
+    if any(os.path.getmtime(source) > mtime for source in sources):
+        return True
+    with open(path, "rb") as f:
+        return _read_preamble(f)[0] != SUMMARY_VERSION
+
+
+class SummaryService:
+    """Builds summary tiles on first use (or ahead of time) and keeps them mapped"""
+
+    def __init__(self):
+        self._tiles: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def ensure_built(self, reference: ReferenceInfo) -> bool:
+        """Build the summary of a reference if missing or stale; returns True if it was built"""
+        if _is_stale(reference):
+            build_summary(reference)
+            return True
+        return False
+
+    def open(self, reference: ReferenceInfo) -> SummaryTiles:
+        path = summary_path(reference)
+        with self._lock:
+            self.ensure_built(reference)
+            mtime = os.path.getmtime(path)
+            cached = self._tiles.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            tiles = SummaryTiles(path)
+            self._tiles[path] = (mtime, tiles)
+        return tiles
+
+
+# Global service instance
+summary_service = SummaryService()
@@ -0,0 +1,208 @@
+"""
+2-bit packed reference store (UCSC .2bit format) with vectorized decoding
+"""
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+
+TWOBIT_SIGNATURE = 0x1A412743
+# Sequence is converted in chunks; a multiple of 4 keeps packed bytes aligned
+CONVERT_CHUNK = 4 * 1024 * 1024
+
+# Packing order used by the format: T=0, C=1, A=2, G=3 (N and other codes pack as T)
+_ENCODE = np.zeros(256, dtype=np.uint8)
+for _i, _base in enumerate(b"TCAG"):
+    _ENCODE[_base] = _i
+    _ENCODE[_base | 0x20] = _i
+_NOT_ACGT = np.ones(256, dtype=bool)
+_NOT_ACGT[list(b"ACGTacgt")] = False
+_LOWER = np.zeros(256, dtype=bool)
+_LOWER[ord("a"):ord("z") + 1] = True
+
+# Each packed byte expands to four bases
+_DECODE = np.array(
+    [[b"TCAG"[(byte >> shift) & 3] for shift in (6, 4, 2, 0)] for byte in range(256)],
+    dtype=np.uint8,
+)
+
+
+class _Runs:
+    """Accumulates [start, size) runs of a boolean track across chunks"""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.sizes: List[int] = []
+
+    def add(self, flags: np.ndarray, offset: int):
+        if not flags.any():
+            return
+        edges = np.diff(np.concatenate(([0], flags.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            start += offset
+            end += offset
+            if self.starts and self.starts[-1] + self.sizes[-1] == start:
+                self.sizes[-1] += end - start
+            else:
+                self.starts.append(start)
+                self.sizes.append(end - start)
+
+
+def fasta_to_twobit(fasta, out_path: str):
+    """
+    Convert an indexed FASTA reader (anything with ``lengths`` and ``fetch_bytes``) to .2bit
+
+    Non-ACGT bases become N blocks and lower-case bases become soft-mask
+    blocks, as with UCSC faToTwoBit. Files over 4 GB use version 1
+    (64-bit offsets).
+    """
+    names = list(fasta.lengths)
+    runs: Dict[str, Tuple[_Runs, _Runs]] = {}
+    for name in names:
+        n_runs, mask_runs = _Runs(), _Runs()
+        for chunk_start in range(0, fasta.lengths[name], CONVERT_CHUNK):
+            seq = np.frombuffer(fasta.fetch_bytes(name, chunk_start, chunk_start + CONVERT_CHUNK), dtype=np.uint8)
+            n_runs.add(_NOT_ACGT[seq], chunk_start)
+            mask_runs.add(_LOWER[seq], chunk_start)
+        runs[name] = (n_runs, mask_runs)
+
+    def record_size(name):
+        n_runs, mask_runs = runs[name]
+        return 16 + 8 * len(n_runs.starts) + 8 * len(mask_runs.starts) + (fasta.lengths[name] + 3) // 4
+
+    encoded_names = [name.encode("utf-8") for name in names]
+    total = 16 + sum(1 + len(n) + 8 for n in encoded_names) + sum(record_size(name) for name in names)
+    version = 0 if total < 2 ** 32 else 1
+    offset_format = "<I" if version == 0 else "<Q"
+    offset = 16 + sum(1 + len(n) + struct.calcsize(offset_format) for n in encoded_names)
+
+    with open(out_path + ".tmp", "wb") as out:
+        out.write(struct.pack("<IIII", TWOBIT_SIGNATURE, version, len(names), 0))
+        for name, encoded in zip(names, encoded_names):
+            out.write(struct.pack("<B", len(encoded)) + encoded + struct.pack(offset_format, offset))
+            offset += record_size(name)
+
+        for name in names:
+            length = fasta.lengths[name]
+            n_runs, mask_runs = runs[name]
+            out.write(struct.pack("<II", length, len(n_runs.starts)))
+            out.write(np.asarray(n_runs.starts, dtype="<u4").tobytes())
+            out.write(np.asarray(n_runs.sizes, dtype="<u4").tobytes())
+            out.write(struct.pack("<I", len(mask_runs.starts)))
+            out.write(np.asarray(mask_runs.starts, dtype="<u4").tobytes())
+            out.write(np.asarray(mask_runs.sizes, dtype="<u4").tobytes())
+            out.write(struct.pack("<I", 0))
+            for chunk_start in range(0, length, CONVERT_CHUNK):
+                codes = _ENCODE[np.frombuffer(fasta.fetch_bytes(name, chunk_start, chunk_start + CONVERT_CHUNK), dtype=np.uint8)]
+                if len(codes) % 4:
+                    codes = np.concatenate((codes, np.zeros(4 - len(codes) % 4, dtype=np.uint8)))
+                codes = codes.reshape(-1, 4)
+                packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+                out.write(packed.astype(np.uint8).tobytes())
+    os.replace(out_path + ".tmp", out_path)
+
+
+def _covered(block_starts: np.ndarray, block_ends: np.ndarray, start: int, end: int):
+    """Boolean mask of the region positions covered by sorted blocks, or None if none overlap"""
+    first = np.searchsorted(block_ends, start, side="right")
+    last = np.searchsorted(block_starts, end, side="left")
+    if first >= last:
+        return None
+    delta = np.zeros(end - start + 1, dtype=np.int32)
+    np.add.at(delta, np.maximum(block_starts[first:last], start) - start, 1)
+    np.add.at(delta, np.minimum(block_ends[first:last], end) - start, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+class TwoBitFile:
+    """Memory-mapped .2bit file with the same read interface as IndexedFasta"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, = struct.unpack_from("<I", self._data, 0)
+        if signature == TWOBIT_SIGNATURE:
+            self._endian = "<"
+        elif signature == struct.unpack(">I", struct.pack("<I", TWOBIT_SIGNATURE))[0]:
+            self._endian = ">"
+        else:
+            raise ValueError(f"{path} is not a .2bit file")
+        version, count, _ = struct.unpack_from(self._endian + "III", self._data, 4)
+        if version not in (0, 1):
+            raise ValueError(f"Unsupported .2bit version {version}")
+        offset_format = self._endian + ("I" if version == 0 else "Q")
+
+        self._offsets: Dict[str, int] = {}
+        pos = 16
+        for _ in range(count):
+            name_len = self._data[pos]
+            name = self._data[pos + 1:pos + 1 + name_len].decode("utf-8")
+            pos += 1 + name_len
+            self._offsets[name], = struct.unpack_from(offset_format, self._data, pos)
+            pos += struct.calcsize(offset_format)
+
+        self.lengths: Dict[str, int] = {
+            name: struct.unpack_from(self._endian + "I", self._data, offset)[0]
+            for name, offset in self._offsets.items()
+        }
+        self._records: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def references(self) -> List[str]:
+        return list(self.lengths)
+
+    def _blocks(self, pos: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        count, = struct.unpack_from(self._endian + "I", self._data, pos)
+        dtype = self._endian + "u4"
+        starts = np.frombuffer(self._data, dtype=dtype, count=count, offset=pos + 4).astype(np.int64)
+        sizes = np.frombuffer(self._data, dtype=dtype, count=count, offset=pos + 4 + 4 * count).astype(np.int64)
+        return starts, starts + sizes, pos + 4 + 8 * count
+
+    def _record(self, chrom: str) -> tuple:
+        """(N blocks, mask blocks, packed DNA offset) of a sequence, parsed on first access"""
+        record = self._records.get(chrom)
+        if record is None:
+            with self._lock:
+                pos = self._offsets[chrom] + 4
+                n_starts, n_ends, pos = self._blocks(pos)
+                mask_starts, mask_ends, pos = self._blocks(pos)
+                record = ((n_starts, n_ends), (mask_starts, mask_ends), pos + 4)
+                self._records[chrom] = record
+        return record
+
+    def fetch(self, chrom: str, start: int, end: int) -> str:
+        """Fetch bases of a 0-based, end-exclusive region; soft-masked bases are lower case"""
+        return self.fetch_bytes(chrom, start, end).decode("ascii")
+
+    def fetch_bytes(self, chrom: str, start: int, end: int) -> bytes:
+        if chrom not in self.lengths:
+            raise KeyError(chrom)
+        start = max(0, start)
+        end = min(end, self.lengths[chrom])
+        if start >= end:
+            return b""
+
+        (n_starts, n_ends), (mask_starts, mask_ends), dna_offset = self._record(chrom)
+        first_byte, last_byte = start // 4, (end + 3) // 4
+        packed = np.frombuffer(self._data, dtype=np.uint8, count=last_byte - first_byte, offset=dna_offset + first_byte)
+        skip = start - first_byte * 4
+        seq = _DECODE[packed].ravel()[skip:skip + end - start]
+
+        n_mask = _covered(n_starts, n_ends, start, end)
+        if n_mask is not None:
+            seq[n_mask] = ord("N")
+        soft_mask = _covered(mask_starts, mask_ends, start, end)
+        if soft_mask is not None:
+            seq[soft_mask] |= 0x20
+        return seq.tobytes()
+
+    def close(self):
+        self._data.close()
+        self._file.close()
@@ -0,0 +1,244 @@
+"""
+Upload Store - Resumable chunked uploads streamed straight to disk
+"""
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Tuple
+from config import settings
+
+INFO_SUFFIX = ".json"
+DATA_SUFFIX = ".part"
+# Request body bytes gathered before each write to disk
+WRITE_BUFFER = 1024 * 1024
+# Read size when a file has to be hashed from disk
+HASH_CHUNK = 4 * 1024 * 1024
+# Minimum delay between two sweeps for abandoned uploads
+PRUNE_INTERVAL = 3600.0
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadConflict(Exception):
+    """A chunk that does not continue an upload at its current offset"""
+
+    def __init__(self, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def safe_filename(filename: str) -> str:
+    """Last path component of a client-supplied file name; raises ValueError if none is left"""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise ValueError("A file name is required")
+    return name
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(HASH_CHUNK)
+            if not data:
+                return sha256.hexdigest()
+            sha256.update(data)
+
+
+def save_stream(src: BinaryIO, path: str) -> Tuple[int, str]:
+    """Copy a file object to ``path`` chunk by chunk; returns (size, sha256). Raises ValueError past MAX_FILE_SIZE"""
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                data = src.read(WRITE_BUFFER)
+                if not data:
+                    break
+                size += len(data)
+                if size > settings.MAX_FILE_SIZE:
+                    raise ValueError(f"File is larger than {settings.MAX_FILE_SIZE} bytes")
+                out.write(data)
+                sha256.update(data)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return size, sha256.hexdigest()
+
+
+class UploadStore:
+    """
+    Uploads sent in chunks at explicit offsets (tus-like), kept in UPLOAD_DIR/incoming
+
+    An upload is a JSON description (owner, file name, declared size,
+    metadata) and a ``.part`` file whose length is the upload's offset, so
+    an interrupted upload resumes from whatever reached the disk. Chunks
+    are written in WRITE_BUFFER pieces from a thread, so memory per
+    upload is constant. The SHA-256 is updated as chunks are written; when
+    chunks were written by another process (or before a restart) the
+    hash state is not available and the file is hashed once when it
+    completes instead. Uploads left untouched for UPLOAD_EXPIRY are
+    deleted.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Upload id -> (offset hashed so far, sha256 state) of uploads written by this process
+        self._hashes: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, upload_id + suffix)
+
+    def create(self, user_id: int, filename: str, size: int, metadata: Optional[dict] = None) -> dict:
+        """Start an upload of ``size`` bytes; raises ValueError on an invalid name or size"""
+        filename = safe_filename(filename)
+        if isinstance(size, bool) or not isinstance(size, int) or size <= 0:
+            raise ValueError("Upload size must be a positive number of bytes")
+        if size > settings.MAX_FILE_SIZE:
+            raise ValueError(f"File is larger than {settings.MAX_FILE_SIZE} bytes")
+        self._maybe_prune()
+        upload_id = uuid.uuid4().hex
+        info = {
+            "id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "metadata": metadata or {},
+            "created_at": time.time(),
+        }
+        open(self._path(upload_id, DATA_SUFFIX), "wb").close()
+        with open(self._path(upload_id, INFO_SUFFIX), "w") as f:
+            json.dump(info, f)
+        with self._lock:
+            self._hashes[upload_id] = (0, hashlib.sha256())
+        return {**info, "offset": 0}
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        """An upload's description with its current offset, or None"""
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            return None
+        try:
+            with open(self._path(upload_id, INFO_SUFFIX)) as f:
+                info = json.load(f)
+            return {**info, "offset": os.path.getsize(self._path(upload_id, DATA_SUFFIX))}
+        except (OSError, ValueError):
+            return None
+
+    def _take_hash(self, upload_id: str, offset: int) -> Optional["hashlib._Hash"]:
+        with self._lock:
+            state = self._hashes.pop(upload_id, None)
+        return state[1] if state and state[0] == offset else None
+
+    def _put_hash(self, upload_id: str, offset: int, sha256: "hashlib._Hash"):
+        with self._lock:
+            self._hashes[upload_id] = (offset, sha256)
+
+    @staticmethod
+    def _flush(f: BinaryIO, sha256: Optional["hashlib._Hash"], data: bytes) -> int:
+        f.write(data)
+        f.flush()
+        if sha256 is not None:
+            sha256.update(data)
+        return len(data)
+
+    async def write(self, info: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """
+        Append a request body at ``offset``; returns the new offset
+
+        Raises UploadConflict if ``offset`` is not the upload's current
+        offset or another request is writing to it, and ValueError if the
+        body goes past the declared size. Whatever was received before an
+        error or a dropped connection is kept.
+        """
+        upload_id = info["id"]
+        f = await asyncio.to_thread(open, self._path(upload_id, DATA_SUFFIX), "ab")
+        try:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict("Another request is writing to this upload")
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadConflict(f"Upload is at offset {current}", current)
+            sha256 = self._take_hash(upload_id, current)
+            buffer = bytearray()
+            try:
+                async for chunk in chunks:
+                    if current + len(buffer) + len(chunk) > info["size"]:
+                        raise ValueError(f"Chunk goes past the declared size of {info['size']} bytes")
+                    buffer += chunk
+                    if len(buffer) >= WRITE_BUFFER:
+                        current += await asyncio.to_thread(self._flush, f, sha256, bytes(buffer))
+                        buffer.clear()
+            finally:
+                if buffer:
+                    current += await asyncio.to_thread(self._flush, f, sha256, bytes(buffer))
+                if sha256 is not None:
+                    self._put_hash(upload_id, current, sha256)
+            return current
+        finally:
+            f.close()
+
+    def complete(self, info: dict, destination: str) -> str:
+        """
+        Move a fully received upload to ``destination``; returns its SHA-256
+
+        Raises UploadConflict while bytes are missing and ValueError if the
+        content does not match a sha256 given in the metadata (the upload
+        is discarded then).
+        """
+        upload_id = info["id"]
+        data_path = self._path(upload_id, DATA_SUFFIX)
+        size = os.path.getsize(data_path)
+        if size != info["size"]:
+            raise UploadConflict(f"Upload is incomplete ({size} of {info['size']} bytes)", size)
+        sha256 = self._take_hash(upload_id, size)
+        digest = sha256.hexdigest() if sha256 is not None else hash_file(data_path)
+        expected = (info.get("metadata") or {}).get("sha256")
+        if expected and expected.lower() != digest:
+            self.abort(upload_id)
+            raise ValueError("Uploaded content does not match the expected sha256")
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(data_path, destination)
+        os.remove(self._path(upload_id, INFO_SUFFIX))
+        return digest
+
+    def abort(self, upload_id: str):
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        for suffix in (DATA_SUFFIX, INFO_SUFFIX):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        cutoff = now - settings.UPLOAD_EXPIRY
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(INFO_SUFFIX):
+                continue
+            upload_id = entry.name[:-len(INFO_SUFFIX)]
+            try:
+                # Progress moves the data file's mtime; the description is written once
+                if os.path.getmtime(self._path(upload_id, DATA_SUFFIX)) < cutoff:
+                    self.abort(upload_id)
+            except FileNotFoundError:
+                self.abort(upload_id)
+
+
+# Global upload store
+upload_store = UploadStore(os.path.join(settings.UPLOAD_DIR, "incoming"))
@@ -0,0 +1,23 @@
+"""
+Test configuration: settings point at a scratch directory before the app is imported
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="panda-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+for name, sub in (
+    ("UPLOAD_DIR", "uploads"),
+    ("GENOME_DATA_DIR", "genomes"),
+    ("BLAST_DB_PATH", "blast"),
+    ("TEMP_DIR", "tmp"),
+    ("RESULT_DIR", "results"),
+):
+    os.environ.setdefault(name, os.path.join(_scratch, sub))
+os.environ.setdefault("JOB_EXECUTOR_EMBEDDED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+"""
+BGZF compression and random access across block boundaries
+"""
+import gzip
+import os
+import random
+import pytest
+from services.bgzf import BLOCK_INPUT_SIZE, BgzfReader, bgzip_file, read_gzi
+
+
+@pytest.fixture
+def compressed(tmp_path):
+    """A BGZF file of a little over three blocks, with its source content"""
+    rng = random.Random(42)
+    content = "".join(rng.choice("ACGTN\n") for _ in range(3 * BLOCK_INPUT_SIZE + 1234)).encode()
+    src = tmp_path / "ref.fa"
+    src.write_bytes(content)
+    blocks = bgzip_file(str(src), str(tmp_path / "ref.fa.gz"))
+    return str(tmp_path / "ref.fa.gz"), content, blocks
+
+
+def test_output_is_gzip_readable(compressed):
+    path, content, _ = compressed
+    assert gzip.decompress(open(path, "rb").read()) == content
+
+
+def test_gzi_lists_every_block(compressed):
+    path, _, blocks = compressed
+    assert len(blocks) == 4
+    assert [u for _, u in blocks] == [i * BLOCK_INPUT_SIZE for i in range(4)]
+    assert read_gzi(path + ".gzi") == blocks
+
+
+def test_reads_across_block_boundaries(compressed):
+    path, content, _ = compressed
+    reader = BgzfReader(path)
+    try:
+        assert reader.size == len(content)
+        for start, end in (
+            (0, 10),
+            (BLOCK_INPUT_SIZE - 5, BLOCK_INPUT_SIZE + 5),
+            (BLOCK_INPUT_SIZE, BLOCK_INPUT_SIZE + 1),
+            (BLOCK_INPUT_SIZE - 1, 3 * BLOCK_INPUT_SIZE + 1),
+            (len(content) - 7, len(content) + 100),
+            (0, len(content)),
+        ):
+            assert reader.read(start, end) == content[start:end]
+        assert reader.read(len(content), len(content) + 10) == b""
+    finally:
+        reader.close()
+
+
+def test_missing_or_stale_gzi_is_rebuilt(compressed):
+    path, content, blocks = compressed
+    os.remove(path + ".gzi")
+    reader = BgzfReader(path)
+    try:
+        start, end = BLOCK_INPUT_SIZE - 3, BLOCK_INPUT_SIZE + 3
+        assert reader.read(start, end) == content[start:end]
+    finally:
+        reader.close()
+    assert read_gzi(path + ".gzi") == blocks
+
+    # An index older than its data is not trusted
+    with open(path + ".gzi", "wb") as f:
+        f.write(b"\0" * 8)
+    st = os.stat(path)
+    os.utime(path + ".gzi", ns=(st.st_atime_ns, st.st_mtime_ns - 10**9))
+    reader = BgzfReader(path)
+    try:
+        assert reader.read(0, len(content)) == content
+    finally:
+        reader.close()
@@ -0,0 +1,87 @@
+"""
+Keyset cursors of dataset listings
+"""
+import random
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.auth import auth_dependency
+from api.datasets import router
+from db import Base, SessionLocal, engine, Dataset
+from services.dataset_catalog import decode_cursor, encode_cursor
+
+# Only three distinct creation times, so most rows tie on created_at
+TIMES = [datetime(2024, 1, 1), datetime(2024, 6, 1, 12, 0, 0, 500), datetime(2025, 3, 1)]
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(7)
+    rows = [
+        Dataset(
+            name=f"dataset {i}",
+            file_path=f"/blobs/{i}",
+            species=rng.choice(["giant_panda", "red_panda"]),
+            access_level=rng.choice(["public", "public", "collaborator"]),
+            created_at=rng.choice(TIMES),
+        )
+        for i in range(40)
+    ]
+    db.add_all(rows)
+    db.commit()
+    db.close()
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/datasets")
+    app.dependency_overrides[auth_dependency] = lambda: {"sub": 1, "role": "registered"}
+    yield TestClient(app)
+
+    db = SessionLocal()
+    db.query(Dataset).delete()
+    db.commit()
+    db.close()
+
+
+def _expected(**filters) -> list:
+    db = SessionLocal()
+    try:
+        query = db.query(Dataset).filter(Dataset.access_level == "public").filter_by(**filters)
+        return [d.id for d in sorted(query, key=lambda d: (d.created_at, d.id), reverse=True)]
+    finally:
+        db.close()
+
+
+def _pages(client, limit: int, **filters) -> list:
+    """Ids of every page of a listing, following next_cursor"""
+    ids, params = [], {"limit": limit, "count": "none", **filters}
+    while True:
+        page = client.get("/api/datasets", params=params).json()
+        assert len(page["datasets"]) <= limit
+        ids += [d["id"] for d in page["datasets"]]
+        if page["next_cursor"] is None:
+            return ids
+        params["cursor"] = page["next_cursor"]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 7, 100])
+def test_pages_have_no_duplicates_or_gaps(client, limit):
+    assert _pages(client, limit) == _expected()
+
+
+def test_pages_with_a_filter(client):
+    assert _pages(client, 3, species="red_panda") == _expected(species="red_panda")
+
+
+def test_cursor_round_trip():
+    dataset = Dataset(id=12, created_at=TIMES[1])
+    assert decode_cursor(encode_cursor(dataset)) == (TIMES[1], 12)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bnVsbA", "WzEsIDJd"])
+def test_invalid_cursors_are_rejected(client, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    assert client.get("/api/datasets", params={"cursor": cursor or "x"}).status_code == 400
@@ -0,0 +1,97 @@
+"""
+Range, If-Range and conditional GET handling of send_file
+"""
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from core.file_response import MAX_RANGES, RangeNotSatisfiable, parse_range_header, send_file
+
+CONTENT = bytes(range(256)) * 4
+
+
+def _ranges(count: int) -> str:
+    """Range header of ``count`` one-byte ranges that cannot be merged"""
+    return "bytes=" + ",".join(f"{i * 2}-{i * 2}" for i in range(count))
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.api_route("/file", methods=["GET", "HEAD"])
+    def get_file(request: Request):
+        return send_file(request, str(path))
+
+    return TestClient(app)
+
+
+def test_ranges_are_sorted_and_merged():
+    assert parse_range_header("bytes=50-59,0-9,5-19,20-29", 1000) == [(0, 29), (50, 59)]
+
+
+def test_open_and_suffix_ranges_are_clamped_to_the_file():
+    assert parse_range_header("bytes=990-", 1000) == [(990, 999)]
+    assert parse_range_header("bytes=-10", 1000) == [(990, 999)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 999)]
+    assert parse_range_header("bytes=900-5000", 1000) == [(900, 999)]
+
+
+@pytest.mark.parametrize("header", ["bytes=5", "bytes=9-0", "items=0-9", "bytes=a-b", "bytes="])
+def test_malformed_ranges_are_ignored(header):
+    assert parse_range_header(header, 1000) is None
+
+
+def test_ranges_past_the_end_are_not_satisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-1010", 1000)
+
+
+def test_too_many_ranges_are_not_satisfiable():
+    assert len(parse_range_header(_ranges(MAX_RANGES), 1000)) == MAX_RANGES
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(_ranges(MAX_RANGES + 1), 1000)
+
+
+def test_single_range(client):
+    r = client.get("/file", headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert r.content == CONTENT[10:20]
+
+
+def test_multiple_ranges_are_sent_as_multipart(client):
+    r = client.get("/file", headers={"Range": "bytes=0-3,100-103"})
+    assert r.status_code == 206
+    assert r.headers["content-type"].startswith("multipart/byteranges; boundary=")
+    assert int(r.headers["content-length"]) == len(r.content)
+    assert f"Content-Range: bytes 0-3/{len(CONTENT)}".encode() in r.content
+    assert f"Content-Range: bytes 100-103/{len(CONTENT)}".encode() in r.content
+    assert CONTENT[100:104] in r.content
+
+
+def test_too_many_ranges_get_416(client):
+    r = client.get("/file", headers={"Range": _ranges(MAX_RANGES + 1)})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_if_range_with_current_etag_serves_the_range(client):
+    etag = client.head("/file").headers["etag"]
+    r = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert r.status_code == 206
+    assert r.content == CONTENT[:10]
+
+
+def test_if_range_with_stale_etag_serves_the_whole_file(client):
+    r = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert r.status_code == 200
+    assert r.content == CONTENT
+
+
+def test_if_none_match_with_current_etag_is_not_modified(client):
+    etag = client.head("/file").headers["etag"]
+    r = client.get("/file", headers={"If-None-Match": etag, "Range": "bytes=0-9"})
+    assert r.status_code == 304
+    assert r.content == b""
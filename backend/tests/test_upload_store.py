@@ -0,0 +1,98 @@
+"""
+Resumable uploads: offsets, conflicts, resuming and completion
+"""
+import asyncio
+import hashlib
+import pytest
+from services.upload_store import UploadConflict, UploadStore
+
+CONTENT = bytes(range(256)) * 40
+
+
+async def _body(*chunks: bytes, fail: bool = False):
+    for chunk in chunks:
+        yield chunk
+    if fail:
+        raise ConnectionResetError("client went away")
+
+
+def write(store: UploadStore, info: dict, offset: int, *chunks: bytes, fail: bool = False) -> int:
+    return asyncio.run(store.write(info, offset, _body(*chunks, fail=fail)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / "incoming"))
+
+
+def test_chunks_at_the_reported_offset_complete_the_upload(store, tmp_path):
+    info = store.create(1, "reads.fq", len(CONTENT), {"sha256": hashlib.sha256(CONTENT).hexdigest()})
+    assert info["offset"] == 0
+    assert write(store, info, 0, CONTENT[:1000]) == 1000
+    assert write(store, info, 1000, CONTENT[1000:3000], CONTENT[3000:]) == len(CONTENT)
+    destination = tmp_path / "done" / "reads.fq"
+    assert store.complete(store.get(info["id"]), str(destination)) == hashlib.sha256(CONTENT).hexdigest()
+    assert destination.read_bytes() == CONTENT
+    assert store.get(info["id"]) is None
+
+
+def test_write_at_another_offset_conflicts(store):
+    info = store.create(1, "reads.fq", len(CONTENT))
+    write(store, info, 0, CONTENT[:100])
+    for offset in (0, 50, 200):
+        with pytest.raises(UploadConflict) as e:
+            write(store, info, offset, CONTENT[offset:offset + 10])
+        assert e.value.offset == 100
+    assert store.get(info["id"])["offset"] == 100
+
+
+def test_interrupted_write_keeps_what_arrived_and_resumes(store, tmp_path):
+    info = store.create(1, "reads.fq", len(CONTENT))
+    with pytest.raises(ConnectionResetError):
+        write(store, info, 0, CONTENT[:700], CONTENT[700:1500], fail=True)
+    offset = store.get(info["id"])["offset"]
+    assert offset == 1500
+    write(store, info, offset, CONTENT[offset:])
+    assert store.complete(info, str(tmp_path / "reads.fq")) == hashlib.sha256(CONTENT).hexdigest()
+    assert (tmp_path / "reads.fq").read_bytes() == CONTENT
+
+
+def test_resume_in_another_process_hashes_on_completion(store, tmp_path):
+    info = store.create(1, "reads.fq", len(CONTENT))
+    write(store, info, 0, CONTENT[:2000])
+    # A fresh store has no hash state for the upload, as after a restart
+    restarted = UploadStore(store.directory)
+    info = restarted.get(info["id"])
+    write(restarted, info, info["offset"], CONTENT[2000:])
+    assert restarted.complete(info, str(tmp_path / "reads.fq")) == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_body_past_the_declared_size_is_refused(store):
+    info = store.create(1, "reads.fq", 100)
+    with pytest.raises(ValueError):
+        write(store, info, 0, CONTENT[:60], CONTENT[60:120])
+    # The chunk that fitted was kept
+    assert store.get(info["id"])["offset"] == 60
+
+
+def test_incomplete_upload_cannot_complete(store, tmp_path):
+    info = store.create(1, "reads.fq", len(CONTENT))
+    write(store, info, 0, CONTENT[:10])
+    with pytest.raises(UploadConflict) as e:
+        store.complete(info, str(tmp_path / "reads.fq"))
+    assert e.value.offset == 10
+
+
+def test_content_not_matching_the_declared_sha256_is_discarded(store, tmp_path):
+    info = store.create(1, "reads.fq", 10, {"sha256": "0" * 64})
+    write(store, info, 0, CONTENT[:10])
+    with pytest.raises(ValueError):
+        store.complete(info, str(tmp_path / "reads.fq"))
+    assert store.get(info["id"]) is None
+    assert not (tmp_path / "reads.fq").exists()
+
+
+@pytest.mark.parametrize("filename, size", [("", 10), ("../", 10), ("a.fq", 0), ("a.fq", True), ("a.fq", "10")])
+def test_invalid_uploads_are_refused(store, filename, size):
+    with pytest.raises(ValueError):
+        store.create(1, filename, size)
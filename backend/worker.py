@@ -0,0 +1,24 @@
+"""
+Analysis job worker
+
+Runs the job executor in its own process. Start one or more workers next
+to the API (with JOB_EXECUTOR_EMBEDDED=false on the API side) so that
+BLAST searches never compete with request handling; each worker runs up
+to JOB_WORKERS jobs at a time and they coordinate through the database.
+"""
+import asyncio
+import logging
+from db.connection import engine, Base
+from db.migrations import upgrade
+from services.job_executor import job_executor
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    upgrade()
+    print(f"👷 Job worker started with {job_executor.workers} processes")
+    try:
+        asyncio.run(job_executor.serve())
+    except KeyboardInterrupt:
+        print("Job worker stopped")
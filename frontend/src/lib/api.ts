@@ -2,7 +2,7 @@
  * API client for backend communication
  */
 import axios from 'axios';
-import type { User, Dataset, ApiResponse, PaginatedResponse } from '@/types';
+import type { User, Dataset, DatasetSearchResult, ApiResponse, PaginatedResponse, JobEvent } from '@/types';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
@@ -61,11 +61,31 @@ export const authApi = {
 // Datasets API
 export const datasetsApi = {
   list: (params?: {
-    skip?: number;
+    cursor?: string;
     limit?: number;
     species?: string;
     data_type?: string;
-  }) => api.get<{ total: number; page: number; page_size: number; datasets: Dataset[] }>('/api/datasets', { params }),
+    count?: 'exact' | 'estimated' | 'cached' | 'none';
+  }) => api.get<{
+    total: number | null;
+    count_mode: string;
+    page_size: number;
+    next_cursor: string | null;
+    datasets: Dataset[];
+  }>('/api/datasets', { params }),
+
+  search: (params: {
+    q: string;
+    limit?: number;
+    skip?: number;
+    species?: string;
+    data_type?: string;
+  }) => api.get<{
+    query: string;
+    page_size: number;
+    has_more: boolean;
+    results: DatasetSearchResult[];
+  }>('/api/datasets/search', { params }),
   
   get: (id: number) => api.get<ApiResponse<Dataset>>(`/api/datasets/${id}`),
 };
@@ -93,6 +113,106 @@ export const toolsApi = {
   
   getBlastResult: (jobId: number) =>
     api.get<ApiResponse<any>>(`/api/tools/blast/${jobId}`),
+
+  getBlastHits: (jobId: number, params?: { offset?: number; limit?: number }) =>
+    api.get<ApiResponse<any>>(`/api/tools/blast/${jobId}/hits`, { params }),
+
+  blastBatch: (data: {
+    fasta: string;
+    database?: string;
+    program?: string;
+    expect?: number;
+    num_results?: number;
+  }) => api.post<ApiResponse<any>>('/api/tools/blast/batch', data),
+
+  getBlastQueryResult: (jobId: number, queryId: string) =>
+    api.get<ApiResponse<any>>(`/api/tools/blast/${jobId}/queries/${encodeURIComponent(queryId)}`),
+
+  // Follow job state and progress over one server-sent event stream; resolves once every job has finished
+  watchJobs: async (jobIds: number[], onEvent: (event: JobEvent) => void, signal?: AbortSignal) => {
+    const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
+    const response = await fetch(`${API_BASE_URL}/api/tools/jobs/events?ids=${jobIds.join(',')}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Job event stream failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) return;
+      buffer += decoder.decode(value, { stream: true });
+      let end;
+      while ((end = buffer.indexOf('\n\n')) >= 0) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        const name = block.match(/^event: (.*)$/m)?.[1];
+        const data = block.match(/^data: (.*)$/m)?.[1];
+        if (name === 'end') return;
+        if (name === 'job' && data) onEvent(JSON.parse(data));
+      }
+    }
+  },
+};
+
+// Files API
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_RETRIES = 5;
+
+export const filesApi = {
+  // Resumable chunked upload; the upload id is remembered per file, so a
+  // reload picks up where the last attempt stopped
+  uploadDataset: async (
+    file: File,
+    dataset: { name: string; description?: string; species?: string; data_type?: string; access_level?: string },
+    onProgress?: (sent: number, total: number) => void,
+  ) => {
+    const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let uploadId = localStorage.getItem(key);
+    let offset = 0;
+    if (uploadId) {
+      try {
+        offset = (await api.get<{ offset: number }>(`/api/files/uploads/${uploadId}`)).data.offset;
+      } catch {
+        uploadId = null;
+      }
+    }
+    if (!uploadId) {
+      const created = await api.post<{ upload_id: string }>('/api/files/uploads', {
+        filename: file.name,
+        size: file.size,
+        dataset,
+      });
+      uploadId = created.data.upload_id;
+      localStorage.setItem(key, uploadId);
+    }
+
+    let failures = 0;
+    while (offset < file.size) {
+      onProgress?.(offset, file.size);
+      try {
+        const response = await api.patch<{ offset: number }>(
+          `/api/files/uploads/${uploadId}`,
+          file.slice(offset, offset + UPLOAD_CHUNK_SIZE),
+          { headers: { 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(offset) } },
+        );
+        offset = response.data.offset;
+        failures = 0;
+      } catch (err: any) {
+        if (++failures > UPLOAD_RETRIES || (err.response && err.response.status !== 409)) throw err;
+        // Resume from whatever reached the server
+        await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+        offset = (await api.get<{ offset: number }>(`/api/files/uploads/${uploadId}`)).data.offset;
+      }
+    }
+    onProgress?.(file.size, file.size);
+    const completed = await api.post<Dataset & { sha256: string }>(`/api/files/uploads/${uploadId}/complete`);
+    localStorage.removeItem(key);
+    return completed;
+  },
 };
 
 // Users API
@@ -10,12 +10,22 @@ import Footer from '@/components/layout/Footer';
 import { datasetsApi } from '@/lib/api';
 import type { Dataset } from '@/types';
 
+// Text with <mark></mark> around matched terms, as React nodes
+const renderHighlight = (text: string) =>
+  text.split(/<mark>(.*?)<\/mark>/g).map((part, i) => (i % 2 ? <mark key={i}>{part}</mark> : part));
+
 export default function Datasets() {
   const router = useRouter();
   const [datasets, setDatasets] = useState<Dataset[]>([]);
   const [loading, setLoading] = useState(true);
-  const [filter, setFilter] = useState({ species: '', data_type: '' });
+  const [filter, setFilter] = useState({ q: '', species: '', data_type: '' });
+  const [searchText, setSearchText] = useState('');
+  const [highlights, setHighlights] = useState<Record<number, { name: string; description: string }>>({});
   const [pagination, setPagination] = useState({ page: 1, pageSize: 10, total: 0 });
+  // Cursor of each page visited so far (page 1 has none), and of the page after the current one
+  const [cursors, setCursors] = useState<(string | undefined)[]>([undefined]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [hasMore, setHasMore] = useState(false);
   const [viewMode, setViewMode] = useState<'grid' | 'list'>('grid');
 
   useEffect(() => {
@@ -25,15 +35,35 @@ export default function Datasets() {
   const loadDatasets = async () => {
     setLoading(true);
     try {
-      const response = await datasetsApi.list({
-        skip: (pagination.page - 1) * pagination.pageSize,
-        limit: pagination.pageSize,
-        species: filter.species || undefined,
-        data_type: filter.data_type || undefined,
-      });
-      // Backend returns { total, page, page_size, datasets } directly
-      setDatasets(response.data.datasets || []);
-      setPagination((prev) => ({ ...prev, total: response.data.total || 0 }));
+      if (filter.q) {
+        // Ranked search pages by offset; totals are not counted
+        const response = await datasetsApi.search({
+          q: filter.q,
+          skip: (pagination.page - 1) * pagination.pageSize,
+          limit: pagination.pageSize,
+          species: filter.species || undefined,
+          data_type: filter.data_type || undefined,
+        });
+        const results = response.data.results || [];
+        setDatasets(results.map((result) => result.dataset));
+        setHighlights(Object.fromEntries(results.map((result) => [result.dataset.id, result.highlight])));
+        setPagination((prev) => ({ ...prev, total: 0 }));
+        setNextCursor(null);
+        setHasMore(response.data.has_more);
+      } else {
+        const response = await datasetsApi.list({
+          cursor: cursors[pagination.page - 1],
+          limit: pagination.pageSize,
+          species: filter.species || undefined,
+          data_type: filter.data_type || undefined,
+        });
+        // Backend returns { total, page_size, next_cursor, datasets } directly
+        setDatasets(response.data.datasets || []);
+        setHighlights({});
+        setPagination((prev) => ({ ...prev, total: response.data.total || 0 }));
+        setNextCursor(response.data.next_cursor);
+        setHasMore(!!response.data.next_cursor);
+      }
     } catch (error) {
       console.error('Error loading datasets:', error);
     }
@@ -121,6 +151,29 @@ export default function Datasets() {
 
             {/* Filters */}
             <div className="bg-white rounded-2xl shadow-lg p-6 mb-8">
+              <form
+                onSubmit={(e) => {
+                  e.preventDefault();
+                  setFilter({ ...filter, q: searchText.trim() });
+                  setPagination((prev) => ({ ...prev, page: 1 }));
+                  setCursors([undefined]);
+                }}
+                className="flex space-x-2 mb-4"
+              >
+                <input
+                  type="search"
+                  value={searchText}
+                  onChange={(e) => setSearchText(e.target.value)}
+                  placeholder='Search names, descriptions and metadata, e.g. "giant panda" assembly -draft'
+                  className="flex-1 px-4 py-3 bg-slate-50 border border-neutral-200 rounded-xl focus:ring-2 focus:ring-primary-500 focus:border-transparent transition-all"
+                />
+                <button
+                  type="submit"
+                  className="px-6 py-3 bg-gradient-to-r from-primary-600 to-primary-700 text-white font-medium rounded-xl hover:from-primary-700 hover:to-primary-800 transition-colors"
+                >
+                  Search
+                </button>
+              </form>
               <div className="grid md:grid-cols-4 gap-4">
                 <div>
                   <label className="block text-sm font-medium text-neutral-700 mb-2">
@@ -131,6 +184,7 @@ export default function Datasets() {
                     onChange={(e) => {
                       setFilter({ ...filter, species: e.target.value });
                       setPagination((prev) => ({ ...prev, page: 1 }));
+                      setCursors([undefined]);
                     }}
                     className="w-full px-4 py-3 bg-slate-50 border border-neutral-200 rounded-xl focus:ring-2 focus:ring-primary-500 focus:border-transparent transition-all"
                   >
@@ -150,6 +204,7 @@ export default function Datasets() {
                     onChange={(e) => {
                       setFilter({ ...filter, data_type: e.target.value });
                       setPagination((prev) => ({ ...prev, page: 1 }));
+                      setCursors([undefined]);
                     }}
                     className="w-full px-4 py-3 bg-slate-50 border border-neutral-200 rounded-xl focus:ring-2 focus:ring-primary-500 focus:border-transparent transition-all"
                   >
@@ -163,8 +218,10 @@ export default function Datasets() {
                 <div className="md:col-span-2 flex items-end justify-end space-x-2">
                   <button
                     onClick={() => {
-                      setFilter({ species: '', data_type: '' });
+                      setFilter({ q: '', species: '', data_type: '' });
+                      setSearchText('');
                       setPagination((prev) => ({ ...prev, page: 1 }));
+                      setCursors([undefined]);
                     }}
                     className="px-4 py-3 text-neutral-600 hover:text-neutral-900 transition-colors"
                   >
@@ -177,7 +234,9 @@ export default function Datasets() {
             {/* Results Info */}
             <div className="flex items-center justify-between mb-6">
               <p className="text-neutral-600">
-                {pagination.total > 0 ? (
+                {filter.q && datasets.length > 0 ? (
+                  <>Showing {datasets.length} best matches for &ldquo;{filter.q}&rdquo;</>
+                ) : pagination.total > 0 ? (
                   <>Showing {datasets.length} of {pagination.total} datasets</>
                 ) : (
                   'No datasets found'
@@ -243,7 +302,7 @@ export default function Datasets() {
                           </div>
                           <div>
                             <h3 className="font-semibold text-lg text-neutral-900 group-hover:text-primary-600 transition-colors line-clamp-1">
-                              {dataset.name}
+                              {highlights[dataset.id] ? renderHighlight(highlights[dataset.id].name) : dataset.name}
                             </h3>
                             <p className="text-sm text-neutral-500 capitalize">{dataset.data_type}</p>
                           </div>
@@ -258,7 +317,9 @@ export default function Datasets() {
                     <div className="p-6">
                       {dataset.description && (
                         <p className="text-neutral-600 text-sm line-clamp-2 mb-4">
-                          {dataset.description}
+                          {highlights[dataset.id]?.description
+                            ? renderHighlight(highlights[dataset.id].description)
+                            : dataset.description}
                         </p>
                       )}
 
@@ -293,7 +354,7 @@ export default function Datasets() {
             )}
 
             {/* Pagination */}
-            {pagination.total > pagination.pageSize && (
+            {(pagination.page > 1 || hasMore) && (
               <div className="flex justify-center items-center space-x-2 mt-8">
                 <button
                   onClick={() => setPagination((prev) => ({ ...prev, page: prev.page - 1 }))}
@@ -303,11 +364,15 @@ export default function Datasets() {
                   Previous
                 </button>
                 <span className="px-4 py-2">
-                  Page {pagination.page} of {Math.ceil(pagination.total / pagination.pageSize)}
+                  Page {pagination.page}
+                  {pagination.total > 0 && <> of {Math.max(pagination.page, Math.ceil(pagination.total / pagination.pageSize))}</>}
                 </span>
                 <button
-                  onClick={() => setPagination((prev) => ({ ...prev, page: prev.page + 1 }))}
-                  disabled={pagination.page >= Math.ceil(pagination.total / pagination.pageSize)}
+                  onClick={() => {
+                    setCursors((prev) => [...prev.slice(0, pagination.page), nextCursor ?? undefined]);
+                    setPagination((prev) => ({ ...prev, page: prev.page + 1 }));
+                  }}
+                  disabled={!hasMore}
                   className="px-4 py-2 bg-white border border-neutral-200 rounded-lg disabled:opacity-50 disabled:cursor-not-allowed hover:bg-slate-50 transition-colors"
                 >
                   Next
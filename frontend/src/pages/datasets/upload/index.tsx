@@ -6,7 +6,7 @@ import { useRouter } from 'next/router';
 import Head from 'next/head';
 import Header from '@/components/layout/Header';
 import Footer from '@/components/layout/Footer';
-import api from '@/lib/api';
+import { filesApi } from '@/lib/api';
 
 export default function UploadDataset() {
   const router = useRouter();
@@ -45,17 +45,17 @@ export default function UploadDataset() {
         return;
       }
 
-      const data = new FormData();
-      data.append('name', formData.name);
-      data.append('description', formData.description);
-      data.append('species', formData.species);
-      data.append('data_type', formData.data_type);
-      data.append('access_level', formData.access_level);
-      data.append('file', formData.file);
-
-      const response = await api.post('/api/files/datasets', data, {
-        headers: { 'Authorization': `Bearer ${token}` },
-      });
+      const response = await filesApi.uploadDataset(
+        formData.file,
+        {
+          name: formData.name,
+          description: formData.description,
+          species: formData.species,
+          data_type: formData.data_type,
+          access_level: formData.access_level,
+        },
+        (sent, total) => setMessage(`Uploading… ${Math.floor((sent / total) * 100)}%`),
+      );
 
       setMessage(`✅ Dataset uploaded successfully! ID: ${response.data.id}`);
       setFormData({ name: '', description: '', species: '', data_type: 'other', access_level: 'registered', file: null });
@@ -19,6 +19,7 @@ interface GenomeRef {
   description: string;
   fasta_url: string;
   fai_url?: string;
+  gzi_url?: string | null;
   gff_url?: string;
 }
 
@@ -55,6 +56,20 @@ export default function GenomeBrowser() {
         // Build absolute URLs
         const fastaUrl = `${apiUrl}${ref.fasta_url}`;
         const faiUrl = ref.fai_url ? `${apiUrl}${ref.fai_url}` : `${fastaUrl}.fai`;
+        const gziUrl = ref.gzi_url ? `${apiUrl}${ref.gzi_url}` : null;
+        // bgzip-compressed FASTA needs the .gzi block index as well
+        const sequenceAdapter = gziUrl
+          ? {
+              type: 'BgzipFastaAdapter',
+              fastaLocation: { uri: fastaUrl },
+              faiLocation: { uri: faiUrl },
+              gziLocation: { uri: gziUrl },
+            }
+          : {
+              type: 'IndexedFastaAdapter',
+              fasta: { url: fastaUrl },
+              fai: { url: faiUrl },
+            };
         
         // Set up JBrowse2 config
         setJbrowseConfig({
@@ -63,11 +78,7 @@ export default function GenomeBrowser() {
             sequence: {
               trackId: 'reference',
               type: 'ReferenceSequenceTrack',
-              adapter: {
-                type: 'IndexedFastaAdapter',
-                fasta: { url: fastaUrl },
-                fai: { url: faiUrl },
-              },
+              adapter: sequenceAdapter,
             },
           },
           tracks: [
@@ -75,11 +86,7 @@ export default function GenomeBrowser() {
               trackId: 'reference-track',
               name: 'Reference Sequence',
               type: 'ReferenceSequenceTrack',
-              adapter: {
-                type: 'IndexedFastaAdapter',
-                fasta: { url: fastaUrl },
-                fai: { url: faiUrl },
-              },
+              adapter: sequenceAdapter,
             },
           ],
           defaultSession: {
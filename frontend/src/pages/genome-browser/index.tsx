@@ -20,6 +20,7 @@ interface GenomeRef {
   description: string;
   fasta_url: string;
   fai_url?: string;
+  gzi_url?: string | null;
   gff_url?: string;
   chromosomes: number;
   total_length: string;
@@ -110,6 +111,20 @@ export default function GenomeBrowser() {
     const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
     const fastaUrl = `${apiUrl}${refGenome.fasta_url}`;
     const faiUrl = refGenome.fai_url ? `${apiUrl}${refGenome.fai_url}` : `${fastaUrl}.fai`;
+    const gziUrl = refGenome.gzi_url ? `${apiUrl}${refGenome.gzi_url}` : null;
+    // bgzip-compressed FASTA needs the .gzi block index as well
+    const sequenceAdapter = gziUrl
+      ? {
+          type: 'BgzipFastaAdapter',
+          fastaLocation: { uri: fastaUrl },
+          faiLocation: { uri: faiUrl },
+          gziLocation: { uri: gziUrl },
+        }
+      : {
+          type: 'IndexedFastaAdapter',
+          fasta: { url: fastaUrl },
+          fai: { url: faiUrl },
+        };
     
     const config = {
       assembly: {
@@ -117,11 +132,7 @@ export default function GenomeBrowser() {
         sequence: {
           trackId: 'reference',
           type: 'ReferenceSequenceTrack',
-          adapter: {
-            type: 'IndexedFastaAdapter',
-            fasta: { url: fastaUrl },
-            fai: { url: faiUrl },
-          },
+          adapter: sequenceAdapter,
         },
       },
       tracks: [
@@ -129,11 +140,7 @@ export default function GenomeBrowser() {
           trackId: 'reference-track',
           name: 'Reference Sequence',
           type: 'ReferenceSequenceTrack',
-          adapter: {
-            type: 'IndexedFastaAdapter',
-            fasta: { url: fastaUrl },
-            fai: { url: faiUrl },
-          },
+          adapter: sequenceAdapter,
         },
       ],
       defaultSession: {
@@ -169,6 +176,7 @@ export default function GenomeBrowser() {
           format: 'fasta',
           url: `${apiUrl}${refGenome.fasta_url}`,
           indexURL: refGenome.fai_url ? `${apiUrl}${refGenome.fai_url}` : undefined,
+          compressedIndexURL: refGenome.gzi_url ? `${apiUrl}${refGenome.gzi_url}` : undefined,
           order: 200,
         });
       }
@@ -40,17 +40,27 @@ export default function Blast() {
         expect: parseFloat(expect),
         num_results: parseInt(numResults),
       });
-      setResults(response.data.data);
+      const jobId = (response.data as any).job_id;
+
+      // Searches run in the background; wait for the job's completion event, then fetch the result once
+      await toolsApi.watchJobs([jobId], () => {});
+      const job: any = (await toolsApi.getBlastResult(jobId)).data;
+
+      if (job.status === 'failed') {
+        setResults({ error: job.error || 'BLAST search failed' });
+        return;
+      }
+      setResults(job.result);
       
       // Add to history
       const newJob: BlastResult = {
-        id: response.data.data.job_id || Date.now(),
+        id: jobId || Date.now(),
         query: sequence.substring(0, 30) + '...',
         database,
         program,
-        status: 'completed',
-        created_at: new Date().toISOString(),
-        results: response.data.data.results,
+        status: job.status,
+        created_at: job.created_at || new Date().toISOString(),
+        results: job.result?.results,
       };
       setHistory([newJob, ...history.slice(0, 9)]);
     } catch (err: any) {
@@ -30,11 +30,20 @@ export interface Dataset {
   species: string | null;
   data_type: string | null;
   file_path: string;
+  file_name: string | null;
   file_size: number | null;
+  sha256: string | null;
   access_level: string;
   created_at: string;
 }
 
+export interface DatasetSearchResult {
+  dataset: Dataset;
+  rank: number;
+  // Matched terms are wrapped in <mark></mark>
+  highlight: { name: string; description: string };
+}
+
 // Genome browser types
 export interface GenomeReference {
   id: string;
@@ -42,6 +51,7 @@ export interface GenomeReference {
   description: string;
   fasta_url: string;
   fai_url: string;
+  gzi_url: string | null;
   gff_url: string | null;
 }
 
@@ -74,3 +84,15 @@ export interface PaginatedResponse<T> {
   page_size: number;
   data: T[];
 }
+
+// State or progress of an analysis job, from GET /api/tools/jobs/events
+export interface JobEvent {
+  job_id: number;
+  status: 'pending' | 'running' | 'completed' | 'failed';
+  error?: string | null;
+  hits?: number;
+  hit_count?: number;
+  queries?: number;
+  queries_done?: number;
+  queries_total?: number;
+}